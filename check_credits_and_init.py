@@ -2,11 +2,13 @@
 check_credits_and_init.py — GitZoid's single starting node (house pattern, matches
 GitDigest / WaveContent / WavePredict).
 
-It runs FIRST in the one DAG, before any expensive work, and does four things:
+It runs FIRST in the one DAG, before any expensive work, and does five things:
   1. waveassist.init() (no check flag — credits are gated here, once).
-  2. check_credits_and_notify(...) — stop the run cleanly if the account is out of credits.
-  3. acquire a single-run LOCK so overlapping runs don't double-build the brain / double-review.
-  4. store `tentative_time_to_process` UPFRONT so the dashboard progress bar shows from
+  2. a cheap change probe — when nothing changed since the last completed run, mark this cycle a
+     no-op (run-based `skip_run`, exactly like a lock-skip) so every downstream node exits at once.
+  3. check_credits_and_notify(...) — stop the run cleanly if the account is out of credits.
+  4. acquire a single-run LOCK so overlapping runs don't double-build the brain / double-review.
+  5. store `tentative_time_to_process` UPFRONT so the dashboard progress bar shows from
      second 0 — through the (occasionally slow) brain build in study_repos, which runs next.
 
 Why the lock: GitZoid runs every ~2 min, but the first run loops over every connected repo
@@ -27,8 +29,17 @@ marked failed, which is the intended "skipped, buy credits" signal — same as e
 does NOT raise on missing repos/token or on a lock-skip: GitZoid runs every couple of minutes and
 an unconfigured/overlapping cycle should be a clean no-op downstream, not a stream of failed runs.
 """
+import hashlib
+import json
+import random
+import threading
+import time
 import uuid
+from collections.abc import Mapping
 from datetime import datetime, timezone
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
 import waveassist
 
 # Credits required to start a run. Default model is Sonnet, and a run may include a weekly brain
@@ -53,6 +64,413 @@ def lock_is_active(lock, now=None) -> bool:
         return False
     return age < LOCK_TTL_SECONDS
 
+# GitHub client settings for this node (the client block below is shared verbatim).
+GITHUB_POOL_SIZE = 2   # one probe query per batch of repos
+GITHUB_RESERVE_FRACTION = 0.25   # the probe is optional: leave the budget to the PR pipeline
+
+
+# ---------------------------------------------------------------- GitHub HTTP client
+# One keep-alive session per node run instead of a fresh TLS connection per call, with one default
+# timeout, per-endpoint timing, and network errors surfaced as a failed response. Duplicated in
+# every node that calls GitHub (nodes never import siblings); tests/unit/test_shared_blocks.py
+# fails if the copies drift. GITHUB_POOL_SIZE and GITHUB_RESERVE_FRACTION are set per node.
+GITHUB_TIMEOUT = 30
+GITHUB_TIMINGS = {}   # "GET /repos/{repo}/pulls/{n}/files" -> {"calls", "errors", "seconds"}
+_GH_SESSION = None
+_GH_LOCK = threading.Lock()
+_PATH_TAILS = ("contents", "compare", "trees")   # everything after these is a path / ref / range
+# Rate-limit governor. Budgets are per credential: a bucket is "<credential>/<resource>", where the
+# credential is a short hash of the token (or its pool alias, see TOKEN_ALIASES). Nodes spend the
+# same credentials, so the latest X-RateLimit-* readings are shared through the github_rate_state key. A node may spend down to its own floor
+# (GITHUB_RESERVE_FRACTION of the limit): PR fetching/posting run almost to zero, the brain build
+# stops early and leaves the rest to them. Above the floor a token bucket refilled at
+# (spendable budget / seconds to reset) paces calls — free bursts while the budget is plentiful,
+# spread-out calls as it runs low. Retry-After or an exhausted budget blocks calls until the given
+# time; a wait longer than GITHUB_MAX_WAIT fails the call fast (status 429) instead.
+GITHUB_RATE_STATE_KEY = "github_rate_state"
+GITHUB_MAX_WAIT = 60
+TOKEN_ALIASES = {}   # token hash -> stable credential id (App installation tokens rotate hourly)
+# Retries: 5xx, 429, rate-limit 403s and connection errors are retried up to GITHUB_MAX_RETRIES
+# times with full-jitter exponential backoff, never sooner than Retry-After. Every retry wait in a
+# run is paid from GITHUB_RETRY_BUDGET_SECONDS, so retries cannot push a run past the run lock's TTL.
+# A non-GraphQL POST is retried only when GitHub provably did not act on it (429 / 403 / 503, or a
+# connect timeout): after a 502 the comment or review may already exist.
+GITHUB_MAX_RETRIES = 3
+GITHUB_BACKOFF_BASE = 1.0
+GITHUB_BACKOFF_CAP = 20.0
+GITHUB_RETRY_BUDGET_SECONDS = 120
+_RETRY_BUDGET = {"seconds": GITHUB_RETRY_BUDGET_SECONDS, "retries": 0}
+
+
+class _FailedResponse:
+    """Stand-in response for a request that never got an HTTP status (reset, DNS, timeout) or was
+    refused by the rate governor, so callers handle it through their usual status-code checks."""
+    headers = {}
+    links = {}
+    ok = False
+
+    def __init__(self, error: Exception, status_code: int = 0):
+        self.status_code = status_code
+        self.text = f"{type(error).__name__}: {error}"
+
+    def json(self):
+        raise ValueError(self.text)
+
+    def iter_content(self, chunk_size=None):
+        return iter(())
+
+    def close(self):
+        pass
+
+
+def _rate_header(resp, name: str):
+    """Integer response header, or None (missing, malformed, or a bare test Mock's headers)."""
+    hdrs = getattr(resp, "headers", None)
+    try:
+        return int(float(hdrs.get(name))) if isinstance(hdrs, Mapping) and hdrs.get(name) is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _auth_key(headers) -> str:
+    """Rate-limit identity of a request's credential: its pool alias, else a short token hash."""
+    auth = (headers.get("Authorization") if isinstance(headers, Mapping) else None) or ""
+    token = auth.split()[-1] if auth.strip() else ""
+    if not token:
+        return "anon"
+    digest = hashlib.sha256(token.encode()).hexdigest()[:10]
+    return TOKEN_ALIASES.get(digest, digest)
+
+
+class _RateGovernor:
+    """Per-bucket ("<credential>/core", "<credential>/graphql") budget readings plus the token
+    bucket that paces calls."""
+
+    def __init__(self, reserve_fraction: float):
+        self.reserve_fraction = reserve_fraction
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.warned = False
+
+    def _bucket(self, resource: str) -> dict:
+        return self.buckets.setdefault(resource, {"limit": None, "remaining": None, "reset": 0.0,
+                                                  "tokens": None, "stamp": 0.0, "blocked_until": 0.0})
+
+    def acquire(self, resource: str, now: float = None):
+        """Reserve one call. Returns the seconds to wait before making it, or None when this node's
+        budget is spent for longer than GITHUB_MAX_WAIT (the call should not be made)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            b = self._bucket(resource)
+            wait = max(0.0, b["blocked_until"] - now)
+            if b["remaining"] is None or b["reset"] <= now:
+                b["remaining"] = b["tokens"] = None   # no reading for this window yet: go and get one
+                return wait if wait <= GITHUB_MAX_WAIT else None
+            spendable = b["remaining"] - int((b["limit"] or 0) * self.reserve_fraction)
+            if spendable <= 0:
+                wait = max(wait, b["reset"] - now)
+                return wait if wait <= GITHUB_MAX_WAIT else None
+            rate = spendable / max(b["reset"] - now, 1.0)
+            capacity = max(1.0, spendable / 4)
+            b["tokens"] = capacity if b["tokens"] is None else min(capacity, b["tokens"] + (now - b["stamp"]) * rate)
+            b["stamp"] = now
+            if b["tokens"] < 1:
+                wait = max(wait, (1 - b["tokens"]) / rate)
+            if wait > GITHUB_MAX_WAIT:
+                return None
+            b["tokens"] -= 1
+            b["remaining"] -= 1   # local estimate until the response's headers arrive
+            return wait
+
+    def observe(self, resource: str, resp, now: float = None):
+        """Fold a response's X-RateLimit-* / Retry-After headers into the budget."""
+        now = time.time() if now is None else now
+        remaining, reset = _rate_header(resp, "X-RateLimit-Remaining"), _rate_header(resp, "X-RateLimit-Reset")
+        retry_after = _rate_header(resp, "Retry-After")
+        with self.lock:
+            b = self._bucket(resource)
+            if remaining is not None and reset is not None:
+                if reset == b["reset"] and b["remaining"] is not None:
+                    remaining = min(remaining, b["remaining"])   # concurrent responses land out of order
+                b["remaining"], b["reset"] = remaining, float(reset)
+                b["limit"] = _rate_header(resp, "X-RateLimit-Limit") or b["limit"]
+                if b["tokens"] is not None:
+                    b["tokens"] = min(b["tokens"], remaining - int((b["limit"] or 0) * self.reserve_fraction))
+            if getattr(resp, "status_code", None) in (403, 429):
+                if retry_after is not None:
+                    b["blocked_until"] = max(b["blocked_until"], now + retry_after)
+                elif remaining == 0 and reset is not None:
+                    b["blocked_until"] = max(b["blocked_until"], float(reset))
+
+    def remaining(self, resource: str, now: float = None):
+        """Latest remaining-budget estimate for a bucket, or None when there is no current reading."""
+        now = time.time() if now is None else now
+        with self.lock:
+            b = self.buckets.get(resource)
+            if not b or b["remaining"] is None or b["reset"] <= now:
+                return None
+            return b["remaining"]
+
+    def state(self) -> dict:
+        with self.lock:
+            return {r: {"limit": b["limit"], "remaining": b["remaining"], "reset": b["reset"]}
+                    for r, b in self.buckets.items() if b["remaining"] is not None}
+
+    def load(self, state, now: float = None):
+        """Seed budgets from another node's last reading (ignored once its window has reset)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            for resource, s in (state if isinstance(state, dict) else {}).items():
+                try:
+                    remaining, reset = int(s["remaining"]), float(s["reset"])
+                except (TypeError, KeyError, ValueError):
+                    continue
+                b = self._bucket(resource)
+                if reset > now and b["remaining"] is None:
+                    b["remaining"], b["reset"], b["limit"] = remaining, reset, s.get("limit")
+
+
+_GOVERNOR = _RateGovernor(GITHUB_RESERVE_FRACTION)
+
+
+def load_rate_state():
+    _GOVERNOR.load(waveassist.fetch_data(GITHUB_RATE_STATE_KEY, default={}) or {})
+
+
+def store_rate_state():
+    """Publish this node's latest budget reading for the nodes that run after it."""
+    state = _GOVERNOR.state()
+    if state:
+        waveassist.store_data(GITHUB_RATE_STATE_KEY, state, data_type="json")
+
+
+def _gh_session() -> requests.Session:
+    global _GH_SESSION
+    with _GH_LOCK:
+        if _GH_SESSION is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=GITHUB_POOL_SIZE)
+            session.mount("https://", adapter)
+            _GH_SESSION = session
+        return _GH_SESSION
+
+
+def _endpoint(method: str, url: str) -> str:
+    """Timing bucket for a call: repo, numbers and SHAs become placeholders."""
+    parts = urlparse(url).path.strip("/").split("/")
+    if parts[:1] == ["repos"] and len(parts) >= 3:
+        parts[1:3] = ["{repo}"]
+    out = []
+    for part in parts:
+        if part.isdigit():
+            part = "{n}"
+        elif len(part) == 40 and all(c in "0123456789abcdef" for c in part):
+            part = "{sha}"
+        out.append(part)
+        if part in _PATH_TAILS:
+            out.append("{ref}")
+            break
+    return f"{method} /{'/'.join(out)}"
+
+
+def _send(method: str, url: str, endpoint: str, resource: str, kwargs: dict):
+    """One attempt: governor, request, timing. Returns (response, requests exception or None)."""
+    wait = _GOVERNOR.acquire(resource)
+    started = time.monotonic()
+    error = None
+    if wait is None:
+        if not _GOVERNOR.warned:
+            _GOVERNOR.warned = True
+            print(f"⏳ GitHub rate budget ({resource}) for this node is spent; deferring calls to a later cycle")
+        resp = _FailedResponse(RuntimeError("rate budget spent"), status_code=429)
+    else:
+        if wait:
+            time.sleep(wait)
+        try:
+            resp = getattr(_gh_session(), method.lower())(url, **kwargs)
+            _GOVERNOR.observe(resource, resp)
+        except requests.RequestException as e:
+            print(f"⚠️ GitHub {endpoint} failed: {e}")
+            resp, error = _FailedResponse(e), e
+    elapsed = time.monotonic() - started
+    with _GH_LOCK:
+        stats = GITHUB_TIMINGS.setdefault(endpoint, {"calls": 0, "errors": 0, "seconds": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += elapsed
+        if not isinstance(resp.status_code, int) or not 200 <= resp.status_code < 400:
+            stats["errors"] += 1
+    return resp, error
+
+
+def _retry_reason(resp, error, safe_to_repeat: bool):
+    """Why this attempt is worth retrying, or None."""
+    if error is not None:
+        if isinstance(error, requests.ConnectTimeout) or (
+                safe_to_repeat and isinstance(error, (requests.ConnectionError, requests.Timeout))):
+            return type(error).__name__
+        return None
+    if isinstance(resp, _FailedResponse):   # refused by the governor: waiting is its call
+        return None
+    status = resp.status_code if isinstance(resp.status_code, int) else 0
+    text = resp.text if isinstance(getattr(resp, "text", None), str) else ""
+    if status == 429 or (status == 403 and (_rate_header(resp, "Retry-After") is not None
+                                            or "rate limit" in text.lower())):
+        return f"rate limited ({status})"
+    if status == 503 or (status >= 500 and safe_to_repeat):
+        return f"HTTP {status}"
+    return None
+
+
+def retry_pause(attempt: int, resp=None) -> bool:
+    """Sleep before retry number `attempt` (0-based): full-jitter exponential backoff, at least
+    Retry-After. Returns False, without sleeping, when the run's retry budget can't cover it."""
+    delay = random.uniform(0, min(GITHUB_BACKOFF_CAP, GITHUB_BACKOFF_BASE * 2 ** attempt))
+    delay = max(delay, _rate_header(resp, "Retry-After") or 0)
+    with _GH_LOCK:
+        if delay > _RETRY_BUDGET["seconds"]:
+            return False
+        _RETRY_BUDGET["seconds"] -= delay
+        _RETRY_BUDGET["retries"] += 1
+    time.sleep(delay)
+    return True
+
+
+def gh_request(method: str, url: str, **kwargs):
+    """Call GitHub on the shared keep-alive session (default timeout GITHUB_TIMEOUT), paced by the
+    rate governor, retried on transient failures, and recorded under its endpoint in
+    GITHUB_TIMINGS. A requests exception comes back as a status-0 _FailedResponse, a call the
+    governor refuses as a status-429 one."""
+    kwargs.setdefault("timeout", GITHUB_TIMEOUT)
+    endpoint = _endpoint(method, url)
+    graphql = endpoint.endswith(" /graphql")
+    resource = f"{_auth_key(kwargs.get('headers'))}/{'graphql' if graphql else 'core'}"
+    safe_to_repeat = method.upper() != "POST" or graphql
+    for attempt in range(GITHUB_MAX_RETRIES + 1):
+        resp, error = _send(method, url, endpoint, resource, kwargs)
+        reason = _retry_reason(resp, error, safe_to_repeat)
+        if reason is None or attempt == GITHUB_MAX_RETRIES:
+            break
+        if not retry_pause(attempt, resp):
+            print(f"⚠️ GitHub {endpoint}: {reason}; retry budget spent, giving up")
+            break
+        print(f"↻ GitHub {endpoint}: {reason}; retry {attempt + 1}/{GITHUB_MAX_RETRIES}")
+    return resp
+
+
+def log_github_timings(top: int = 5):
+    """One line per node run: total GitHub calls/time plus the slowest endpoints."""
+    if not GITHUB_TIMINGS:
+        return
+    calls = sum(s["calls"] for s in GITHUB_TIMINGS.values())
+    seconds = sum(s["seconds"] for s in GITHUB_TIMINGS.values())
+    slowest = sorted(GITHUB_TIMINGS.items(), key=lambda kv: kv[1]["seconds"], reverse=True)[:top]
+    detail = "; ".join(f"{ep} x{s['calls']} {s['seconds']:.2f}s" + (f" ({s['errors']} err)" if s["errors"] else "")
+                       for ep, s in slowest)
+    retries = f", {_RETRY_BUDGET['retries']} retried" if _RETRY_BUDGET["retries"] else ""
+    print(f"🌐 GitHub: {calls} call(s) in {seconds:.2f}s{retries} — {detail}")
+
+
+# ---------------------------------------------------------------- change probe
+# Whole-run no-op probe. One GraphQL query per PROBE_BATCH_SIZE repos reads each repo's open PRs
+# (number, head SHA, draft flag, base branch); their digest, with the repo list, is compared to the
+# digest of the last COMPLETED run (post_comment commits it at the end, so a run that died midway is
+# retried, and only when fetch_pull_requests processed every repo). Same digest, no queued work and
+# no brain due -> no-op. Any probe failure just runs the cycle; a real run is still forced every
+# NOOP_MAX_MINUTES to reconcile. The probe goes through the governed, retrying GitHub client.
+GRAPHQL_URL = "https://api.github.com/graphql"
+NOOP_PROBE_KEY = "noop_probe"          # {"digest", "at"} of the last completed run
+PROBE_DIGEST_KEY = "probe_digest"      # run-based: this run's digest, for post_comment to commit
+PROBE_REPOS_KEY = "probe_repos"        # run-based: this run's per-repo digests (fetch + post_comment)
+PENDING_WORK_KEYS = ("pr_jobs", "post_queue", "pending_pr_events")
+PROFILE_TTL_DAYS = 14                  # same as study_repos: a brain rebuild due means real work
+NOOP_MAX_MINUTES = 60
+PROBE_BATCH_SIZE = 50
+PROBE_TIMEOUT = 15
+
+
+def build_probe_query(repo_paths: list) -> tuple[str, dict]:
+    """One aliased GraphQL query reading the open-PR heads of every repo in `repo_paths`."""
+    var_defs, fields, variables = [], [], {}
+    for i, repo_path in enumerate(repo_paths):
+        owner, _, name = repo_path.partition("/")
+        var_defs.append(f"$o{i}: String!, $n{i}: String!")
+        variables[f"o{i}"], variables[f"n{i}"] = owner, name
+        fields.append(
+            f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ "
+            f"pullRequests(states: OPEN, first: 100, orderBy: {{field: UPDATED_AT, direction: DESC}}) {{ "
+            f"totalCount nodes {{ number headRefOid isDraft baseRefName }} }} }}"
+        )
+    return f"query({', '.join(var_defs)}) {{ {' '.join(fields)} }}", variables
+
+
+def probe_state(repo_paths: list, token: str):
+    """{repo_path: digest of its open-PR heads} for every repo, or None if GitHub could not say."""
+    state = {}
+    for start in range(0, len(repo_paths), PROBE_BATCH_SIZE):
+        batch = repo_paths[start:start + PROBE_BATCH_SIZE]
+        query, variables = build_probe_query(batch)
+        resp = gh_request("POST", GRAPHQL_URL, json={"query": query, "variables": variables},
+                          headers={"Authorization": f"bearer {token}"}, timeout=PROBE_TIMEOUT)
+        try:
+            body = resp.json() if resp.status_code == 200 else {}
+        except ValueError:
+            return None
+        data = body.get("data") if isinstance(body, dict) else None
+        if not isinstance(data, dict) or body.get("errors"):
+            return None
+        for i, repo_path in enumerate(batch):
+            prs = (data.get(f"r{i}") or {}).get("pullRequests") or {}
+            heads = [(n.get("number"), n.get("headRefOid"), n.get("isDraft"), n.get("baseRefName"))
+                     for n in prs.get("nodes") or []]
+            repo_state = [prs.get("totalCount"), sorted(heads, key=lambda h: h[0] or 0)]
+            state[repo_path] = hashlib.sha256(json.dumps(repo_state).encode()).hexdigest()[:16]
+    return state
+
+
+def probe_digest(repo_paths: list, token: str, state: dict = None):
+    """Digest of the repo list and every repo's open-PR heads, or None if GitHub could not say.
+    `state` reuses a probe_state result instead of probing again."""
+    state = probe_state(repo_paths, token) if state is None else state
+    if state is None:
+        return None
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+def brain_due(repo_paths: list, repo_groups, now=None) -> bool:
+    """True if study_repos would (re)build a profile: a repo it never built, or one past the TTL."""
+    now = now or datetime.now(timezone.utc)
+    repo_groups = repo_groups if isinstance(repo_groups, dict) else {}
+    for repo_path in repo_paths:
+        built_at = str((repo_groups.get(repo_path) or {}).get("built_at"))
+        try:
+            built = datetime.fromisoformat(built_at.replace("Z", "+00:00"))
+        except ValueError:
+            return True
+        if (now - built).days >= PROFILE_TTL_DAYS:
+            return True
+    return False
+
+
+def run_is_noop(repo_paths: list, token: str, now=None) -> tuple[bool, str, dict]:
+    """(no-op?, this cycle's probe digest or None, per-repo digests or None). The probe is taken
+    even when there is other work, so the run that does it can commit it and the next quiet cycle
+    is a no-op; fetch_pull_requests compares the per-repo digests to poll changed repos at once."""
+    now = now or datetime.now(timezone.utc)
+    state = probe_state(repo_paths, token)
+    digest = probe_digest(repo_paths, token, state)
+    last = waveassist.fetch_data(NOOP_PROBE_KEY, default={}) or {}
+    if not digest or not isinstance(last, dict) or digest != last.get("digest"):
+        return False, digest, state
+    try:
+        if (now - datetime.fromisoformat(last.get("at"))).total_seconds() >= NOOP_MAX_MINUTES * 60:
+            return False, digest, state
+    except (TypeError, ValueError):
+        return False, digest, state
+    if any(waveassist.fetch_data(key, default=None) for key in PENDING_WORK_KEYS):
+        return False, digest, state
+    return not brain_due(repo_paths, waveassist.fetch_data("repo_groups", default={}) or {}, now), digest, state
+
+
 # Upfront progress-bar budget (seconds). The brain rebuild is the slow, rare part; reviews are
 # refined later by fetch_pull_requests from the real PR count.
 BRAIN_SECONDS_PER_REPO = 45   # budget for a possible weekly brain rebuild, per repo
@@ -75,42 +493,64 @@ repositories = waveassist.fetch_data("github_selected_resources", default=[]) or
 num_repos = len(repositories) if isinstance(repositories, list) else 0
 time_to_process = estimate_time_to_process(num_repos)
 
-success = waveassist.check_credits_and_notify(
-    required_credits=CREDITS_NEEDED_FOR_RUN,
-    assistant_name="GitZoid",
-)
-
-if not success:
-    display_output = {
-        "html_content": "<p>Credits were not available, the GitZoid run was skipped.</p>",
-    }
-    waveassist.store_data("display_output", display_output, run_based=True, data_type="json")
-    raise Exception("Credits were not available, the GitZoid run was skipped.")
-
-# Single-run lock: skip this cycle if a previous run is still in progress.
+# Change probe: skip the whole DAG when nothing changed since the last completed run. Only when no
+# other run holds the lock (a lock-skip below is a no-op anyway) and there is something to probe.
 existing_lock = waveassist.fetch_data(RUN_LOCK_KEY, default={}) or {}
-if lock_is_active(existing_lock):
-    print("GitZoid: previous run still in progress; skipping this cycle.")
+repo_paths = [r.get("id") if isinstance(r, dict) else r for r in repositories] if num_repos else []
+repo_paths = [r for r in repo_paths if isinstance(r, str) and r]
+access_token = waveassist.fetch_data("github_access_token", default="") or ""
+noop, digest, repo_digests = False, None, None
+if repo_paths and access_token and not lock_is_active(existing_lock):
+    load_rate_state()
+    noop, digest, repo_digests = run_is_noop(repo_paths, access_token)
+    store_rate_state()
+
+if noop:
+    print("GitZoid: no PR changes since the last run; skipping this cycle.")
     waveassist.store_data("skip_run", True, run_based=True, data_type="json")
     display_output = {
-        "html_content": "<p>GitZoid is already reviewing your pull requests. This run will be skipped.</p>",
+        "html_content": "<p>No pull request changes since the last run. Nothing to review.</p>",
     }
     waveassist.store_data("display_output", display_output, run_based=True, data_type="json")
 else:
-    token = str(uuid.uuid4())
-    waveassist.store_data(
-        RUN_LOCK_KEY,
-        {"at": datetime.now(timezone.utc).isoformat(), "token": token},
-        data_type="json",
-    )
-    # Global (NOT run-based): only the run that holds the lock ever writes this, and the lock
-    # guarantees a single holder at a time, so the global value always reflects the current
-    # holder's token. post_comment reads it the same way to release. (A run-based write here
-    # is the bug that wedged GitZoid: post_comment read it globally and never matched.)
-    waveassist.store_data("run_lock_token", token, data_type="string")
-    waveassist.store_data("skip_run", False, run_based=True, data_type="json")
-    waveassist.store_data(
-        "tentative_time_to_process", str(time_to_process), run_based=True, data_type="string"
+    success = waveassist.check_credits_and_notify(
+        required_credits=CREDITS_NEEDED_FOR_RUN,
+        assistant_name="GitZoid",
     )
-    print(f"GitZoid: Credits OK, lock acquired. Tracking {num_repos} repo(s); est ~{time_to_process}s.")
-    print("GitZoid: Credits check complete and initialization finished.")
+
+    if not success:
+        display_output = {
+            "html_content": "<p>Credits were not available, the GitZoid run was skipped.</p>",
+        }
+        waveassist.store_data("display_output", display_output, run_based=True, data_type="json")
+        raise Exception("Credits were not available, the GitZoid run was skipped.")
+
+    # Single-run lock: skip this cycle if a previous run is still in progress.
+    if lock_is_active(existing_lock):
+        print("GitZoid: previous run still in progress; skipping this cycle.")
+        waveassist.store_data("skip_run", True, run_based=True, data_type="json")
+        display_output = {
+            "html_content": "<p>GitZoid is already reviewing your pull requests. This run will be skipped.</p>",
+        }
+        waveassist.store_data("display_output", display_output, run_based=True, data_type="json")
+    else:
+        token = str(uuid.uuid4())
+        waveassist.store_data(
+            RUN_LOCK_KEY,
+            {"at": datetime.now(timezone.utc).isoformat(), "token": token},
+            data_type="json",
+        )
+        # Global (NOT run-based): only the run that holds the lock ever writes this, and the lock
+        # guarantees a single holder at a time, so the global value always reflects the current
+        # holder's token. post_comment reads it the same way to release. (A run-based write here
+        # is the bug that wedged GitZoid: post_comment read it globally and never matched.)
+        waveassist.store_data("run_lock_token", token, data_type="string")
+        waveassist.store_data("skip_run", False, run_based=True, data_type="json")
+        if digest:
+            waveassist.store_data(PROBE_DIGEST_KEY, digest, run_based=True, data_type="string")
+            waveassist.store_data(PROBE_REPOS_KEY, repo_digests, run_based=True, data_type="json")
+        waveassist.store_data(
+            "tentative_time_to_process", str(time_to_process), run_based=True, data_type="string"
+        )
+        print(f"GitZoid: Credits OK, lock acquired. Tracking {num_repos} repo(s); est ~{time_to_process}s.")
+        print("GitZoid: Credits check complete and initialization finished.")
@@ -1,16 +1,624 @@
+import base64
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import random
+import threading
+import subprocess
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
+from urllib.parse import parse_qs, urlparse
 import requests
+from requests.adapters import HTTPAdapter
 import waveassist
 
 FIRST_RUN_LIMIT = 2
+# PRs created longer ago than this are never reviewed. The REST listing is sorted newest first, so
+# paging stops at the first page whose oldest PR is past this age.
+MAX_PR_AGE_DAYS = 60
 # Runs UI: estimated seconds per PR for downstream generate_review + post_comment. This refines
 # the upfront estimate set by check_credits_and_init once the real open-PR count is known.
 PROCESSING_TIME_PER_PR = 2
+# reviewed_prs is sharded per repo (reviewed_prs:{owner/repo}) so each node reads and rewrites only
+# the repos it touches. The legacy single `reviewed_prs` key is migrated into shards once.
+REVIEWED_PRS_KEY = "reviewed_prs"
+REVIEWED_PRS_SHARD_PREFIX = "reviewed_prs:"
+# PR hand-off to generate_review / post_comment: each PR job is stored under its own key
+# (pr_job:{owner/repo}#{n}@{sha}) and the small `pr_jobs` manifest lists them, so downstream nodes
+# load, rewrite and release one job at a time instead of the whole batch of diffs.
+PR_JOBS_KEY = "pr_jobs"
+POST_QUEUE_KEY = "post_queue"   # jobs post_comment deferred under GitHub's write limits; it posts them first
+PR_JOB_PREFIX = "pr_job:"
+# Conditional-request cache (ETag / Last-Modified). A 304 is not counted against GitHub's rate
+# limit, so unchanged PR lists and file listings cost nothing. Entries are re-validated on every
+# use but only rewritten on a 200; an entry not refreshed within the TTL is pruned (self-healing,
+# and closed PRs' file listings age out on their own).
+# The cache is sharded per repo (http_cache:{owner/repo}) and each shard is held to
+# HTTP_CACHE_MAX_BYTES, oldest entries evicted first; a page body over HTTP_CACHE_MAX_ENTRY_BYTES
+# (a big file listing) is not cached at all. The legacy single `http_cache` blob is dropped once.
+HTTP_CACHE_KEY = "http_cache"
+HTTP_CACHE_SHARD_PREFIX = "http_cache:"
+HTTP_CACHE_TTL_DAYS = 3
+HTTP_CACHE_MAX_BYTES = 1024 * 1024
+HTTP_CACHE_MAX_ENTRY_BYTES = 128 * 1024
+HTTP_CACHE_STATS = {"not_modified": 0, "stored": 0}
+_STATS_LOCK = threading.Lock()   # repos are fetched from a thread pool; counters are shared
+# Optional GraphQL open-PR discovery ("pr_discovery" data key = "graphql"): one aliased query per
+# batch of repos replaces the per-repo REST listing. Default stays "rest".
+GRAPHQL_URL = "https://api.github.com/graphql"
+GRAPHQL_BATCH_SIZE = 50
+# Repos are fetched concurrently (network-bound). Override with the "fetch_concurrency" data key.
+FETCH_CONCURRENCY = 8
+# Per-listing page concurrency once the Link header exposes rel="last".
+PAGE_CONCURRENCY = 4
+# Per-repo updated_at cursor: between full sweeps a repo is listed by `sort=updated` and only PRs
+# touched since the last cycle get the head-SHA check / file fetch. A full sweep every
+# FULL_SWEEP_MINUTES still reconciles closed PRs and retries PRs whose fetch or review fell through.
+PR_CURSORS_KEY = "pr_cursors"
+FULL_SWEEP_MINUTES = 60
+# Webhook mode (webhook_receiver.py): pull_request events land in the pending_pr_events set. While a
+# webhook secret is configured, a repo is listed only on its full sweep; in between, only the PRs
+# its events touched are fetched, and a repo with no events costs nothing.
+PENDING_EVENTS_KEY = "pending_pr_events"
+WEBHOOK_SECRET_KEY = "github_webhook_secret"
+# Adaptive polling, kept in the same cursor entry: "activity" is an EWMA of whether a poll saw PR
+# updates. A repo that changed, or is still hot, is polled every cycle; a quiet one waits
+# POLL_BACKOFF_START_MINUTES, then twice as long after each quiet poll up to POLL_MAX_MINUTES.
+ACTIVITY_ALPHA = 0.3
+HOT_ACTIVITY = 0.2
+POLL_BACKOFF_START_MINUTES = 4
+POLL_MAX_MINUTES = 60
+# Repos this run could not fully process (listing failed, a PR's files or processing failed):
+# repo_path -> first reason. Their cursors are left as they were, so the next cycle polls them again,
+# and the run is not reported complete (run-based run_complete), so post_comment does not commit the
+# change probe that would let the next cycles skip themselves. A repo whose probe digest moved since
+# the last committed probe is polled even while backed off.
+RUN_GAPS = {}
+RUN_COMPLETE_KEY = "run_complete"
+NOOP_PROBE_KEY = "noop_probe"      # last committed change probe (see check_credits_and_init)
+PROBE_REPOS_KEY = "probe_repos"    # run-based: this run's per-repo probe digests
+# Patch ingestion budgets (UTF-8 bytes). The review prompt shows ~50K chars at most, so a vendored
+# dependency or regenerated fixture must not balloon the PR job. Patches are cut on a line boundary
+# as each page is read; a file cut short, or left without a patch once the PR budget is spent, is
+# flagged "truncated" so the prompt and the diff-line gate know it is partial.
+MAX_FILE_PATCH_BYTES = 64 * 1024
+MAX_PR_PATCH_BYTES = 512 * 1024
+# /pulls/{n}/files lists at most 3,000 files and omits `patch` for large files. When a listing
+# hits the cap or has such holes, the PR's raw unified diff (one streamed response) is used instead.
+FILES_API_MAX_FILES = 3000
+DIFF_MEDIA_TYPE = "application/vnd.github.v3.diff"
 
 # Credits are gated once upstream in check_credits_and_init (the single starting node).
 waveassist.init()
 
 
+# GitHub client settings for this node (the client block below is shared verbatim).
+GITHUB_POOL_SIZE = FETCH_CONCURRENCY * PAGE_CONCURRENCY   # repo tasks x page workers in flight
+GITHUB_RESERVE_FRACTION = 0.01   # PR fetching has priority: spend almost all of the budget
+
+
+# ---------------------------------------------------------------- GitHub HTTP client
+# One keep-alive session per node run instead of a fresh TLS connection per call, with one default
+# timeout, per-endpoint timing, and network errors surfaced as a failed response. Duplicated in
+# every node that calls GitHub (nodes never import siblings); tests/unit/test_shared_blocks.py
+# fails if the copies drift. GITHUB_POOL_SIZE and GITHUB_RESERVE_FRACTION are set per node.
+GITHUB_TIMEOUT = 30
+GITHUB_TIMINGS = {}   # "GET /repos/{repo}/pulls/{n}/files" -> {"calls", "errors", "seconds"}
+_GH_SESSION = None
+_GH_LOCK = threading.Lock()
+_PATH_TAILS = ("contents", "compare", "trees")   # everything after these is a path / ref / range
+# Rate-limit governor. Budgets are per credential: a bucket is "<credential>/<resource>", where the
+# credential is a short hash of the token (or its pool alias, see TOKEN_ALIASES). Nodes spend the
+# same credentials, so the latest X-RateLimit-* readings are shared through the github_rate_state key. A node may spend down to its own floor
+# (GITHUB_RESERVE_FRACTION of the limit): PR fetching/posting run almost to zero, the brain build
+# stops early and leaves the rest to them. Above the floor a token bucket refilled at
+# (spendable budget / seconds to reset) paces calls — free bursts while the budget is plentiful,
+# spread-out calls as it runs low. Retry-After or an exhausted budget blocks calls until the given
+# time; a wait longer than GITHUB_MAX_WAIT fails the call fast (status 429) instead.
+GITHUB_RATE_STATE_KEY = "github_rate_state"
+GITHUB_MAX_WAIT = 60
+TOKEN_ALIASES = {}   # token hash -> stable credential id (App installation tokens rotate hourly)
+# Retries: 5xx, 429, rate-limit 403s and connection errors are retried up to GITHUB_MAX_RETRIES
+# times with full-jitter exponential backoff, never sooner than Retry-After. Every retry wait in a
+# run is paid from GITHUB_RETRY_BUDGET_SECONDS, so retries cannot push a run past the run lock's TTL.
+# A non-GraphQL POST is retried only when GitHub provably did not act on it (429 / 403 / 503, or a
+# connect timeout): after a 502 the comment or review may already exist.
+GITHUB_MAX_RETRIES = 3
+GITHUB_BACKOFF_BASE = 1.0
+GITHUB_BACKOFF_CAP = 20.0
+GITHUB_RETRY_BUDGET_SECONDS = 120
+_RETRY_BUDGET = {"seconds": GITHUB_RETRY_BUDGET_SECONDS, "retries": 0}
+
+
+class _FailedResponse:
+    """Stand-in response for a request that never got an HTTP status (reset, DNS, timeout) or was
+    refused by the rate governor, so callers handle it through their usual status-code checks."""
+    headers = {}
+    links = {}
+    ok = False
+
+    def __init__(self, error: Exception, status_code: int = 0):
+        self.status_code = status_code
+        self.text = f"{type(error).__name__}: {error}"
+
+    def json(self):
+        raise ValueError(self.text)
+
+    def iter_content(self, chunk_size=None):
+        return iter(())
+
+    def close(self):
+        pass
+
+
+def _rate_header(resp, name: str):
+    """Integer response header, or None (missing, malformed, or a bare test Mock's headers)."""
+    hdrs = getattr(resp, "headers", None)
+    try:
+        return int(float(hdrs.get(name))) if isinstance(hdrs, Mapping) and hdrs.get(name) is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _auth_key(headers) -> str:
+    """Rate-limit identity of a request's credential: its pool alias, else a short token hash."""
+    auth = (headers.get("Authorization") if isinstance(headers, Mapping) else None) or ""
+    token = auth.split()[-1] if auth.strip() else ""
+    if not token:
+        return "anon"
+    digest = hashlib.sha256(token.encode()).hexdigest()[:10]
+    return TOKEN_ALIASES.get(digest, digest)
+
+
+class _RateGovernor:
+    """Per-bucket ("<credential>/core", "<credential>/graphql") budget readings plus the token
+    bucket that paces calls."""
+
+    def __init__(self, reserve_fraction: float):
+        self.reserve_fraction = reserve_fraction
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.warned = False
+
+    def _bucket(self, resource: str) -> dict:
+        return self.buckets.setdefault(resource, {"limit": None, "remaining": None, "reset": 0.0,
+                                                  "tokens": None, "stamp": 0.0, "blocked_until": 0.0})
+
+    def acquire(self, resource: str, now: float = None):
+        """Reserve one call. Returns the seconds to wait before making it, or None when this node's
+        budget is spent for longer than GITHUB_MAX_WAIT (the call should not be made)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            b = self._bucket(resource)
+            wait = max(0.0, b["blocked_until"] - now)
+            if b["remaining"] is None or b["reset"] <= now:
+                b["remaining"] = b["tokens"] = None   # no reading for this window yet: go and get one
+                return wait if wait <= GITHUB_MAX_WAIT else None
+            spendable = b["remaining"] - int((b["limit"] or 0) * self.reserve_fraction)
+            if spendable <= 0:
+                wait = max(wait, b["reset"] - now)
+                return wait if wait <= GITHUB_MAX_WAIT else None
+            rate = spendable / max(b["reset"] - now, 1.0)
+            capacity = max(1.0, spendable / 4)
+            b["tokens"] = capacity if b["tokens"] is None else min(capacity, b["tokens"] + (now - b["stamp"]) * rate)
+            b["stamp"] = now
+            if b["tokens"] < 1:
+                wait = max(wait, (1 - b["tokens"]) / rate)
+            if wait > GITHUB_MAX_WAIT:
+                return None
+            b["tokens"] -= 1
+            b["remaining"] -= 1   # local estimate until the response's headers arrive
+            return wait
+
+    def observe(self, resource: str, resp, now: float = None):
+        """Fold a response's X-RateLimit-* / Retry-After headers into the budget."""
+        now = time.time() if now is None else now
+        remaining, reset = _rate_header(resp, "X-RateLimit-Remaining"), _rate_header(resp, "X-RateLimit-Reset")
+        retry_after = _rate_header(resp, "Retry-After")
+        with self.lock:
+            b = self._bucket(resource)
+            if remaining is not None and reset is not None:
+                if reset == b["reset"] and b["remaining"] is not None:
+                    remaining = min(remaining, b["remaining"])   # concurrent responses land out of order
+                b["remaining"], b["reset"] = remaining, float(reset)
+                b["limit"] = _rate_header(resp, "X-RateLimit-Limit") or b["limit"]
+                if b["tokens"] is not None:
+                    b["tokens"] = min(b["tokens"], remaining - int((b["limit"] or 0) * self.reserve_fraction))
+            if getattr(resp, "status_code", None) in (403, 429):
+                if retry_after is not None:
+                    b["blocked_until"] = max(b["blocked_until"], now + retry_after)
+                elif remaining == 0 and reset is not None:
+                    b["blocked_until"] = max(b["blocked_until"], float(reset))
+
+    def remaining(self, resource: str, now: float = None):
+        """Latest remaining-budget estimate for a bucket, or None when there is no current reading."""
+        now = time.time() if now is None else now
+        with self.lock:
+            b = self.buckets.get(resource)
+            if not b or b["remaining"] is None or b["reset"] <= now:
+                return None
+            return b["remaining"]
+
+    def state(self) -> dict:
+        with self.lock:
+            return {r: {"limit": b["limit"], "remaining": b["remaining"], "reset": b["reset"]}
+                    for r, b in self.buckets.items() if b["remaining"] is not None}
+
+    def load(self, state, now: float = None):
+        """Seed budgets from another node's last reading (ignored once its window has reset)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            for resource, s in (state if isinstance(state, dict) else {}).items():
+                try:
+                    remaining, reset = int(s["remaining"]), float(s["reset"])
+                except (TypeError, KeyError, ValueError):
+                    continue
+                b = self._bucket(resource)
+                if reset > now and b["remaining"] is None:
+                    b["remaining"], b["reset"], b["limit"] = remaining, reset, s.get("limit")
+
+
+_GOVERNOR = _RateGovernor(GITHUB_RESERVE_FRACTION)
+
+
+def load_rate_state():
+    _GOVERNOR.load(waveassist.fetch_data(GITHUB_RATE_STATE_KEY, default={}) or {})
+
+
+def store_rate_state():
+    """Publish this node's latest budget reading for the nodes that run after it."""
+    state = _GOVERNOR.state()
+    if state:
+        waveassist.store_data(GITHUB_RATE_STATE_KEY, state, data_type="json")
+
+
+def _gh_session() -> requests.Session:
+    global _GH_SESSION
+    with _GH_LOCK:
+        if _GH_SESSION is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=GITHUB_POOL_SIZE)
+            session.mount("https://", adapter)
+            _GH_SESSION = session
+        return _GH_SESSION
+
+
+def _endpoint(method: str, url: str) -> str:
+    """Timing bucket for a call: repo, numbers and SHAs become placeholders."""
+    parts = urlparse(url).path.strip("/").split("/")
+    if parts[:1] == ["repos"] and len(parts) >= 3:
+        parts[1:3] = ["{repo}"]
+    out = []
+    for part in parts:
+        if part.isdigit():
+            part = "{n}"
+        elif len(part) == 40 and all(c in "0123456789abcdef" for c in part):
+            part = "{sha}"
+        out.append(part)
+        if part in _PATH_TAILS:
+            out.append("{ref}")
+            break
+    return f"{method} /{'/'.join(out)}"
+
+
+def _send(method: str, url: str, endpoint: str, resource: str, kwargs: dict):
+    """One attempt: governor, request, timing. Returns (response, requests exception or None)."""
+    wait = _GOVERNOR.acquire(resource)
+    started = time.monotonic()
+    error = None
+    if wait is None:
+        if not _GOVERNOR.warned:
+            _GOVERNOR.warned = True
+            print(f"⏳ GitHub rate budget ({resource}) for this node is spent; deferring calls to a later cycle")
+        resp = _FailedResponse(RuntimeError("rate budget spent"), status_code=429)
+    else:
+        if wait:
+            time.sleep(wait)
+        try:
+            resp = getattr(_gh_session(), method.lower())(url, **kwargs)
+            _GOVERNOR.observe(resource, resp)
+        except requests.RequestException as e:
+            print(f"⚠️ GitHub {endpoint} failed: {e}")
+            resp, error = _FailedResponse(e), e
+    elapsed = time.monotonic() - started
+    with _GH_LOCK:
+        stats = GITHUB_TIMINGS.setdefault(endpoint, {"calls": 0, "errors": 0, "seconds": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += elapsed
+        if not isinstance(resp.status_code, int) or not 200 <= resp.status_code < 400:
+            stats["errors"] += 1
+    return resp, error
+
+
+def _retry_reason(resp, error, safe_to_repeat: bool):
+    """Why this attempt is worth retrying, or None."""
+    if error is not None:
+        if isinstance(error, requests.ConnectTimeout) or (
+                safe_to_repeat and isinstance(error, (requests.ConnectionError, requests.Timeout))):
+            return type(error).__name__
+        return None
+    if isinstance(resp, _FailedResponse):   # refused by the governor: waiting is its call
+        return None
+    status = resp.status_code if isinstance(resp.status_code, int) else 0
+    text = resp.text if isinstance(getattr(resp, "text", None), str) else ""
+    if status == 429 or (status == 403 and (_rate_header(resp, "Retry-After") is not None
+                                            or "rate limit" in text.lower())):
+        return f"rate limited ({status})"
+    if status == 503 or (status >= 500 and safe_to_repeat):
+        return f"HTTP {status}"
+    return None
+
+
+def retry_pause(attempt: int, resp=None) -> bool:
+    """Sleep before retry number `attempt` (0-based): full-jitter exponential backoff, at least
+    Retry-After. Returns False, without sleeping, when the run's retry budget can't cover it."""
+    delay = random.uniform(0, min(GITHUB_BACKOFF_CAP, GITHUB_BACKOFF_BASE * 2 ** attempt))
+    delay = max(delay, _rate_header(resp, "Retry-After") or 0)
+    with _GH_LOCK:
+        if delay > _RETRY_BUDGET["seconds"]:
+            return False
+        _RETRY_BUDGET["seconds"] -= delay
+        _RETRY_BUDGET["retries"] += 1
+    time.sleep(delay)
+    return True
+
+
+def gh_request(method: str, url: str, **kwargs):
+    """Call GitHub on the shared keep-alive session (default timeout GITHUB_TIMEOUT), paced by the
+    rate governor, retried on transient failures, and recorded under its endpoint in
+    GITHUB_TIMINGS. A requests exception comes back as a status-0 _FailedResponse, a call the
+    governor refuses as a status-429 one."""
+    kwargs.setdefault("timeout", GITHUB_TIMEOUT)
+    endpoint = _endpoint(method, url)
+    graphql = endpoint.endswith(" /graphql")
+    resource = f"{_auth_key(kwargs.get('headers'))}/{'graphql' if graphql else 'core'}"
+    safe_to_repeat = method.upper() != "POST" or graphql
+    for attempt in range(GITHUB_MAX_RETRIES + 1):
+        resp, error = _send(method, url, endpoint, resource, kwargs)
+        reason = _retry_reason(resp, error, safe_to_repeat)
+        if reason is None or attempt == GITHUB_MAX_RETRIES:
+            break
+        if not retry_pause(attempt, resp):
+            print(f"⚠️ GitHub {endpoint}: {reason}; retry budget spent, giving up")
+            break
+        print(f"↻ GitHub {endpoint}: {reason}; retry {attempt + 1}/{GITHUB_MAX_RETRIES}")
+    return resp
+
+
+def log_github_timings(top: int = 5):
+    """One line per node run: total GitHub calls/time plus the slowest endpoints."""
+    if not GITHUB_TIMINGS:
+        return
+    calls = sum(s["calls"] for s in GITHUB_TIMINGS.values())
+    seconds = sum(s["seconds"] for s in GITHUB_TIMINGS.values())
+    slowest = sorted(GITHUB_TIMINGS.items(), key=lambda kv: kv[1]["seconds"], reverse=True)[:top]
+    detail = "; ".join(f"{ep} x{s['calls']} {s['seconds']:.2f}s" + (f" ({s['errors']} err)" if s["errors"] else "")
+                       for ep, s in slowest)
+    retries = f", {_RETRY_BUDGET['retries']} retried" if _RETRY_BUDGET["retries"] else ""
+    print(f"🌐 GitHub: {calls} call(s) in {seconds:.2f}s{retries} — {detail}")
+
+
+# ---------------------------------------------------------------- GitHub credential pool
+# Besides github_access_token, the optional github_token_pool data key lists more read credentials:
+#   "ghp_..." or {"token": "ghp_...", "repos": ["owner/*"]}                       personal tokens
+#   {"app_id": 1, "installation_id": 2, "private_key": "-----BEGIN ...", "repos": [...]}   App installs
+# `repos` (fnmatch patterns, optional) limits which repos a credential may serve. Installation tokens
+# are minted on demand (needs PyJWT with cryptography), cached in github_app_tokens across nodes and
+# re-minted APP_TOKEN_REFRESH_SECONDS before they expire. Each repo is routed to the covering
+# credential with the most remaining core budget and keeps it for the rest of the run. Duplicated in
+# fetch_pull_requests.py and study_repos.py (nodes never import siblings); keep the copies identical.
+GITHUB_TOKEN_POOL_KEY = "github_token_pool"
+GITHUB_APP_TOKENS_KEY = "github_app_tokens"
+APP_TOKEN_REFRESH_SECONDS = 300
+ASSUMED_RATE_LIMIT = 5000   # budget assumed for a credential with no reading yet
+ROUTE_COST_PER_REPO = 25    # expected calls per routed repo, so concurrent routing spreads out
+_POOL = {"credentials": [], "by_repo": {}, "app_tokens": {}, "minted": False}
+_POOL_LOCK = threading.Lock()
+_MINT_LOCK = threading.Lock()   # one installation-token mint at a time; never held with _POOL_LOCK
+
+
+def load_token_pool(default_token: str, pool=None, app_tokens=None):
+    """Build the credential list: github_access_token first, then github_token_pool entries."""
+    pool = waveassist.fetch_data(GITHUB_TOKEN_POOL_KEY, default=[]) if pool is None else pool
+    app_tokens = waveassist.fetch_data(GITHUB_APP_TOKENS_KEY, default={}) if app_tokens is None else app_tokens
+    credentials = [{"id": _token_key(default_token), "token": default_token, "repos": []}] if default_token else []
+    for entry in pool if isinstance(pool, list) else []:
+        if isinstance(entry, str) and entry:
+            entry = {"token": entry}
+        if not isinstance(entry, dict):
+            continue
+        repos = [p for p in (entry.get("repos") or []) if isinstance(p, str)]
+        if entry.get("token"):
+            credentials.append({"id": _token_key(entry["token"]), "token": entry["token"], "repos": repos})
+        elif entry.get("app_id") and entry.get("installation_id") and entry.get("private_key"):
+            credentials.append({"id": f"app{entry['installation_id']}", "token": None, "repos": repos,
+                                "app": {k: entry[k] for k in ("app_id", "installation_id", "private_key")}})
+    with _POOL_LOCK:
+        _POOL.update(credentials=credentials, by_repo={}, minted=False,
+                     app_tokens=dict(app_tokens) if isinstance(app_tokens, dict) else {})
+
+
+def _token_key(token: str) -> str:
+    return _auth_key({"Authorization": f"token {token}"})
+
+
+def _mint_app_token(cred: dict):
+    """A valid installation token for an App credential: cached, or minted via a signed JWT."""
+    app = cred["app"]
+    iid = str(app["installation_id"])
+    with _POOL_LOCK:
+        cached = _POOL["app_tokens"].get(iid) or {}
+    try:
+        expires = datetime.fromisoformat(str(cached.get("expires_at")).replace("Z", "+00:00"))
+        if (expires - datetime.now(timezone.utc)).total_seconds() > APP_TOKEN_REFRESH_SECONDS:
+            return cached.get("token")
+    except ValueError:
+        pass
+    try:
+        import jwt   # optional dependency, only needed for App credentials
+    except ImportError:
+        print(f"⚠️ GitHub App credential {cred['id']} needs PyJWT[crypto]; skipping it")
+        return None
+    now = int(time.time())
+    try:
+        assertion = jwt.encode({"iat": now - 60, "exp": now + 540, "iss": str(app["app_id"])},
+                               app["private_key"], algorithm="RS256")
+    except Exception as e:
+        print(f"⚠️ GitHub App credential {cred['id']}: cannot sign JWT ({e}); skipping it")
+        return None
+    resp = gh_request("POST", f"https://api.github.com/app/installations/{iid}/access_tokens",
+                      headers={"Authorization": f"Bearer {assertion}", "Accept": "application/vnd.github+json"})
+    if resp.status_code != 201:
+        print(f"⚠️ GitHub App credential {cred['id']}: token mint failed HTTP {resp.status_code}")
+        return None
+    body = resp.json()
+    with _POOL_LOCK:
+        _POOL["app_tokens"][iid] = {"token": body.get("token"), "expires_at": body.get("expires_at")}
+        _POOL["minted"] = True
+    return body.get("token")
+
+
+def token_for_repo(repo_path: str, default: str = "") -> str:
+    """Token to read `repo_path` with: the covering credential with the most remaining core
+    budget, fixed for the rest of the run. `default` when no pool is loaded. The credential is
+    chosen under _POOL_LOCK, but an App token is minted outside it (a network round trip), and the
+    choice is made again once the token is in place."""
+    while True:
+        with _POOL_LOCK:
+            if repo_path in _POOL["by_repo"]:
+                return _POOL["by_repo"][repo_path]["token"]
+            covering = [c for c in _POOL["credentials"]
+                        if not c.get("disabled")
+                        and (not c["repos"] or any(fnmatch.fnmatch(repo_path, p) for p in c["repos"]))]
+            load = {}
+            for cred in _POOL["by_repo"].values():
+                load[cred["id"]] = load.get(cred["id"], 0) + 1
+
+            def score(cred):
+                remaining = _GOVERNOR.remaining(f"{cred['id']}/core")
+                budget = ASSUMED_RATE_LIMIT if remaining is None else remaining
+                return budget - ROUTE_COST_PER_REPO * load.get(cred["id"], 0)
+
+            if not covering:
+                return default
+            cred = max(covering, key=score)
+            if not (cred.get("app") and not cred["token"]):
+                _POOL["by_repo"][repo_path] = cred
+                return cred["token"]
+        with _MINT_LOCK:
+            with _POOL_LOCK:
+                pending = not cred["token"] and not cred.get("disabled")   # another thread may have minted it
+            if pending:
+                token = _mint_app_token(cred)
+                with _POOL_LOCK:
+                    if not token:
+                        cred["disabled"] = True
+                    else:
+                        cred["token"] = token
+                        # Installation tokens rotate; alias them so the governor keeps one bucket per install.
+                        TOKEN_ALIASES[hashlib.sha256(token.encode()).hexdigest()[:10]] = cred["id"]
+
+
+def store_token_pool():
+    """Persist newly minted installation tokens so later nodes reuse them instead of re-minting."""
+    if _POOL["minted"]:
+        waveassist.store_data(GITHUB_APP_TOKENS_KEY, _POOL["app_tokens"], data_type="json")
+
+
+# ---------------------------------------------------------------- local git mirror
+# Optional alternative to the REST diff / contents endpoints: when the "git_mirror_dir" data key
+# names a directory that survives between runs, each repo gets a bare repository there, fetched
+# incrementally with just the refs a cycle needs. One `git fetch` then replaces the per-PR and
+# per-file REST calls. Any git failure falls back to the API. Duplicated in fetch_pull_requests.py and
+# study_repos.py (nodes never import siblings); keep the copies identical.
+GIT_MIRROR_DIR_KEY = "git_mirror_dir"
+GIT_REMOTE = "https://github.com/{repo}.git"
+GIT_TIMEOUT = 600
+
+
+class GitMirror:
+    """Bare mirror of one repository under `root`."""
+
+    def __init__(self, root: str, repo_path: str, token: str = "", remote: str = None):
+        self.repo_path = repo_path
+        self.path = os.path.join(root, repo_path.replace("/", "__") + ".git")
+        self.remote = remote or GIT_REMOTE.format(repo=repo_path)
+        self.token = token
+
+    def _cmd(self, *args) -> list:   # unquoted paths, so diff headers match `--raw -z` and the API
+        return ["git", "-c", "core.quotePath=false", "--git-dir", self.path, *args]
+
+    def _env(self) -> dict:
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        if self.token:   # passed through the environment: never in argv or the mirror's config
+            basic = base64.b64encode(f"x-access-token:{self.token}".encode()).decode()
+            env.update(GIT_CONFIG_COUNT="1", GIT_CONFIG_KEY_0="http.extraHeader",
+                       GIT_CONFIG_VALUE_0=f"Authorization: Basic {basic}")
+        return env
+
+    def git(self, *args, input: bytes = None) -> subprocess.CompletedProcess:
+        """Run a git command against the mirror; a missing binary or a timeout reads as a failure."""
+        try:
+            return subprocess.run(self._cmd(*args), input=input, capture_output=True, env=self._env(),
+                                  timeout=GIT_TIMEOUT)
+        except (OSError, subprocess.SubprocessError) as e:
+            return subprocess.CompletedProcess(args, 1, b"", str(e).encode())
+
+    def fetch(self, refspecs: list) -> bool:
+        """Create the mirror on first use, then fetch `refspecs` in one round trip."""
+        if not os.path.isdir(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if self.git("init", "--quiet", "--bare").returncode:
+                return False
+        if not refspecs:
+            return True
+        r = self.git("fetch", "--quiet", "--no-tags", self.remote, *refspecs)
+        if r.returncode:
+            print(f"⚠️ git fetch {self.repo_path} failed: {r.stderr.decode('utf-8', 'replace').strip()[:300]}")
+        return r.returncode == 0
+
+    def missing(self, revs: list) -> list:
+        """The revisions in `revs` the mirror does not have yet."""
+        if not revs:
+            return []
+        r = self.git("cat-file", "--batch-check", input=("\n".join(revs) + "\n").encode())
+        if r.returncode:
+            return list(revs)
+        lines = r.stdout.decode("utf-8", "replace").splitlines()
+        return [rev for rev, line in zip(revs, lines) if line.endswith(" missing")]
+
+    def diff_lines(self, base: str, head: str, paths: list = None):
+        """Yield the lines of `git diff base...head` (head against its merge-base with base, as a
+        PR shows it), streamed, optionally limited to literal `paths`. Raises RuntimeError if git
+        fails."""
+        cmd = self._cmd("diff", "--no-color", "--no-ext-diff", "--find-renames",
+                        "--src-prefix=a/", "--dst-prefix=b/", f"{base}...{head}", "--", *(paths or []))
+        env = dict(self._env(), GIT_LITERAL_PATHSPECS="1")
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env) as proc:
+            for line in proc.stdout:
+                yield line[:-1].decode("utf-8", "replace") if line.endswith(b"\n") else line.decode("utf-8", "replace")
+            err = proc.stderr.read()
+        if proc.returncode:
+            raise RuntimeError(err.decode("utf-8", "replace").strip()[:300])
+
+    def ls_tree(self, rev: str) -> list:
+        """Every blob path at `rev`, or [] if git fails."""
+        r = self.git("ls-tree", "-r", "--name-only", "-z", rev)
+        return [] if r.returncode else [p for p in r.stdout.decode("utf-8", "replace").split("\0") if p]
+
+    def cat_file(self, rev: str, path: str):
+        """Content of `path` at `rev` via `git cat-file`, or None if it is not there."""
+        r = self.git("cat-file", "blob", f"{rev}:{path}")
+        return None if r.returncode else r.stdout.decode("utf-8", errors="ignore")
+
+
+# ---------------------------------------------------------------- GitHub REST: pages, PR files, diffs
+
 def _has_next_page(resp) -> bool:
     """Defensive Link-header 'next' check. A non-dict .links (e.g. a bare test Mock) means
     'no next page', so legacy single-response mocks stay single-page instead of looping forever."""
@@ -18,15 +626,217 @@ def _has_next_page(resp) -> bool:
     return isinstance(links, dict) and "next" in links
 
 
+def _last_page(resp):
+    """Page number from the Link header's rel="last" URL, or None when it isn't exposed."""
+    links = getattr(resp, "links", None)
+    if not isinstance(links, dict) or "last" not in links:
+        return None
+    try:
+        return int(parse_qs(urlparse(links["last"].get("url", "")).query)["page"][0])
+    except Exception:
+        return None
+
+
+def _iter_pages(url: str, headers: dict, params: dict = None, cache: dict = None, slim=None,
+                parallel: bool = True):
+    """Yield each page's response in page order. Once the first response's Link header gives
+    rel="last", the remaining pages are fetched concurrently (PAGE_CONCURRENCY workers) and yielded
+    in order; otherwise rel="next" is followed one page at a time. Stops after a non-200 page, so
+    callers keep their per-page failure handling."""
+    params = dict(params or {}, page=1)
+    resp = _conditional_get(url, headers, params, cache, slim=slim)
+    yield resp
+    if resp.status_code != 200:
+        return
+    last = _last_page(resp) if parallel else None
+    if last and last > 1:
+        def get_page(page):
+            return _conditional_get(url, headers, dict(params, page=page), cache, slim=slim)
+        with ThreadPoolExecutor(max_workers=min(PAGE_CONCURRENCY, last - 1)) as pool:
+            for resp in pool.map(get_page, range(2, last + 1)):
+                yield resp
+                if resp.status_code != 200:
+                    return
+        return
+    while _has_next_page(resp):
+        params["page"] += 1
+        resp = _conditional_get(url, headers, params, cache, slim=slim)
+        yield resp
+        if resp.status_code != 200:
+            return
+
+
+def _resp_header(resp, name: str):
+    """Defensive response-header read (a bare test Mock has no real headers mapping)."""
+    hdrs = getattr(resp, "headers", None)
+    return hdrs.get(name) if isinstance(hdrs, Mapping) else None
+
+
+def _slim_pr(pr: dict) -> dict:
+    """Only the PR fields GitZoid reads. Cached list bodies are stored slimmed, since a raw PR
+    object embeds both full repo objects and is ~10x larger than what we use."""
+    user = pr.get("user") or {}
+    head = pr.get("head") or {}
+    base = pr.get("base") or {}
+    return {
+        "number": pr.get("number"),
+        "title": pr.get("title"),
+        "body": pr.get("body"),
+        "created_at": pr.get("created_at"),
+        "updated_at": pr.get("updated_at"),
+        "draft": pr.get("draft"),
+        "user": {"login": user.get("login"), "type": user.get("type")},
+        "head": {"sha": head.get("sha"), "ref": head.get("ref")},
+        "base": {"sha": base.get("sha"), "ref": base.get("ref")},
+    }
+
+
+def _clip_patch(patch: str, limit: int) -> tuple[str, int, bool]:
+    """Cut `patch` to at most `limit` UTF-8 bytes, ending on a whole line so hunk parsing stays
+    valid. Returns (patch, size in bytes, truncated)."""
+    data = (patch or "").encode("utf-8")
+    if len(data) <= limit:
+        return patch or "", len(data), False
+    cut = max(data.rfind(b"\n", 0, max(limit, 0) + 1), 0)
+    return data[:cut].decode("utf-8", "ignore"), cut, True
+
+
+def _slim_file(f: dict) -> dict:
+    """Only the per-file fields GitZoid reads from /pulls/{n}/files, with the patch already held to
+    MAX_FILE_PATCH_BYTES so cached listings stay small too."""
+    slim = {k: f.get(k) for k in ("filename", "patch", "status", "additions", "deletions", "sha") if k in f}
+    if slim.get("patch"):
+        slim["patch"], _, truncated = _clip_patch(slim["patch"], MAX_FILE_PATCH_BYTES)
+        if truncated:
+            slim["truncated"] = True
+    return slim
+
+
+class _CachedResponse:
+    """Stand-in for a requests.Response replayed from the conditional cache after a 304."""
+
+    def __init__(self, entry: dict):
+        self.status_code = 200
+        self.headers = {}
+        self.links = {"next": {"url": ""}} if entry.get("has_next") else {}
+        if entry.get("last_page"):
+            self.links["last"] = {"url": f"?page={entry['last_page']}"}
+        self._body = entry.get("body")
+
+    def json(self):
+        return self._body
+
+
+def _cache_key(url: str, params: dict = None) -> str:
+    query = "&".join(f"{k}={params[k]}" for k in sorted(params or {}))
+    return f"{url}?{query}" if query else url
+
+
+def _conditional_get(url: str, headers: dict, params: dict = None, cache: dict = None, slim=None):
+    """GET with If-None-Match / If-Modified-Since from `cache` (url+params -> entry). A 304 replays
+    the cached body as a 200; a fresh 200 with a validator refreshes the entry (body passed through
+    `slim` first). Without a cache this is a plain GET."""
+    if cache is None:
+        return gh_request("GET", url, headers=headers, params=params)
+    key = _cache_key(url, params)
+    entry = cache.get(key)
+    req_headers = dict(headers or {})
+    if isinstance(entry, dict):
+        if entry.get("etag"):
+            req_headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            req_headers["If-Modified-Since"] = entry["last_modified"]
+    resp = gh_request("GET", url, headers=req_headers, params=params)
+    if resp.status_code == 304 and isinstance(entry, dict):
+        with _STATS_LOCK:
+            HTTP_CACHE_STATS["not_modified"] += 1
+        return _CachedResponse(entry)
+    if resp.status_code == 200:
+        etag, last_modified = _resp_header(resp, "ETag"), _resp_header(resp, "Last-Modified")
+        if etag or last_modified:
+            try:
+                body = resp.json()
+            except Exception:
+                return resp
+            if isinstance(body, list) and slim:
+                body = [slim(x) for x in body if isinstance(x, dict)]
+            fresh = {"etag": etag, "last_modified": last_modified, "body": body,
+                     "has_next": _has_next_page(resp), "last_page": _last_page(resp),
+                     "at": datetime.now(timezone.utc).isoformat()}
+            if len(json.dumps(body)) <= HTTP_CACHE_MAX_ENTRY_BYTES:
+                cache[key] = fresh
+                with _STATS_LOCK:
+                    HTTP_CACHE_STATS["stored"] += 1
+            else:
+                cache.pop(key, None)   # too big to keep: its old validator would replay a stale body
+            return _CachedResponse(fresh)   # body already parsed; don't parse it twice
+    return resp
+
+
+def prune_http_cache(cache: dict, now=None) -> int:
+    """Drop entries not refreshed by a 200 within HTTP_CACHE_TTL_DAYS. Returns how many were removed."""
+    now = now or datetime.now(timezone.utc)
+    stale = []
+    for key, entry in cache.items():
+        try:
+            age = now - datetime.fromisoformat(entry["at"].replace("Z", "+00:00"))
+            if age.days >= HTTP_CACHE_TTL_DAYS:
+                stale.append(key)
+        except Exception:
+            stale.append(key)
+    for key in stale:
+        del cache[key]
+    return len(stale)
+
+
+def bound_http_cache(cache: dict, max_bytes: int = HTTP_CACHE_MAX_BYTES) -> int:
+    """Evict the least recently refreshed entries until `cache` serializes to at most `max_bytes`.
+    Returns how many were removed."""
+    sizes = {key: len(json.dumps(entry)) for key, entry in cache.items()}
+    total, removed = sum(sizes.values()), 0
+    for key in sorted(cache, key=lambda k: str((cache[k] or {}).get("at") if isinstance(cache[k], dict) else "")):
+        if total <= max_bytes:
+            break
+        total -= sizes[key]
+        del cache[key]
+        removed += 1
+    return removed
+
+
+def http_cache_shard_key(repo_path: str) -> str:
+    return f"{HTTP_CACHE_SHARD_PREFIX}{repo_path}"
+
+
+def load_http_cache_shard(repo_path: str) -> dict:
+    """One repo's conditional-request cache from its own storage key."""
+    shard = waveassist.fetch_data(http_cache_shard_key(repo_path), default={}) or {}
+    return shard if isinstance(shard, dict) else {}
+
+
+def store_http_cache_shard(repo_path: str, cache: dict, refreshed: bool) -> bool:
+    """Prune and bound one repo's cache, then write it if anything changed. Returns whether it did."""
+    if prune_http_cache(cache) + bound_http_cache(cache) or refreshed:
+        waveassist.store_data(http_cache_shard_key(repo_path), cache, data_type="json")
+        return True
+    return False
+
+
+def drop_legacy_http_cache() -> bool:
+    """Empty the legacy single `http_cache` blob (a cache: nothing to migrate)."""
+    if not waveassist.fetch_data(HTTP_CACHE_KEY, default={}):
+        return False
+    waveassist.store_data(HTTP_CACHE_KEY, {}, data_type="json")
+    return True
+
+
 def fetch_compare_diff(repo_path: str, base_sha: str, head_sha: str, headers: dict) -> list:
     """
     Fetch the changed files between two commits using the GitHub Compare API (paginated).
     GET /repos/{owner}/{repo}/compare/{base_sha}...{head_sha}
     """
     url = f"https://api.github.com/repos/{repo_path}/compare/{base_sha}...{head_sha}"
-    processed_files, page = [], 1
-    while True:
-        response = requests.get(url, headers=headers, params={"per_page": 100, "page": page}, timeout=30)
+    processed_files = []
+    for response in _iter_pages(url, headers, {"per_page": 100}):
         if response.status_code != 200:
             print(f"⚠️ Failed to fetch compare diff: {response.status_code}")
             return processed_files
@@ -44,18 +854,19 @@ def fetch_compare_diff(repo_path: str, base_sha: str, head_sha: str, headers: di
                     "additions": f.get("additions", 0),
                     "deletions": f.get("deletions", 0),
                 })
-        if not _has_next_page(response):
-            break
-        page += 1
     return processed_files
 
 
-def fetch_pr_files(repo_path: str, pr_number: int, headers: dict) -> list:
-    """Fetch all changed files for a PR (full diff, paginated)."""
+def fetch_pr_files(repo_path: str, pr_number: int, headers: dict, cache: dict = None) -> list:
+    """Fetch all changed files for a PR (full diff, paginated). With a conditional `cache`, pages
+    that are unchanged since the last fetch come back as free 304s. Patches are held to
+    MAX_FILE_PATCH_BYTES each and MAX_PR_PATCH_BYTES in total while each page is consumed, so only
+    one page is ever held in full; files that were cut are marked "truncated": True."""
     files_url = f"https://api.github.com/repos/{repo_path}/pulls/{pr_number}/files"
-    processed_files, page = [], 1
-    while True:
-        resp = requests.get(files_url, headers=headers, params={"per_page": 100, "page": page}, timeout=30)
+    processed_files = []
+    budget = MAX_PR_PATCH_BYTES
+    truncated_count = 0
+    for resp in _iter_pages(files_url, headers, {"per_page": 100}, cache, slim=_slim_file):
         if resp.status_code != 200:
             print(f"⚠️ Failed to fetch files for PR #{pr_number}")
             return processed_files
@@ -68,26 +879,434 @@ def fetch_pr_files(repo_path: str, pr_number: int, headers: dict) -> list:
             break
         for f in files_changed:
             if "filename" in f:
-                processed_files.append({
+                patch, size, truncated = _clip_patch(f.get("patch", ""), min(MAX_FILE_PATCH_BYTES, budget))
+                budget -= size
+                file_data = {
                     "filename": f["filename"],
-                    "patch": f.get("patch", ""),
+                    "patch": patch,
                     "status": f.get("status", "modified"),
                     "additions": f.get("additions", 0),
                     "deletions": f.get("deletions", 0),
-                })
-        if not _has_next_page(resp):
-            break
-        page += 1
+                }
+                if truncated or f.get("truncated"):
+                    file_data["truncated"] = True
+                    if f.get("sha"):
+                        file_data["sha"] = f["sha"]
+                    truncated_count += 1
+                processed_files.append(file_data)
+    if truncated_count:
+        print(f"✂️ PR #{pr_number}: {truncated_count} file diff(s) truncated to the ingestion budget")
+    if _files_listing_incomplete(processed_files):
+        print(f"📄 PR #{pr_number}: files API listing is incomplete; falling back to the raw diff")
+        diff_files = fetch_pr_diff(repo_path, pr_number, headers)
+        if diff_files:
+            return diff_files
     return processed_files
 
 
+def _files_listing_incomplete(files: list) -> bool:
+    """True when /pulls/{n}/files hit its 3,000-file cap, or left out the patch of a file with
+    changed lines (GitHub does that for large files; files we cut ourselves are flagged truncated)."""
+    if len(files) >= FILES_API_MAX_FILES:
+        return True
+    return any(not f.get("patch") and not f.get("truncated") and (f.get("additions") or f.get("deletions"))
+               for f in files)
+
+
+def _iter_stream_lines(resp, chunk_size: int = 64 * 1024):
+    """Yield the decoded lines of a streamed response body, split on "\n" only (a patch line may
+    contain a bare "\r"), holding at most one chunk plus a partial line."""
+    carry = b""
+    for chunk in resp.iter_content(chunk_size=chunk_size):
+        if not chunk:
+            continue
+        lines = (carry + chunk).split(b"\n")
+        carry = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8", "replace")
+    if carry:
+        yield carry.decode("utf-8", "replace")
+
+
+_C_ESCAPES = {"a": 7, "b": 8, "t": 9, "n": 10, "v": 11, "f": 12, "r": 13, '"': 34, "\\": 92}
+
+
+def _unquote_c(text: str) -> str:
+    """Decode a git C-quoted path body: backslash escapes, with \\ooo octal bytes read as UTF-8."""
+    out, i = bytearray(), 0
+    while i < len(text):
+        ch = text[i]
+        if ch != "\\" or i + 1 == len(text):
+            out += ch.encode("utf-8")
+            i += 1
+        elif text[i + 1] in "01234567" and len(text) >= i + 4:
+            out.append(int(text[i + 1:i + 4], 8) & 0xFF)
+            i += 4
+        else:
+            out.append(_C_ESCAPES.get(text[i + 1], ord(text[i + 1])))
+            i += 2
+    return out.decode("utf-8", "replace")
+
+
+def _diff_path(path: str, prefixed: bool = True) -> str:
+    """Undo git's C-style quoting of a diff header path (`"caf\\303\\251.py"` -> café.py) and, for
+    ---/+++ paths, strip the a/ or b/ prefix."""
+    path = path.strip()
+    if len(path) > 1 and path[0] == path[-1] == '"':
+        path = _unquote_c(path[1:-1])
+    return path[2:] if prefixed and path[:2] in ("a/", "b/") else path
+
+
+def _diff_header_path(rest: str) -> str:
+    """The b/ path of a `diff --git a/X b/Y` header (either side may be quoted)."""
+    if rest.endswith('"') and ' "b/' in rest:
+        return _diff_path(rest[rest.rindex(' "b/') + 1:])
+    return rest.rpartition(" b/")[2]
+
+
+def split_unified_diff(lines, file_budget: int = None, pr_budget: int = None) -> list:
+    """Split unified-diff lines (as produced by `git diff` / the v3.diff media type) into the same
+    {filename, patch, status, additions, deletions} records the files API gives. Patch text is kept
+    within the byte budgets as it is read; a file that does not fit is flagged "truncated"."""
+    file_budget = MAX_FILE_PATCH_BYTES if file_budget is None else file_budget
+    budget = MAX_PR_PATCH_BYTES if pr_budget is None else pr_budget
+    files, current, kept, size, in_hunk, blob = [], None, [], 0, False, None
+
+    def finish():
+        nonlocal budget
+        if current is not None:
+            current["patch"] = "\n".join(kept)
+            budget -= size
+            files.append(current)
+
+    for line in lines:
+        if line.startswith("diff --git "):
+            finish()
+            current = {"filename": _diff_header_path(line[len("diff --git "):]), "patch": "",
+                       "status": "modified", "additions": 0, "deletions": 0}
+            kept, size, in_hunk, blob = [], 0, False, None
+            continue
+        if current is None:
+            continue
+        if not in_hunk:
+            if line.startswith("@@"):
+                in_hunk = True
+            elif line.startswith("index "):
+                blob = line[len("index "):].split()[0].partition("..")[2] or None
+                continue
+            elif line.startswith("new file mode"):
+                current["status"] = "added"
+                continue
+            elif line.startswith("deleted file mode"):
+                current["status"] = "removed"
+                continue
+            elif line.startswith("rename to "):
+                current["status"] = "renamed"
+                current["filename"] = _diff_path(line[len("rename to "):], prefixed=False)
+                continue
+            elif line.startswith("+++ ") and line[4:].strip() != "/dev/null":
+                current["filename"] = _diff_path(line[4:])
+                continue
+            else:
+                continue   # index / mode / similarity / --- / Binary files ... lines
+        if line.startswith("+"):
+            current["additions"] += 1
+        elif line.startswith("-"):
+            current["deletions"] += 1
+        line_size = len(line.encode("utf-8")) + (1 if kept else 0)
+        if current.get("truncated") or size + line_size > min(file_budget, budget):
+            current["truncated"] = True
+            if blob:
+                current["sha"] = blob
+            continue
+        kept.append(line)
+        size += line_size
+    finish()
+    return files
+
+
+def fetch_pr_diff(repo_path: str, pr_number: int, headers: dict) -> list:
+    """The PR's changes from its raw unified diff (v3.diff media type), streamed and split into
+    per-file records. Returns [] on failure (GitHub refuses this media type for very large diffs)."""
+    url = f"https://api.github.com/repos/{repo_path}/pulls/{pr_number}"
+    resp = gh_request("GET", url, headers=dict(headers or {}, Accept=DIFF_MEDIA_TYPE), stream=True)
+    try:
+        if resp.status_code != 200:
+            print(f"⚠️ Failed to fetch diff for PR #{pr_number}: {resp.status_code}")
+            return []
+        return split_unified_diff(_iter_stream_lines(resp))
+    finally:
+        resp.close()
+
+
+# ---------------------------------------------------------------- content-addressed patch cache
+# A file's PR patch depends only on its base and head blobs, so per-file patch records are cached
+# under (repo, filename, base blob sha, head blob sha). After a push, a re-review re-diffs only the
+# files whose blobs moved. Both SHAs come from `git diff --raw --full-index` in the git mirror. The
+# REST files listing reports only the head blob and always ships every patch, so there the page
+# ETags of the conditional cache stay the delta mechanism. LRU by bytes, kept next to the mirrors
+# (patch_cache.json), with hit/miss counters.
+PATCH_CACHE_FILE = "patch_cache.json"
+PATCH_CACHE_MAX_BYTES = 32 * 1024 * 1024
+PATCH_CACHE_PATHSPEC_LIMIT = 500   # more misses than this: one full diff beats a long pathspec
+
+
+class PatchCache:
+    """Size-bounded LRU of per-file patch records, shared by the repo fetch threads."""
+
+    def __init__(self, max_bytes: int = PATCH_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()   # key -> (record, size), least recently used first
+        self.bytes = 0
+        self.hits = self.misses = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(repo_path: str, filename: str, base_blob: str, head_blob: str) -> str:
+        return f"{repo_path}:{base_blob}:{head_blob}:{filename}"   # fixed-width SHAs keep it unambiguous
+
+    def get(self, key: str):
+        with self.lock:
+            hit = self.entries.get(key)
+            if hit is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return dict(hit[0])
+
+    def put(self, key: str, record: dict):
+        size = len(json.dumps(record))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (dict(record), size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self.bytes -= self.entries.popitem(last=False)[1][1]
+            self.dirty = True
+
+    def load(self, path: str):
+        """Read a saved cache (oldest entry first); a missing or unreadable file starts empty."""
+        try:
+            with open(path, encoding="utf-8") as fh:
+                saved = json.load(fh)
+        except (OSError, ValueError):
+            return
+        for key, record in saved if isinstance(saved, list) else []:
+            if isinstance(key, str) and isinstance(record, dict):
+                self.put(key, record)
+        self.dirty = False
+
+    def save(self, path: str):
+        """Write the cache atomically, only when it changed."""
+        if not self.dirty:
+            return
+        tmp = f"{path}.tmp"
+        with self.lock, open(tmp, "w", encoding="utf-8") as fh:
+            json.dump([[key, record] for key, (record, _) in self.entries.items()], fh)
+        os.replace(tmp, path)
+        self.dirty = False
+
+    def summary(self) -> str:
+        return f"{self.hits} hit(s), {self.misses} miss(es), {len(self.entries)} file(s) / {self.bytes // 1024} KiB held"
+
+
+_PATCH_CACHE = PatchCache()
+
+
+def sync_pr_mirror(mirror: GitMirror, prs: list) -> bool:
+    """Bring `mirror` up to date for `prs` in one fetch: their base branches (which move) and each
+    PR head not mirrored yet."""
+    bases = sorted({(pr.get("base") or {}).get("ref") for pr in prs} - {None, ""})
+    heads = {(pr.get("head") or {}).get("sha"): pr["number"] for pr in prs if (pr.get("head") or {}).get("sha")}
+    refspecs = [f"+refs/heads/{b}:refs/heads/{b}" for b in bases]
+    refspecs += [f"+refs/pull/{heads[sha]}/head:refs/pull/{heads[sha]}/head" for sha in mirror.missing(list(heads))]
+    return mirror.fetch(refspecs)
+
+
+def mirror_pr_files(mirror: GitMirror, pr: dict, cache: "PatchCache" = None):
+    """The PR's changed files from `git diff base...head` in the mirror, as the same records
+    fetch_pr_files returns (same byte budgets), or None when the mirror can't produce them. With a
+    `cache`, files whose base and head blobs were diffed before are served from it and only the
+    rest are re-diffed."""
+    base, head = (pr.get("base") or {}).get("ref"), (pr.get("head") or {}).get("sha")
+    if not base or not head:
+        return None
+    base = f"refs/heads/{base}"
+    try:
+        if cache is None:
+            return split_unified_diff(mirror.diff_lines(base, head))
+        changes = mirror_raw_changes(mirror, base, head)
+        if changes is None:
+            return None
+        keys = {path: cache.key(mirror.repo_path, path, old, new) for path, _, old, new in changes}
+        records = {path: cache.get(key) for path, key in keys.items()}
+        missing = [c for c in changes if records[c[0]] is None]
+        if missing:
+            # Whole-PR budget applies after assembly, so each fresh record is held to the file budget only.
+            paths = None if len(missing) == len(changes) or len(missing) > PATCH_CACHE_PATHSPEC_LIMIT \
+                else [p for path, old_path, _, _ in missing for p in {path, old_path or path}]
+            for rec in split_unified_diff(mirror.diff_lines(base, head, paths), pr_budget=1 << 62):
+                if rec["filename"] in keys and records.get(rec["filename"]) is None:
+                    records[rec["filename"]] = rec
+                    cache.put(keys[rec["filename"]], rec)
+        return apply_pr_budget([records[path] for path, _, _, _ in changes if records.get(path) is not None],
+                               {path: new for path, _, _, new in changes})
+    except (OSError, RuntimeError) as e:
+        print(f"⚠️ git diff for PR #{pr.get('number')} failed ({e}); using the API")
+        return None
+
+
+def mirror_raw_changes(mirror: GitMirror, base: str, head: str):
+    """[(path, old path if renamed, base blob sha, head blob sha), ...] for `git diff base...head`,
+    in diff order, from `--raw --full-index` (no patch text), or None if git fails."""
+    r = mirror.git("diff", "--raw", "-z", "--full-index", "--find-renames", f"{base}...{head}")
+    if r.returncode:
+        return None
+    tokens = r.stdout.decode("utf-8", "replace").split("\0")
+    changes, i = [], 0
+    while i < len(tokens) and tokens[i].startswith(":"):
+        _, _, old, new, status = tokens[i][1:].split()[:5]
+        if status[:1] in ("R", "C"):
+            changes.append((tokens[i + 2], tokens[i + 1], old, new))
+            i += 3
+        else:
+            changes.append((tokens[i + 1], None, old, new))
+            i += 2
+    return changes
+
+
+def apply_pr_budget(files: list, head_blobs: dict = None) -> list:
+    """Hold the patches of `files` to MAX_PR_PATCH_BYTES in total, in order, flagging cut files. A
+    cut file gets its head blob sha from `head_blobs` ({path: sha}), so patch_digest still sees
+    changes past the cut."""
+    budget = MAX_PR_PATCH_BYTES
+    out = []
+    for f in files:
+        patch, size, truncated = _clip_patch(f.get("patch", ""), min(MAX_FILE_PATCH_BYTES, budget))
+        budget -= size
+        f = dict(f, patch=patch)
+        if truncated or f.get("truncated"):
+            f["truncated"] = True
+            if (head_blobs or {}).get(f.get("filename")):
+                f["sha"] = head_blobs[f["filename"]]
+        out.append(f)
+    return out
+
+
+def list_open_prs(repo_path: str, headers: dict, http_cache: dict = None, max_age_days: int = None,
+                  since: str = None):
+    """Open PRs for a repo via REST (newest first, paginated). Returns (prs, complete), or
+    (None, False) on failure. With `max_age_days`, paging stops once a page's oldest PR is past
+    that age — every later page is older still — and `complete` tells whether anything was left.
+    With `since` (an ISO updated_at), PRs are listed most-recently-updated first instead and paging
+    stops at the first page reaching back past `since`."""
+    prs_url = f"https://api.github.com/repos/{repo_path}/pulls"
+    params = {
+        "state": "open",
+        "sort": "updated" if since else "created",
+        "direction": "desc",
+        "per_page": 100,  # Get all open PRs
+    }
+    open_prs = []
+    # With a cutoff, sequential paging can stop early, which saves more than parallelism buys.
+    for response in _iter_pages(prs_url, headers, params, http_cache, slim=_slim_pr,
+                                parallel=max_age_days is None and not since):
+        if response.status_code != 200:
+            print(f"❌ Failed to fetch PRs for {repo_path}: {response.status_code}")
+            return None, False
+        try:
+            page_prs = response.json()
+        except Exception as e:
+            print(f"❌ Invalid PR JSON response: {e}")
+            return None, False
+        if not page_prs:
+            break
+        open_prs.extend(page_prs)
+        if since:
+            if (page_prs[-1].get("updated_at") or "") < since and _has_next_page(response):
+                return open_prs, False
+        elif max_age_days is not None and is_old_pr(page_prs[-1], days=max_age_days) \
+                and _has_next_page(response):
+            return open_prs, False
+    return open_prs, True
+
+
+def build_discovery_query(repo_paths: list) -> tuple[str, dict]:
+    """One aliased GraphQL query listing open PRs for every repo in `repo_paths` (r0, r1, ...).
+    Owner/name go in as variables so repo names never need escaping."""
+    var_defs, fields, variables = [], [], {}
+    for i, repo_path in enumerate(repo_paths):
+        owner, _, name = repo_path.partition("/")
+        var_defs.append(f"$o{i}: String!, $n{i}: String!")
+        variables[f"o{i}"], variables[f"n{i}"] = owner, name
+        fields.append(
+            f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ "
+            f"pullRequests(states: OPEN, first: 100, orderBy: {{field: CREATED_AT, direction: DESC}}) {{ "
+            f"pageInfo {{ hasNextPage }} "
+            f"nodes {{ number title body createdAt updatedAt isDraft headRefOid baseRefName author {{ __typename login }} }} }} }}"
+        )
+    query = f"query({', '.join(var_defs)}) {{ rateLimit {{ cost remaining }} {' '.join(fields)} }}"
+    return query, variables
+
+
+def _graphql_pr_to_rest(node: dict) -> dict:
+    """Map a GraphQL PR node onto the REST field names the filters and build_pr_data read."""
+    author = node.get("author") or {}
+    return {
+        "number": node.get("number"),
+        "title": node.get("title"),
+        "body": node.get("body"),
+        "created_at": node.get("createdAt"),
+        "updated_at": node.get("updatedAt"),
+        "draft": bool(node.get("isDraft")),
+        "user": {"login": author.get("login"), "type": author.get("__typename")},
+        "head": {"sha": node.get("headRefOid")},
+        "base": {"ref": node.get("baseRefName")},
+    }
+
+
+def discover_open_prs_graphql(repo_paths: list, headers: dict) -> dict:
+    """Open-PR discovery for many repos in one GraphQL request per GRAPHQL_BATCH_SIZE repos.
+    Returns {repo_path: [REST-shaped PR, ...]}. A repo that errored, or has more open PRs than
+    one page holds, is left out so the caller falls back to the REST listing for it."""
+    discovered, total_cost = {}, 0
+    for start in range(0, len(repo_paths), GRAPHQL_BATCH_SIZE):
+        batch = repo_paths[start:start + GRAPHQL_BATCH_SIZE]
+        query, variables = build_discovery_query(batch)
+        try:
+            resp = gh_request("POST", GRAPHQL_URL, headers=headers,
+                              json={"query": query, "variables": variables})
+            if resp.status_code != 200:
+                print(f"⚠️ GraphQL discovery failed HTTP {resp.status_code}; REST fallback for {len(batch)} repo(s)")
+                continue
+            data = (resp.json() or {}).get("data") or {}
+        except Exception as e:
+            print(f"⚠️ GraphQL discovery error: {e}; REST fallback for {len(batch)} repo(s)")
+            continue
+        total_cost += (data.get("rateLimit") or {}).get("cost") or 0
+        for i, repo_path in enumerate(batch):
+            pulls = (data.get(f"r{i}") or {}).get("pullRequests")
+            if not pulls or (pulls.get("pageInfo") or {}).get("hasNextPage"):
+                continue
+            discovered[repo_path] = [_graphql_pr_to_rest(n) for n in (pulls.get("nodes") or []) if n]
+    if repo_paths:
+        print(f"🔎 GraphQL discovery: {len(discovered)}/{len(repo_paths)} repo(s), rate-limit cost {total_cost}.")
+    return discovered
+
+
+def repo_of(pr_key: str) -> str:
+    """Repo path of a reviewed_prs key ("owner/repo#123" -> "owner/repo")."""
+    return pr_key.rsplit("#", 1)[0]
+
+
 def is_first_run_for_repo(repo_path: str, reviewed_prs: dict) -> bool:
     """Check if this is the first run for this repo."""
-    repo_reviewed = {
-        k: v for k, v in reviewed_prs.items() 
-        if k.startswith(f"{repo_path}#")
-    }
-    return len(repo_reviewed) == 0
+    return not any(repo_of(k) == repo_path for k in reviewed_prs)
 
 
 def is_bot_pr(pr: dict) -> bool:
@@ -139,6 +1358,24 @@ def is_old_pr(pr: dict, days: int = 30) -> bool:
         return False
 
 
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@", re.M)
+
+
+def patch_digest(files: list) -> str:
+    """Fingerprint of a PR's effective changes: per-file name, status, line counts and patch, with
+    hunk-header line numbers dropped (plus the head blob sha of files whose patch was clipped). Merging the base branch shifts those numbers (or touches other files
+    entirely) without changing what the PR itself changes, so such a push keeps the same digest."""
+    h = hashlib.sha256()
+    for f in sorted(files or [], key=lambda f: f.get("filename") or ""):
+        h.update(f"{f.get('filename')}\0{f.get('status')}\0{f.get('additions')}\0{f.get('deletions')}\0".encode())
+        if f.get("truncated"):
+            # Only a prefix of the patch was kept: an edit past the cut must still change the digest.
+            h.update(f"truncated\0{f.get('sha')}\0".encode())
+        h.update(_HUNK_HEADER.sub("@@", f.get("patch") or "").encode())
+        h.update(b"\0\0")
+    return h.hexdigest()[:16]
+
+
 def build_pr_data(
     pr: dict,
     processed_files: list,
@@ -159,6 +1396,7 @@ def build_pr_data(
         "files": processed_files,
         "review_type": review_type,
         "current_sha": current_sha,
+        "patch_digest": patch_digest(processed_files),
     }
     if previous_sha:
         pr_data["previous_sha"] = previous_sha
@@ -169,14 +1407,94 @@ def build_pr_data(
     return pr_data
 
 
+def full_sweep_due(cursor: dict, now: datetime = None) -> bool:
+    """True when a repo's cursor has never done a full sweep, or its last one is older than
+    FULL_SWEEP_MINUTES."""
+    swept_at = (cursor or {}).get("full_sweep_at")
+    if not (cursor or {}).get("updated_at") or not swept_at:
+        return True
+    try:
+        swept_dt = datetime.fromisoformat(swept_at.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return True
+    return ((now or datetime.now(timezone.utc)) - swept_dt).total_seconds() >= FULL_SWEEP_MINUTES * 60
+
+
+def poll_due(cursor: dict, now: datetime = None) -> bool:
+    """True unless the repo backed off and its next poll is still ahead."""
+    try:
+        next_poll = datetime.fromisoformat((cursor or {})["next_poll_at"].replace("Z", "+00:00"))
+    except (KeyError, AttributeError, ValueError):
+        return True
+    return (now or datetime.now(timezone.utc)) >= next_poll
+
+
+def record_poll(cursor: dict, changed: bool, now: datetime = None):
+    """Fold one poll into the cursor's activity score and schedule the next poll."""
+    now = now or datetime.now(timezone.utc)
+    activity = ACTIVITY_ALPHA * (1.0 if changed else 0.0) \
+        + (1 - ACTIVITY_ALPHA) * float(cursor.get("activity") or 0.0)
+    cursor["activity"] = round(activity, 4)
+    if changed or activity >= HOT_ACTIVITY:
+        cursor["poll_minutes"] = 0
+        cursor.pop("next_poll_at", None)
+        return
+    cursor["poll_minutes"] = min(POLL_MAX_MINUTES,
+                                 max(POLL_BACKOFF_START_MINUTES, 2 * (cursor.get("poll_minutes") or 0)))
+    cursor["next_poll_at"] = (now + timedelta(minutes=cursor["poll_minutes"])).isoformat()
+
+
+def pending_prs_by_repo(pending: dict) -> dict:
+    """{repo_path: [PR, ...]} from the webhook pending set (entries written by webhook_receiver)."""
+    by_repo = {}
+    for entry in (pending or {}).values() if isinstance(pending, dict) else []:
+        if isinstance(entry, dict) and entry.get("repo") and isinstance(entry.get("pr"), dict) \
+                and entry["pr"].get("number"):
+            by_repo.setdefault(entry["repo"], []).append(entry["pr"])
+    return by_repo
+
+
+def drain_pending_events(consumed: dict, failed_repos=()):
+    """Drop the events this run handled from the pending set, keeping any that arrived or were
+    replaced by a newer delivery while it ran, and those of `failed_repos`. The set is re-read just before the write to keep the
+    race with webhook_receiver (another process) short; an event lost to it anyway is picked up by
+    the repo's next full sweep."""
+    current = waveassist.fetch_data(PENDING_EVENTS_KEY, default={}) or {}
+    if not isinstance(current, dict):
+        current = {}
+    remaining = {k: v for k, v in current.items()
+                 if consumed.get(k) != v or (isinstance(v, dict) and v.get("repo") in failed_repos)}
+    if remaining != current:
+        waveassist.store_data(PENDING_EVENTS_KEY, remaining, data_type="json")
+
+
+def note_gap(repo_path: str, reason: str):
+    """Record that `repo_path` was not fully processed this run (first reason wins)."""
+    with _STATS_LOCK:
+        RUN_GAPS.setdefault(repo_path, reason)
+
+
 def fetch_and_process_prs(
     repo_metadata: dict, 
     access_token: str, 
-    reviewed_prs: dict
+    reviewed_prs: dict,
+    http_cache: dict = None,
+    open_prs: list = None,
+    cursor: dict = None,
+    mirror: GitMirror = None,
+    touched: list = None
 ) -> tuple[list, bool]:
     """
     Fetch and process all PRs for a repo.
     Returns (list of PRs to review, reviewed_prs_changed flag).
+    `http_cache` (optional) is the persisted conditional-request cache; it is updated in place.
+    `open_prs` (optional) is the repo's open-PR listing from GraphQL discovery; when given, the
+    REST listing is skipped.
+    `cursor` (optional) is the repo's {"updated_at", "full_sweep_at"} entry, updated in place.
+    Between full sweeps only PRs updated at or after cursor["updated_at"] are considered.
+    `mirror` (optional) is the repo's local GitMirror; PR diffs come from it when it syncs.
+    `touched` (optional) are the PRs webhook events named; only they are processed, and since they
+    are not the open set, closed-PR cleanup and the cursor are left for the next sweep.
     """
     repo_path = repo_metadata["id"]
     headers = {
@@ -187,46 +1505,61 @@ def fetch_and_process_prs(
     # Load the per-repo brain profile (additive key); attached to each PR for downstream review.
     brain_profile = waveassist.fetch_data(f"profile:{repo_path}", default={}) or {}
 
-    # Detect first run
+    # Detect first run. The driver passes a per-repo view of reviewed_prs, so this and the cleanup
+    # key list below touch only this repo's entries.
     is_first_run = is_first_run_for_repo(repo_path, reviewed_prs)
+    repo_keys = [k for k in reviewed_prs if repo_of(k) == repo_path]
     
-    # Fetch all open PRs (single API call)
-    prs_url = f"https://api.github.com/repos/{repo_path}/pulls"
-    params = {
-        "state": "open",
-        "sort": "created",
-        "direction": "desc",
-        "per_page": 100,  # Get all open PRs
-    }
-    open_prs = []
-    params["page"] = 1
-    while True:
-        response = requests.get(prs_url, headers=headers, params=params, timeout=30)
-        if response.status_code != 200:
-            print(f"❌ Failed to fetch PRs for {repo_path}: {response.status_code}")
-            return [], False
-        try:
-            page_prs = response.json()
-        except Exception as e:
-            print(f"❌ Invalid PR JSON response: {e}")
+    # Incremental cycle: only PRs updated since the cursor. First runs and full sweeps see everything.
+    now = datetime.now(timezone.utc)
+    since = None
+    if cursor is not None and not is_first_run and not full_sweep_due(cursor, now):
+        since = cursor["updated_at"]
+
+    # Open PRs come from GraphQL discovery when the driver batched it; otherwise list via REST.
+    listing_complete = True
+    if touched is not None:
+        open_prs, since, closed_known = touched, None, False
+    elif open_prs is None:
+        open_prs, listing_complete = list_open_prs(repo_path, headers, http_cache,
+                                                   max_age_days=MAX_PR_AGE_DAYS, since=since)
+        if open_prs is None:
+            note_gap(repo_path, "PR listing failed")
             return [], False
-        if not page_prs:
-            break
-        open_prs.extend(page_prs)
-        if not _has_next_page(response):
-            break
-        params["page"] += 1
+        # A by-updated listing is not the full open set, so it cannot tell which PRs were closed.
+        closed_known = since is None
+    else:
+        closed_known = True
     
     # Build lookup
     open_pr_numbers = {pr["number"] for pr in open_prs}
     open_prs_by_number = {pr["number"]: pr for pr in open_prs}
+    # ISO-8601 UTC strings from GitHub compare chronologically; >= keeps same-second updates.
+    candidates = open_prs if since is None else [pr for pr in open_prs
+                                                 if (pr.get("updated_at") or "") >= since]
     
+    # Local mirror: one fetch covers every PR this cycle may diff; if it fails, use the API.
+    if mirror is not None:
+        wanted = [pr for pr in candidates if not is_bot_pr(pr) and not is_draft_pr(pr)
+                  and (reviewed_prs.get(f"{repo_path}#{pr['number']}") or {}).get("status") != "skipped"
+                  and (reviewed_prs.get(f"{repo_path}#{pr['number']}") or {}).get("last_reviewed_sha")
+                  != (pr.get("head") or {}).get("sha")]
+        if not sync_pr_mirror(mirror, wanted):
+            mirror = None
+
+    def pr_files(pr_number):
+        files = mirror_pr_files(mirror, open_prs_by_number[pr_number], _PATCH_CACHE) if mirror is not None else None
+        files = files if files is not None else fetch_pr_files(repo_path, pr_number, headers, cache=http_cache)
+        if not files:
+            note_gap(repo_path, f"no files for PR #{pr_number}")
+        return files
+
     # Process PRs
     prs_to_review = []
     reviewed_prs_changed = False
     processed_count = 0
     
-    for pr in open_prs:
+    for pr in candidates:
         try:
             # Skip bot PRs
             if is_bot_pr(pr):
@@ -237,7 +1570,7 @@ def fetch_and_process_prs(
                 continue
 
             # Skip old PRs (>60 days)
-            if is_old_pr(pr, days=60):
+            if is_old_pr(pr, days=MAX_PR_AGE_DAYS):
                 continue
             
             pr_number = pr["number"]
@@ -248,7 +1581,7 @@ def fetch_and_process_prs(
                 # First run: Process first 2, mark rest as skipped
                 if processed_count < FIRST_RUN_LIMIT:
                     # Process this PR
-                    processed_files = fetch_pr_files(repo_path, pr_number, headers)
+                    processed_files = pr_files(pr_number)
                     if processed_files:
                         pr_data = build_pr_data(
                             pr, processed_files, "full", head_sha, repo_path,
@@ -281,7 +1614,16 @@ def fetch_and_process_prs(
                             # Re-review the FULL current PR (not just stored_sha..head_sha) so the
                             # open/fixed ledger reflects the real current state — an issue counts as
                             # fixed only when it is truly gone, not merely outside the latest commit.
-                            full_files = fetch_pr_files(repo_path, pr_number, headers)
+                            full_files = pr_files(pr_number)
+
+                            # Same effective diff as the reviewed one (e.g. "Update branch" only merged
+                            # the base): move the review marker forward without another LLM review.
+                            if full_files and pr_info.get("patch_digest") == patch_digest(full_files):
+                                print(f"⏭️ PR #{pr_number}: diff unchanged since {stored_sha[:7]} "
+                                      f"(base merge only), advancing to {head_sha[:7]}")
+                                pr_info["last_reviewed_sha"] = head_sha
+                                reviewed_prs_changed = True
+                                continue
 
                             if full_files:
                                 pr_data = build_pr_data(
@@ -291,7 +1633,7 @@ def fetch_and_process_prs(
                                 prs_to_review.append(pr_data)
                 else:
                     # New PR, not in reviewed_prs
-                    processed_files = fetch_pr_files(repo_path, pr_number, headers)
+                    processed_files = pr_files(pr_number)
                     if processed_files:
                         pr_data = build_pr_data(
                             pr, processed_files, "full", head_sha, repo_path,
@@ -300,19 +1642,23 @@ def fetch_and_process_prs(
                         prs_to_review.append(pr_data)
         except Exception as e:
             print(f"⚠️ Skipped PR due to error: {e}")
+            note_gap(repo_path, f"PR #{pr.get('number')} failed: {e}")
     
     # Lazy cleanup: Remove closed PRs and stale entries
-    now = datetime.now(timezone.utc)
+    unseen_below = None if listing_complete or not open_pr_numbers else min(open_pr_numbers)
     to_remove = []
     
-    for pr_key, pr_info in reviewed_prs.items():
-        if not pr_key.startswith(f"{repo_path}#"):
+    for pr_key in repo_keys:
+        pr_info = reviewed_prs.get(pr_key)
+        if pr_info is None:
             continue
         
         pr_number = int(pr_key.split("#")[1])
         
-        # Cleanup 1: Remove closed PRs
-        if pr_number not in open_pr_numbers:
+        # Cleanup 1: Remove closed PRs. After an early-stopped listing, PRs numbered below the
+        # oldest listed one were never seen — not known to be closed — so only Cleanup 2 may drop them.
+        if closed_known and pr_number not in open_pr_numbers \
+                and (unseen_below is None or pr_number > unseen_below):
             to_remove.append(pr_key)
             continue
         
@@ -332,37 +1678,253 @@ def fetch_and_process_prs(
         del reviewed_prs[key]
         reviewed_prs_changed = True
     
+    # Advance the cursor to the newest update seen; a full sweep also restarts the sweep clock. A repo
+    # with a gap this run keeps its cursor, so the next incremental poll still sees the failed PR.
+    if cursor is not None and touched is None and repo_path not in RUN_GAPS:
+        newest = max((pr.get("updated_at") or "" for pr in open_prs), default="")
+        if newest > (cursor.get("updated_at") or ""):
+            cursor["updated_at"] = newest
+        if since is None and cursor.get("updated_at"):
+            cursor["full_sweep_at"] = now.isoformat()
+
     # Sort by creation date
     prs_to_review.sort(key=lambda x: x.get("pr_created_at", ""), reverse=True)
     
     return prs_to_review, reviewed_prs_changed
 
 
+def reviewed_prs_shard_key(repo_path: str) -> str:
+    return f"{REVIEWED_PRS_SHARD_PREFIX}{repo_path}"
+
+
+def load_reviewed_prs_shard(repo_path: str) -> dict:
+    """One repo's reviewed_prs entries ({"owner/repo#N": entry}) from its own storage key."""
+    shard = waveassist.fetch_data(reviewed_prs_shard_key(repo_path), default={}) or {}
+    return shard if isinstance(shard, dict) else {}
+
+
+def store_reviewed_prs_shard(repo_path: str, entries: dict):
+    waveassist.store_data(reviewed_prs_shard_key(repo_path), entries, data_type="json")
+
+
+def migrate_legacy_reviewed_prs() -> int:
+    """One-time move of the legacy single `reviewed_prs` blob into per-repo shards. Entries already
+    in a shard win (they are newer). The legacy key is emptied only after every shard is written,
+    so a crash part-way just repeats the idempotent merge next cycle. Returns entries migrated."""
+    legacy = waveassist.fetch_data(REVIEWED_PRS_KEY, default={}) or {}
+    if not isinstance(legacy, dict) or not legacy:
+        return 0
+    for repo_path, entries in split_reviewed_prs_by_repo(legacy).items():
+        store_reviewed_prs_shard(repo_path, {**entries, **load_reviewed_prs_shard(repo_path)})
+    waveassist.store_data(REVIEWED_PRS_KEY, {}, data_type="json")
+    print(f"📦 Migrated {len(legacy)} reviewed_prs entries into per-repo shards.")
+    return len(legacy)
+
+
+def split_reviewed_prs_by_repo(reviewed_prs: dict) -> dict:
+    """In-memory per-repo index of reviewed_prs, built in one pass: {repo_path: {pr_key: entry}}.
+    Per-repo work then touches only that repo's entries instead of prefix-scanning all of them."""
+    groups = {}
+    for pr_key, pr_info in reviewed_prs.items():
+        groups.setdefault(repo_of(pr_key), {})[pr_key] = pr_info
+    return groups
+
+
+def fetch_repos_concurrently(
+    repositories: list,
+    access_token: str,
+    reviewed_prs: dict,
+    http_cache: dict = None,
+    discovered_prs: dict = None,
+    max_workers: int = FETCH_CONCURRENCY,
+    load_shard=None,
+    cursors: dict = None,
+    mirror_root: str = None,
+    pending: dict = None,
+    webhooks: bool = False,
+    cache_shards: bool = False,
+    probe_changed: set = None
+) -> tuple[list, dict]:
+    """
+    Run fetch_and_process_prs for every repo on a bounded thread pool.
+    Each task works on a private copy of ITS repo's reviewed_prs entries, so the shared dict is
+    never touched concurrently; the copies are merged back afterwards in repository order, which
+    keeps the result identical to a sequential run. With `load_shard(repo_path)`, each task lazily
+    loads its own repo's entries instead of reading them from `reviewed_prs`. `cursors`
+    ({repo_path: cursor}) is handled the same way: private copies, written back in place afterwards.
+    With `mirror_root`, each repo's PR diffs come from its GitMirror under that directory.
+    With `webhooks`, a repo whose full sweep is not due processes only its `pending`
+    ({repo_path: [PR, ...]}) webhook PRs, and is skipped when it has none. Otherwise a repo whose
+    cursor has backed off (poll_due) is skipped until its next poll. Repos in `probe_changed` (the
+    change probe saw their PR heads move) are never skipped.
+    With `cache_shards`, each task loads and stores its own repo's http_cache shard and
+    `http_cache` is ignored.
+    Returns (all PRs to review, {repo_path: updated entries} for every repo whose entries changed).
+    """
+    groups = split_reviewed_prs_by_repo(reviewed_prs)
+    discovered_prs = discovered_prs or {}
+
+    def run(repo):
+        repo_path = repo["id"]
+        try:
+            repo_view = dict(load_shard(repo_path) if load_shard else groups.get(repo_path, {}))
+            cursor = None if cursors is None else dict(cursors.get(repo_path) or {})
+            touched = (pending or {}).get(repo_path)
+            moved = repo_path in (probe_changed or ())
+            if webhooks and cursor is not None and not full_sweep_due(cursor) and (touched or not moved):
+                if not touched:
+                    return [], False, None, cursor   # no events since the last sweep: nothing to do
+            else:
+                touched = None   # the full listing covers the touched PRs too
+                if cursor is not None and not poll_due(cursor) and not moved:
+                    return [], False, None, cursor   # dormant repo backing off
+            seen_before = (cursor or {}).get("updated_at")
+            token = token_for_repo(repo_path, access_token)
+            mirror = GitMirror(mirror_root, repo_path, token) if mirror_root else None
+            repo_cache = load_http_cache_shard(repo_path) if cache_shards else http_cache
+            stamps = {key: (entry or {}).get("at") for key, entry in (repo_cache or {}).items() if isinstance(entry, dict)}
+            prs, changed = fetch_and_process_prs(repo, token, repo_view, repo_cache,
+                                                 open_prs=discovered_prs.get(repo_path), cursor=cursor,
+                                                 mirror=mirror, touched=touched)
+            if cache_shards:
+                refreshed = stamps != {key: (entry or {}).get("at") for key, entry in repo_cache.items()
+                                       if isinstance(entry, dict)}
+                store_http_cache_shard(repo_path, repo_cache, refreshed)
+            # A failed listing or PR says nothing about activity: keep the stored cursor as it was so
+            # the repo is polled again.
+            if repo_path in RUN_GAPS:
+                return prs, changed, repo_view, None
+            if cursor is not None and touched is None:
+                record_poll(cursor, changed=cursor.get("updated_at") != seen_before)
+        except Exception as e:
+            print(f"⚠️ Failed to process {repo_path}: {e}")
+            note_gap(repo_path, f"processing failed: {e}")
+            return [], False, None, None
+        return prs, changed, repo_view, cursor
+
+    try:
+        max_workers = max(1, int(max_workers))
+    except (TypeError, ValueError):
+        max_workers = FETCH_CONCURRENCY
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(run, repositories))
+
+    all_prs, changed_repos = [], {}
+    for repo, (prs, changed, repo_view, cursor) in zip(repositories, results):
+        all_prs.extend(prs)
+        if cursor:
+            cursors[repo["id"]] = cursor
+        if changed and repo_view is not None:
+            for pr_key in groups.get(repo["id"], {}):
+                reviewed_prs.pop(pr_key, None)
+            reviewed_prs.update(repo_view)
+            changed_repos[repo["id"]] = repo_view
+    return all_prs, changed_repos
+
+
+def pr_job_key(pr_data: dict) -> str:
+    return f"{PR_JOB_PREFIX}{pr_data.get('id')}#{pr_data.get('pr_number')}@{pr_data.get('current_sha') or ''}"
+
+
+def store_pr_jobs(pr_jobs: list, keep_keys=()) -> list:
+    """Write each PR job under its own key, then the manifest listing them (written last, so a
+    reader never sees a manifest entry whose job is missing). Jobs of the manifest being replaced
+    that are neither rewritten nor in `keep_keys` (queued for posting) have their keys blanked, so
+    no pr_job key outlives its manifest. Returns the manifest."""
+    previous = waveassist.fetch_data(PR_JOBS_KEY, default=[]) or []
+    manifest = []
+    for pr_data in pr_jobs:
+        key = pr_job_key(pr_data)
+        waveassist.store_data(key, pr_data, data_type="json")
+        manifest.append({"key": key, "id": pr_data.get("id"), "pr_number": pr_data.get("pr_number"),
+                         "current_sha": pr_data.get("current_sha"),
+                         "comment_generated": False, "comment_posted": False})
+    waveassist.store_data(PR_JOBS_KEY, manifest, data_type="json")
+    current = {job["key"] for job in manifest}
+    for job in previous if isinstance(previous, list) else []:
+        key = job.get("key") if isinstance(job, dict) else None
+        if key and key not in current and key not in keep_keys:
+            waveassist.store_data(key, {}, data_type="json")
+    return manifest
+
+
 # Single-run lock (set by check_credits_and_init): if another run holds it, no-op (empty repo list
 # means no PRs are queued, so generate_review / post_comment downstream also no-op).
 skip_run = bool(waveassist.fetch_data("skip_run", default=False))
 if skip_run:
-    print("GitZoid: skip_run set; fetch_pull_requests no-op (another run in progress).")
+    print("GitZoid: skip_run set; fetch_pull_requests no-op (another run in progress, or nothing changed).")
 
 # Fetch input from WaveAssist
 repositories = [] if skip_run else (waveassist.fetch_data("github_selected_resources") or [])
 access_token = waveassist.fetch_data("github_access_token") or ""
 
-# Fetch existing reviewed PRs tracker
-reviewed_prs = waveassist.fetch_data("reviewed_prs") or {}
+# reviewed_prs shards are loaded lazily, one per repo, inside each repo's fetch task.
+if repositories:
+    migrate_legacy_reviewed_prs()
+    load_rate_state()
+    load_token_pool(access_token)
+reviewed_prs = {}
+if repositories:
+    drop_legacy_http_cache()
 
-all_pull_requests = []
-reviewed_prs_changed = False
+discovered_prs = {}
+if repositories and (waveassist.fetch_data("pr_discovery", default="rest") or "rest") == "graphql":
+    discovered_prs = discover_open_prs_graphql(
+        [r["id"] for r in repositories], {"Authorization": f"bearer {access_token}"})
 
-for repo in repositories:
-    prs, changed = fetch_and_process_prs(repo, access_token, reviewed_prs)
-    all_pull_requests.extend(prs)
-    if changed:
-        reviewed_prs_changed = True
+pending_events = (waveassist.fetch_data(PENDING_EVENTS_KEY, default={}) or {}) if repositories else {}
+webhooks = bool(waveassist.fetch_data(WEBHOOK_SECRET_KEY, default="")) if repositories else False
+
+pr_cursors = (waveassist.fetch_data(PR_CURSORS_KEY, default={}) or {}) if repositories else {}
+if not isinstance(pr_cursors, dict):
+    pr_cursors = {}
+cursors_before = {repo_path: dict(c) for repo_path, c in pr_cursors.items() if isinstance(c, dict)}
+
+# Repos whose probe digest moved since the last committed probe; None when either side is unknown.
+probe_changed = None
+if repositories:
+    probed = waveassist.fetch_data(PROBE_REPOS_KEY, run_based=True, default=None)
+    committed = (waveassist.fetch_data(NOOP_PROBE_KEY, default={}) or {}).get("repos")
+    if isinstance(probed, dict) and isinstance(committed, dict):
+        probe_changed = {repo_path for repo_path, digest in probed.items() if committed.get(repo_path) != digest}
 
-# Store reviewed_prs only if changed
-if reviewed_prs_changed:
-    waveassist.store_data("reviewed_prs", reviewed_prs)
+mirror_root = (waveassist.fetch_data(GIT_MIRROR_DIR_KEY, default="") or "") if repositories else ""
+if mirror_root:
+    _PATCH_CACHE.load(os.path.join(mirror_root, PATCH_CACHE_FILE))
+
+all_pull_requests, changed_shards = fetch_repos_concurrently(
+    repositories, access_token, reviewed_prs, None, discovered_prs,
+    max_workers=waveassist.fetch_data("fetch_concurrency", default=FETCH_CONCURRENCY) if repositories else 1,
+    load_shard=load_reviewed_prs_shard, cursors=pr_cursors,
+    mirror_root=mirror_root,
+    pending=pending_prs_by_repo(pending_events), webhooks=webhooks, cache_shards=True,
+    probe_changed=probe_changed)
+if isinstance(pending_events, dict) and pending_events:
+    drain_pending_events(pending_events, failed_repos=set(RUN_GAPS))
+
+if mirror_root and (_PATCH_CACHE.hits or _PATCH_CACHE.misses):
+    try:
+        _PATCH_CACHE.save(os.path.join(mirror_root, PATCH_CACHE_FILE))
+    except OSError as e:
+        print(f"⚠️ Could not save the patch cache: {e}")
+    print(f"🧩 Patch cache: {_PATCH_CACHE.summary()}")
+
+if repositories and pr_cursors != cursors_before:
+    waveassist.store_data(PR_CURSORS_KEY, pr_cursors, data_type="json")
+
+if HTTP_CACHE_STATS["not_modified"]:
+    print(f"🗄️ {HTTP_CACHE_STATS['not_modified']} GitHub request(s) answered 304 Not Modified (free).")
+
+# Rewrite only the shards of repos whose entries changed
+for repo_path, entries in changed_shards.items():
+    store_reviewed_prs_shard(repo_path, entries)
+
+# A PR whose review is still queued for posting keeps its generated job; don't regenerate it.
+queued = set()
+if all_pull_requests:
+    queued = {job.get("key") for job in (waveassist.fetch_data(POST_QUEUE_KEY, default=[]) or [])
+              if isinstance(job, dict)}
+    all_pull_requests = [pr for pr in all_pull_requests if pr_job_key(pr) not in queued]
 
 if all_pull_requests:
     time_to_process = len(all_pull_requests) * PROCESSING_TIME_PER_PR
@@ -372,5 +1934,15 @@ if all_pull_requests:
         run_based=True,
         data_type="string",
     )
-    waveassist.store_data("pull_requests", all_pull_requests)
+    store_pr_jobs(all_pull_requests, keep_keys=queued)
     print(f"✅ Fetched and stored {len(all_pull_requests)} PRs.")
+
+if repositories:
+    if _GOVERNOR.warned:
+        note_gap("*", "GitHub rate budget spent")
+    for repo_path, reason in RUN_GAPS.items():
+        print(f"⚠️ Incomplete: {repo_path}: {reason}")
+    waveassist.store_data(RUN_COMPLETE_KEY, not RUN_GAPS, run_based=True, data_type="json")
+    store_rate_state()
+    store_token_pool()
+log_github_timings()
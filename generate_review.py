@@ -8,8 +8,12 @@ high-signal, anchored findings survive. The gate (not the model) is the single a
 the verdict. Conventions: flat script, no __main__ guard, init() first, fall-through on empty.
 """
 import hashlib
+import json
 import re
+import threading
 import waveassist
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
 
@@ -20,6 +24,27 @@ MAX_INLINE_FINDINGS = 8
 DEFAULT_MODEL = "anthropic/claude-sonnet-4.6"
 _SEV_RANK = {"high": 0, "medium": 1, "low": 2}
 _CONF_RANK = {"high": 0, "medium": 1, "low": 2}
+PR_JOBS_KEY = "pr_jobs"   # manifest of pr_job:{owner/repo}#{n}@{sha} keys (see fetch_pull_requests)
+# Reviews run on a worker pool; concurrent LLM calls are capped per model/provider. The
+# "review_concurrency" data key overrides the caps: an int (every provider) or a dict keyed by
+# model name, provider prefix ("anthropic") or "default".
+REVIEW_WORKERS = 8
+REVIEW_CONCURRENCY = {"default": 4}
+# Raw (pre-gate) LLM results are cached by everything that shapes the prompt, so a force-pushed
+# rebase, a reopened PR or a re-run after a crash reuses the review instead of paying for it again.
+# Bump PROMPT_VERSION whenever the prompt templates or response models change.
+PROMPT_VERSION = "2026-10-2"
+REVIEW_CACHE_KEY = "review_cache"            # key -> {"result", "model", "at", "used_at"}
+REVIEW_CACHE_STATS_KEY = "review_cache_stats"  # cumulative {"hits", "misses"}
+REVIEW_CACHE_TTL_DAYS = 14
+REVIEW_CACHE_MAX_ENTRIES = 300
+REVIEW_CACHE_STATS = {"hits": 0, "misses": 0, "stored": 0}
+# Prompts lead with a per-repo prefix (rules, brain, context; see review_prompt_prefix) so provider
+# prefix caches can reuse it across a repo's PRs. call_llm takes one prompt string and returns only
+# the parsed result, so explicit breakpoints and provider cached-token counts are not reachable
+# from here; the run instead logs how many calls repeated an already-sent prefix, and its size.
+PREFIX_STATS = {"calls": 0, "repeat_calls": 0, "repeat_tokens": 0}
+_SENT_PREFIXES = {}   # (model, prefix hash) -> estimated prefix tokens
 
 waveassist.init()   # credits gated once upstream in check_credits_and_init
 
@@ -46,8 +71,12 @@ def format_changed_files(files, max_chars=25000):
 
             status_badge = f"[{status}]" if status != "modified" else ""
             stats = f"(+{additions}/-{deletions})" if additions or deletions else ""
+            if f.get("truncated"):   # cut at ingestion (fetch_pull_requests byte budgets)
+                stats = f"{stats} [partial diff]".strip()
 
-            if not patch:
+            if not patch and f.get("truncated"):
+                block = f"{idx}. Filename: `{f['filename']}` {status_badge} {stats}\n*Diff omitted: the PR's diff exceeded the size budget.*"
+            elif not patch:
                 block = f"{idx}. Filename: `{f['filename']}` {status_badge} {stats}\n*No diff available for this file.*"
             else:
                 block = f"{idx}. Filename: `{f['filename']}` {status_badge} {stats}\n```\n{patch}\n```"
@@ -233,13 +262,21 @@ _REVIEW_RULES = """
   </instructions>"""
 
 
-def get_full_review_prompt(review_pr, max_input_tokens=20000, additional_context=None):
-    """Brain-aware prompt for a first-time full PR review."""
-    formatted_files = format_changed_files(review_pr.get("files"), int(max_input_tokens * TOKEN_MULTIPLIER))
-    return f"""<pr_review type="full">
+def review_prompt_prefix(review_pr, additional_context=None):
+    """The cacheable head of every review prompt: static rules first, then the repo's brain and
+    context. Nothing PR-specific goes here, so full and update reviews of the same repo share it
+    byte for byte and providers with prefix caching bill it once."""
+    return f"""<gitzoid_review>
 {_REVIEW_RULES}
 {_format_brain_profile(review_pr.get("brain_profile"))}
 {_format_context(additional_context)}
+"""
+
+
+def get_full_review_prompt(review_pr, max_input_tokens=20000, additional_context=None):
+    """Brain-aware prompt for a first-time full PR review."""
+    formatted_files = format_changed_files(review_pr.get("files"), int(max_input_tokens * TOKEN_MULTIPLIER))
+    return review_prompt_prefix(review_pr, additional_context) + f"""  <pr_review type="full">
   <pr_metadata>
     <number>{review_pr.get("pr_number")}</number>
     <title>{review_pr.get("title")}</title>
@@ -249,7 +286,8 @@ def get_full_review_prompt(review_pr, max_input_tokens=20000, additional_context
 {formatted_files}
   </changed_files>
   <task>Produce: summary (1-2 sentences), findings[], potential_optimizations[], suggestions[]. Apply the security sweep. Be precise.</task>
-</pr_review>
+  </pr_review>
+</gitzoid_review>
 """
 
 
@@ -266,10 +304,7 @@ def get_update_review_prompt(review_pr, previous_review=None, max_input_tokens=2
   <previous_review note="GitZoid's prior review of this PR. New commits have since been pushed.">
 {previous_review}
   </previous_review>"""
-    return f"""<pr_review type="update" previous_sha="{prev_sha}" current_sha="{cur_sha}">
-{_REVIEW_RULES}
-{_format_brain_profile(review_pr.get("brain_profile"))}
-{_format_context(additional_context)}{previous_block}
+    return review_prompt_prefix(review_pr, additional_context) + f"""  <pr_review type="update" previous_sha="{prev_sha}" current_sha="{cur_sha}">{previous_block}
   <pr_metadata>
     <number>{review_pr.get("pr_number")}</number>
     <title>{review_pr.get("title")}</title>
@@ -286,14 +321,16 @@ def get_update_review_prompt(review_pr, previous_review=None, max_input_tokens=2
     - potential_optimizations[], suggestions[]. Apply the security sweep.
     Decide 'fixed vs still-present' from the current code, never from which file the latest commit happened to touch.
   </task>
-</pr_review>
+  </pr_review>
+</gitzoid_review>
 """
 
 
 # ---------------------------------------------------------------- diff parsing
 
 def build_diff_lines(files):
-    """Set of (path, side, line) that are commentable: added+context -> RIGHT, removed -> LEFT."""
+    """Set of (path, side, line) that are commentable: added+context -> RIGHT, removed -> LEFT.
+    For files flagged "truncated" this covers only the ingested part; see partial_paths."""
     diff_lines = set()
     for f in (files or []):
         path = f.get("filename", "")
@@ -317,6 +354,11 @@ def build_diff_lines(files):
     return diff_lines
 
 
+def partial_paths(files):
+    """Paths whose patch was cut at ingestion, so their diff lines are known only in part."""
+    return {f.get("filename", "") for f in (files or []) if f.get("truncated")}
+
+
 def _added_lines(patch):
     """Yield (lineno_in_new_file, text) for '+' lines only (used by the security sweep)."""
     new_ln = 0
@@ -367,9 +409,11 @@ def finding_sig(f):
     return hashlib.sha1(raw.encode()).hexdigest()[:12]
 
 
-def apply_gate(findings, diff_lines, seen_sigs=None, severity_threshold="high"):
-    """Single source of truth for the verdict. Returns (kept_findings, verdict, new_sigs)."""
+def apply_gate(findings, diff_lines, seen_sigs=None, severity_threshold="high", partial=None):
+    """Single source of truth for the verdict. Returns (kept_findings, verdict, new_sigs).
+    `partial` is the set of truncated paths (partial_paths); their diff_lines are incomplete."""
     seen_sigs = seen_sigs or set()
+    partial = partial or set()
     findings = _sanitize_findings(findings)
     thr = _SEV_RANK.get(severity_threshold, 0)
     kept, new_sigs, blocking = [], [], False
@@ -385,9 +429,12 @@ def apply_gate(findings, diff_lines, seen_sigs=None, severity_threshold="high"):
             # per-repo severity threshold floor
             if _SEV_RANK[sev] > thr:
                 continue
-        # anchored findings must be in the diff; unanchored (no line) allowed → summary-only
+        # anchored findings must be in the diff; unanchored (no line) allowed → summary-only.
+        # A truncated file's unknown line is not proof it is off-diff: demote it to summary-only.
         if f.get("line") is not None and (f["path"], f["side"], f["line"]) not in diff_lines:
-            continue
+            if f["path"] not in partial:
+                continue
+            f["line"] = None
         kept.append(f)
         new_sigs.append(sig)
         if cat in ("bug", "security") and sev == "high":   # any high-severity bug/security blocks
@@ -463,59 +510,218 @@ def security_sweep(files, brain_profile):
     return findings
 
 
-# ---------------------------------------------------------------- driver (flat, fall-through)
+# ---------------------------------------------------------------- review cache
 
-prs = waveassist.fetch_data("pull_requests", default=[]) or []
-if prs:
-    repositories = waveassist.fetch_data("github_selected_resources", default=[]) or []
-    repo_config = {r["id"]: r.get("properties", {}) for r in repositories if isinstance(r, dict) and r.get("id")}
-    global_model = waveassist.fetch_data("model_name", default=DEFAULT_MODEL) or DEFAULT_MODEL
-    global_context = waveassist.fetch_data("additional_context", default="") or ""
+def normalized_patch_hash(files):
+    """Hash of the PR's patch set, independent of file order and line endings."""
+    h = hashlib.sha256()
+    for f in sorted(files or [], key=lambda f: f.get("filename") or ""):
+        patch = (f.get("patch") or "").replace("\r\n", "\n").rstrip("\n")
+        h.update(json.dumps([f.get("filename"), f.get("status"), bool(f.get("truncated")), patch]).encode())
+    return h.hexdigest()
+
+
+def brain_fingerprint(profile):
+    """Short content hash of the brain profile the prompt embeds ("" without one)."""
+    if not isinstance(profile, dict) or not profile:
+        return ""
+    return hashlib.sha256(json.dumps(profile, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def review_cache_key(pr, model_name, additional_context):
+    """Cache key: normalized patch set + model + brain fingerprint + prompt version, plus the
+    remaining prompt inputs (review type, title/body, context, prior review)."""
+    rest = json.dumps([pr.get("review_type", "full"), pr.get("title"), pr.get("body"), additional_context or "",
+                       pr.get("previous_review_text") if pr.get("review_type") == "incremental" else None])
+    parts = [normalized_patch_hash(pr.get("files")), model_name, brain_fingerprint(pr.get("brain_profile")),
+             PROMPT_VERSION, hashlib.sha256(rest.encode()).hexdigest()]
+    return hashlib.sha256("\0".join(str(p) for p in parts).encode()).hexdigest()
 
-    for pr in prs:
+
+def _age_days(entry, field, now):
+    try:
+        return (now - datetime.fromisoformat(entry[field].replace("Z", "+00:00"))).days
+    except Exception:
+        return None
+
+
+def prune_review_cache(cache, now=None, max_entries=REVIEW_CACHE_MAX_ENTRIES):
+    """Drop entries older than REVIEW_CACHE_TTL_DAYS, then the least recently used beyond
+    `max_entries`. Returns how many were removed."""
+    now = now or datetime.now(timezone.utc)
+    stale = []
+    for key, entry in cache.items():
+        age = _age_days(entry, "at", now) if isinstance(entry, dict) else None
+        if age is None or age >= REVIEW_CACHE_TTL_DAYS:
+            stale.append(key)
+    for key in stale:
+        del cache[key]
+    excess = len(cache) - max_entries
+    if excess > 0:
+        for key in sorted(cache, key=lambda k: cache[k].get("used_at") or cache[k].get("at") or "")[:excess]:
+            del cache[key]
+    return len(stale) + max(excess, 0)
+
+
+# ---------------------------------------------------------------- concurrency
+
+_SLOTS = {}
+_SLOTS_LOCK = threading.Lock()
+
+
+def concurrency_limit(model_name, limits):
+    """Concurrent-call cap for `model_name`: exact model, then provider prefix, then "default"."""
+    if isinstance(limits, int) and not isinstance(limits, bool):
+        return max(1, limits)
+    limits = {**REVIEW_CONCURRENCY, **(limits if isinstance(limits, dict) else {})}
+    provider = str(model_name or "").split("/", 1)[0]
+    for key in (model_name, provider, "default"):
         try:
-            if pr.get("comment_generated", False):
-                continue
+            return max(1, int(limits[key]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return 1
+
+
+def model_slot(model_name, limits):
+    """Semaphore shared by every review that calls `model_name`'s provider (or the model itself,
+    when it has its own cap)."""
+    name = str(model_name or "")
+    key = name if isinstance(limits, dict) and name in limits else name.split("/", 1)[0]
+    with _SLOTS_LOCK:
+        if key not in _SLOTS:
+            _SLOTS[key] = threading.BoundedSemaphore(concurrency_limit(name, limits))
+        return _SLOTS[key]
+
+
+_CACHE_LOCK = threading.Lock()
+
+
+def note_prompt_prefix(model_name, prefix):
+    """Count an LLM call whose cacheable prefix was already sent to `model_name` this run."""
+    key = (model_name, hashlib.sha256(prefix.encode()).hexdigest())
+    with _CACHE_LOCK:
+        PREFIX_STATS["calls"] += 1
+        if key in _SENT_PREFIXES:
+            PREFIX_STATS["repeat_calls"] += 1
+            PREFIX_STATS["repeat_tokens"] += _SENT_PREFIXES[key]
+        else:
+            _SENT_PREFIXES[key] = int(len(prefix) / TOKEN_MULTIPLIER)
 
-            repo_path = pr.get("id", "")
-            props = repo_config.get(repo_path, {})
-            model_name = props.get("model_name") or global_model
-            additional_context = props.get("additional_context") or global_context
-            severity_threshold = props.get("severity_threshold") or "high"
-            review_type = pr.get("review_type", "full")
 
+def review_pr(pr, model_name, additional_context, severity_threshold, limits=None, cache=None):
+    """Generate, gate and sweep one PR's review in place. Only the LLM call holds a model slot.
+    With `cache` (the review_cache dict), an identical earlier review is reused and only the
+    deterministic gate and sweep are re-run."""
+    review_type = pr.get("review_type", "full")
+    try:
+        response_model = UpdateReviewResult if review_type == "incremental" else ReviewResult
+        key = review_cache_key(pr, model_name, additional_context) if cache is not None else None
+        now = datetime.now(timezone.utc).isoformat()
+        with _CACHE_LOCK:
+            entry = cache.get(key) if key else None
+            if isinstance(entry, dict):
+                entry["used_at"] = now
+        result = None
+        if isinstance(entry, dict):
+            try:
+                result = response_model.model_validate(entry.get("result") or {})
+                with _CACHE_LOCK:
+                    REVIEW_CACHE_STATS["hits"] += 1
+                print(f"♻️ PR #{pr.get('pr_number')}: identical review inputs seen before; reusing the cached result.")
+            except Exception:
+                result = None
+        if result is None:
             if review_type == "incremental":
                 # Re-review the FULL current PR (with the prior review in context), not just the new diff,
                 # so the open/fixed ledger reflects the real current state of the code.
                 prompt = get_update_review_prompt(
                     pr, previous_review=pr.get("previous_review_text"), additional_context=additional_context)
-                result = waveassist.call_llm(model=model_name, prompt=prompt,
-                                             response_model=UpdateReviewResult,
-                                             should_retry=True, max_tokens=MAX_TOKENS)
             else:
                 prompt = get_full_review_prompt(pr, additional_context=additional_context)
+            note_prompt_prefix(model_name, review_prompt_prefix(pr, additional_context))
+            with model_slot(model_name, limits):
                 result = waveassist.call_llm(model=model_name, prompt=prompt,
-                                             response_model=ReviewResult,
+                                             response_model=response_model,
                                              should_retry=True, max_tokens=MAX_TOKENS)
+            if key:
+                with _CACHE_LOCK:
+                    REVIEW_CACHE_STATS["misses"] += 1
+                    if result:
+                        cache[key] = {"result": result.model_dump(), "model": model_name, "at": now, "used_at": now}
+                        REVIEW_CACHE_STATS["stored"] += 1
+
+        if not result:
+            raise Exception("Review not generated.")
+
+        review_dict = result.model_dump()
+        diff_lines = build_diff_lines(pr.get("files"))
+        raw = (review_dict.get("findings") or []) + security_sweep(pr.get("files"), pr.get("brain_profile"))
+        kept, verdict, _ = apply_gate(raw, diff_lines, seen_sigs=set(),
+                                      severity_threshold=severity_threshold,
+                                      partial=partial_paths(pr.get("files")))
+        review_dict["findings"] = kept
+        review_dict["verdict"] = verdict
+
+        pr.update(review_dict=review_dict, comment_generated=True,
+                  comment_posted=False, review_type=review_type)
+        print(f"✅ PR #{pr.get('pr_number')} {review_type} review generated "
+              f"(model={model_name}, verdict={verdict}, findings={len(kept)}).")
+    except Exception as e:
+        print(f"❌ PR #{pr.get('pr_number')} failed: {e}")
+        pr.update(review_dict={}, comment_generated=False, comment_posted=False)
+    return pr
+
 
-            if not result:
-                raise Exception("Review not generated.")
-
-            review_dict = result.model_dump()
-            diff_lines = build_diff_lines(pr.get("files"))
-            raw = (review_dict.get("findings") or []) + security_sweep(pr.get("files"), pr.get("brain_profile"))
-            kept, verdict, _ = apply_gate(raw, diff_lines, seen_sigs=set(),
-                                          severity_threshold=severity_threshold)
-            review_dict["findings"] = kept
-            review_dict["verdict"] = verdict
-
-            pr.update(review_dict=review_dict, comment_generated=True,
-                      comment_posted=False, review_type=review_type)
-            print(f"✅ PR #{pr.get('pr_number')} {review_type} review generated "
-                  f"(model={model_name}, verdict={verdict}, findings={len(kept)}).")
-        except Exception as e:
-            print(f"❌ PR #{pr.get('pr_number')} failed: {e}")
-            pr.update(review_dict={}, comment_generated=False, comment_posted=False)
-
-    waveassist.store_data("pull_requests", prs, data_type="json")
+# ---------------------------------------------------------------- driver (flat, fall-through)
+
+# PR jobs are stored one per key (pr_job:{owner/repo}#{n}@{sha}) and listed by the `pr_jobs`
+# manifest written by fetch_pull_requests. Each worker loads, reviews and stores one job, rewriting
+# only that job's key, and hands back just its comment_generated flag; the manifest flags are then
+# updated in manifest order. No finished PR (files, patches, review) outlives its worker.
+pr_jobs = waveassist.fetch_data(PR_JOBS_KEY, default=[]) or []
+if pr_jobs:
+    repositories = waveassist.fetch_data("github_selected_resources", default=[]) or []
+    repo_config = {r["id"]: r.get("properties", {}) for r in repositories if isinstance(r, dict) and r.get("id")}
+    global_model = waveassist.fetch_data("model_name", default=DEFAULT_MODEL) or DEFAULT_MODEL
+    global_context = waveassist.fetch_data("additional_context", default="") or ""
+    concurrency = waveassist.fetch_data("review_concurrency", default=REVIEW_CONCURRENCY) or REVIEW_CONCURRENCY
+    review_cache = waveassist.fetch_data(REVIEW_CACHE_KEY, default={}) or {}
+    if not isinstance(review_cache, dict):
+        review_cache = {}
+    cache_pruned = prune_review_cache(review_cache)
+
+    def run_job(job):
+        pr = waveassist.fetch_data(job.get("key"), default={}) or {}
+        if not isinstance(pr, dict) or not pr or pr.get("comment_generated", False):
+            return None
+        props = repo_config.get(pr.get("id", ""), {})
+        pr = review_pr(pr, props.get("model_name") or global_model,
+                       props.get("additional_context") or global_context,
+                       props.get("severity_threshold") or "high", concurrency, review_cache)
+        waveassist.store_data(job["key"], pr, data_type="json")
+        return bool(pr.get("comment_generated"))
+
+    todo = [job for job in pr_jobs if isinstance(job, dict) and not job.get("comment_generated", False)]
+    with ThreadPoolExecutor(max_workers=max(1, min(REVIEW_WORKERS, len(todo)))) as pool:
+        for job, generated in zip(todo, pool.map(run_job, todo)):
+            if generated is not None:
+                job["comment_generated"] = generated
+
+    waveassist.store_data(PR_JOBS_KEY, pr_jobs, data_type="json")
+
+    hits, misses = REVIEW_CACHE_STATS["hits"], REVIEW_CACHE_STATS["misses"]
+    if hits or cache_pruned or REVIEW_CACHE_STATS["stored"]:
+        prune_review_cache(review_cache)
+        waveassist.store_data(REVIEW_CACHE_KEY, review_cache, data_type="json")
+    if hits or misses:
+        totals = waveassist.fetch_data(REVIEW_CACHE_STATS_KEY, default={}) or {}
+        totals = {k: int((totals if isinstance(totals, dict) else {}).get(k) or 0) + n
+                  for k, n in (("hits", hits), ("misses", misses))}
+        waveassist.store_data(REVIEW_CACHE_STATS_KEY, totals, data_type="json")
+        print(f"♻️ Review cache: {hits} hit(s), {misses} miss(es) this run; "
+              f"{totals['hits'] / max(1, totals['hits'] + totals['misses']):.0%} hit rate overall.")
+    if PREFIX_STATS["repeat_calls"]:
+        print(f"🧊 Prompt prefix: {PREFIX_STATS['repeat_calls']} of {PREFIX_STATS['calls']} LLM call(s) repeated "
+              f"an already-sent repo prefix (~{PREFIX_STATS['repeat_tokens']} cacheable input tokens).")
     print("All PR reviews processed and stored.")
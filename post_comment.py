@@ -3,14 +3,20 @@ post_comment.py — publish the review as a proper GitHub PR Review + an editabl
 
 For each reviewed PR it posts inline, line-anchored comments (with committable suggestions) as one
 COMMENT review, plus a single human-readable summary comment that is EDITED IN PLACE on later
-pushes (found via a hidden marker). A per-PR findings ledger (in reviewed_prs) dedupes across runs,
-marks disappeared findings as fixed, and suppresses new nits on a maturing PR. A test-run shows a
-preview and writes nothing. Conventions: flat script, no __main__ guard, no sibling imports
-(finding_sig is duplicated from generate_review), fall-through on empty.
+pushes (found via a hidden marker). A per-PR findings ledger (in the repo's reviewed_prs:{owner/repo}
+shard) dedupes across runs, marks disappeared findings as fixed, and suppresses new nits on a
+maturing PR. A test-run shows a preview and writes nothing. Conventions: flat script, no __main__
+guard, no sibling imports (finding_sig is duplicated from generate_review), fall-through on empty.
 """
 import html
 import hashlib
+import random
+import threading
+import time
+from collections.abc import Mapping
+from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter
 import waveassist
 from datetime import datetime, timezone
 
@@ -35,6 +41,22 @@ OUTPUT_URL_SELECT_STYLE = (
     "color: #1e293b; user-select: all; cursor: text;")
 
 
+# reviewed_prs is sharded per repo: reviewed_prs:{owner/repo} holds that repo's "owner/repo#N"
+# entries. fetch_pull_requests (which runs first) migrates the legacy single key.
+REVIEWED_PRS_SHARD_PREFIX = "reviewed_prs:"
+PR_JOBS_KEY = "pr_jobs"   # manifest of pr_job:{owner/repo}#{n}@{sha} keys (see fetch_pull_requests)
+NOOP_PROBE_KEY = "noop_probe"       # last completed run's change-probe digest (see check_credits_and_init)
+PROBE_DIGEST_KEY = "probe_digest"   # run-based: this run's digest
+PROBE_REPOS_KEY = "probe_repos"     # run-based: this run's per-repo digests
+RUN_COMPLETE_KEY = "run_complete"   # run-based: fetch_pull_requests processed every repo; False if any work fell through
+
+
+def load_reviewed_prs_shard(repo_path):
+    """One repo's reviewed_prs entries (duplicated from fetch_pull_requests — no sibling imports)."""
+    shard = waveassist.fetch_data(f"{REVIEWED_PRS_SHARD_PREFIX}{repo_path}", default={}) or {}
+    return shard if isinstance(shard, dict) else {}
+
+
 def _gh_headers(token):
     return {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
 
@@ -69,13 +91,400 @@ def _verdict_line(verdict, n_find, n_opt, n_sugg):
     return head + (" — " + ", ".join(bits) if bits else "")
 
 
+# GitHub client settings for this node (the client block below is shared verbatim).
+GITHUB_POOL_SIZE = 4   # posting is sequential
+GITHUB_RESERVE_FRACTION = 0.0   # posting reviews is the point of the cycle
+
+
+# ---------------------------------------------------------------- GitHub HTTP client
+# One keep-alive session per node run instead of a fresh TLS connection per call, with one default
+# timeout, per-endpoint timing, and network errors surfaced as a failed response. Duplicated in
+# every node that calls GitHub (nodes never import siblings); tests/unit/test_shared_blocks.py
+# fails if the copies drift. GITHUB_POOL_SIZE and GITHUB_RESERVE_FRACTION are set per node.
+GITHUB_TIMEOUT = 30
+GITHUB_TIMINGS = {}   # "GET /repos/{repo}/pulls/{n}/files" -> {"calls", "errors", "seconds"}
+_GH_SESSION = None
+_GH_LOCK = threading.Lock()
+_PATH_TAILS = ("contents", "compare", "trees")   # everything after these is a path / ref / range
+# Rate-limit governor. Budgets are per credential: a bucket is "<credential>/<resource>", where the
+# credential is a short hash of the token (or its pool alias, see TOKEN_ALIASES). Nodes spend the
+# same credentials, so the latest X-RateLimit-* readings are shared through the github_rate_state key. A node may spend down to its own floor
+# (GITHUB_RESERVE_FRACTION of the limit): PR fetching/posting run almost to zero, the brain build
+# stops early and leaves the rest to them. Above the floor a token bucket refilled at
+# (spendable budget / seconds to reset) paces calls — free bursts while the budget is plentiful,
+# spread-out calls as it runs low. Retry-After or an exhausted budget blocks calls until the given
+# time; a wait longer than GITHUB_MAX_WAIT fails the call fast (status 429) instead.
+GITHUB_RATE_STATE_KEY = "github_rate_state"
+GITHUB_MAX_WAIT = 60
+TOKEN_ALIASES = {}   # token hash -> stable credential id (App installation tokens rotate hourly)
+# Retries: 5xx, 429, rate-limit 403s and connection errors are retried up to GITHUB_MAX_RETRIES
+# times with full-jitter exponential backoff, never sooner than Retry-After. Every retry wait in a
+# run is paid from GITHUB_RETRY_BUDGET_SECONDS, so retries cannot push a run past the run lock's TTL.
+# A non-GraphQL POST is retried only when GitHub provably did not act on it (429 / 403 / 503, or a
+# connect timeout): after a 502 the comment or review may already exist.
+GITHUB_MAX_RETRIES = 3
+GITHUB_BACKOFF_BASE = 1.0
+GITHUB_BACKOFF_CAP = 20.0
+GITHUB_RETRY_BUDGET_SECONDS = 120
+_RETRY_BUDGET = {"seconds": GITHUB_RETRY_BUDGET_SECONDS, "retries": 0}
+
+
+class _FailedResponse:
+    """Stand-in response for a request that never got an HTTP status (reset, DNS, timeout) or was
+    refused by the rate governor, so callers handle it through their usual status-code checks."""
+    headers = {}
+    links = {}
+    ok = False
+
+    def __init__(self, error: Exception, status_code: int = 0):
+        self.status_code = status_code
+        self.text = f"{type(error).__name__}: {error}"
+
+    def json(self):
+        raise ValueError(self.text)
+
+    def iter_content(self, chunk_size=None):
+        return iter(())
+
+    def close(self):
+        pass
+
+
+def _rate_header(resp, name: str):
+    """Integer response header, or None (missing, malformed, or a bare test Mock's headers)."""
+    hdrs = getattr(resp, "headers", None)
+    try:
+        return int(float(hdrs.get(name))) if isinstance(hdrs, Mapping) and hdrs.get(name) is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _auth_key(headers) -> str:
+    """Rate-limit identity of a request's credential: its pool alias, else a short token hash."""
+    auth = (headers.get("Authorization") if isinstance(headers, Mapping) else None) or ""
+    token = auth.split()[-1] if auth.strip() else ""
+    if not token:
+        return "anon"
+    digest = hashlib.sha256(token.encode()).hexdigest()[:10]
+    return TOKEN_ALIASES.get(digest, digest)
+
+
+class _RateGovernor:
+    """Per-bucket ("<credential>/core", "<credential>/graphql") budget readings plus the token
+    bucket that paces calls."""
+
+    def __init__(self, reserve_fraction: float):
+        self.reserve_fraction = reserve_fraction
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.warned = False
+
+    def _bucket(self, resource: str) -> dict:
+        return self.buckets.setdefault(resource, {"limit": None, "remaining": None, "reset": 0.0,
+                                                  "tokens": None, "stamp": 0.0, "blocked_until": 0.0})
+
+    def acquire(self, resource: str, now: float = None):
+        """Reserve one call. Returns the seconds to wait before making it, or None when this node's
+        budget is spent for longer than GITHUB_MAX_WAIT (the call should not be made)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            b = self._bucket(resource)
+            wait = max(0.0, b["blocked_until"] - now)
+            if b["remaining"] is None or b["reset"] <= now:
+                b["remaining"] = b["tokens"] = None   # no reading for this window yet: go and get one
+                return wait if wait <= GITHUB_MAX_WAIT else None
+            spendable = b["remaining"] - int((b["limit"] or 0) * self.reserve_fraction)
+            if spendable <= 0:
+                wait = max(wait, b["reset"] - now)
+                return wait if wait <= GITHUB_MAX_WAIT else None
+            rate = spendable / max(b["reset"] - now, 1.0)
+            capacity = max(1.0, spendable / 4)
+            b["tokens"] = capacity if b["tokens"] is None else min(capacity, b["tokens"] + (now - b["stamp"]) * rate)
+            b["stamp"] = now
+            if b["tokens"] < 1:
+                wait = max(wait, (1 - b["tokens"]) / rate)
+            if wait > GITHUB_MAX_WAIT:
+                return None
+            b["tokens"] -= 1
+            b["remaining"] -= 1   # local estimate until the response's headers arrive
+            return wait
+
+    def observe(self, resource: str, resp, now: float = None):
+        """Fold a response's X-RateLimit-* / Retry-After headers into the budget."""
+        now = time.time() if now is None else now
+        remaining, reset = _rate_header(resp, "X-RateLimit-Remaining"), _rate_header(resp, "X-RateLimit-Reset")
+        retry_after = _rate_header(resp, "Retry-After")
+        with self.lock:
+            b = self._bucket(resource)
+            if remaining is not None and reset is not None:
+                if reset == b["reset"] and b["remaining"] is not None:
+                    remaining = min(remaining, b["remaining"])   # concurrent responses land out of order
+                b["remaining"], b["reset"] = remaining, float(reset)
+                b["limit"] = _rate_header(resp, "X-RateLimit-Limit") or b["limit"]
+                if b["tokens"] is not None:
+                    b["tokens"] = min(b["tokens"], remaining - int((b["limit"] or 0) * self.reserve_fraction))
+            if getattr(resp, "status_code", None) in (403, 429):
+                if retry_after is not None:
+                    b["blocked_until"] = max(b["blocked_until"], now + retry_after)
+                elif remaining == 0 and reset is not None:
+                    b["blocked_until"] = max(b["blocked_until"], float(reset))
+
+    def remaining(self, resource: str, now: float = None):
+        """Latest remaining-budget estimate for a bucket, or None when there is no current reading."""
+        now = time.time() if now is None else now
+        with self.lock:
+            b = self.buckets.get(resource)
+            if not b or b["remaining"] is None or b["reset"] <= now:
+                return None
+            return b["remaining"]
+
+    def state(self) -> dict:
+        with self.lock:
+            return {r: {"limit": b["limit"], "remaining": b["remaining"], "reset": b["reset"]}
+                    for r, b in self.buckets.items() if b["remaining"] is not None}
+
+    def load(self, state, now: float = None):
+        """Seed budgets from another node's last reading (ignored once its window has reset)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            for resource, s in (state if isinstance(state, dict) else {}).items():
+                try:
+                    remaining, reset = int(s["remaining"]), float(s["reset"])
+                except (TypeError, KeyError, ValueError):
+                    continue
+                b = self._bucket(resource)
+                if reset > now and b["remaining"] is None:
+                    b["remaining"], b["reset"], b["limit"] = remaining, reset, s.get("limit")
+
+
+_GOVERNOR = _RateGovernor(GITHUB_RESERVE_FRACTION)
+
+
+def load_rate_state():
+    _GOVERNOR.load(waveassist.fetch_data(GITHUB_RATE_STATE_KEY, default={}) or {})
+
+
+def store_rate_state():
+    """Publish this node's latest budget reading for the nodes that run after it."""
+    state = _GOVERNOR.state()
+    if state:
+        waveassist.store_data(GITHUB_RATE_STATE_KEY, state, data_type="json")
+
+
+def _gh_session() -> requests.Session:
+    global _GH_SESSION
+    with _GH_LOCK:
+        if _GH_SESSION is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=GITHUB_POOL_SIZE)
+            session.mount("https://", adapter)
+            _GH_SESSION = session
+        return _GH_SESSION
+
+
+def _endpoint(method: str, url: str) -> str:
+    """Timing bucket for a call: repo, numbers and SHAs become placeholders."""
+    parts = urlparse(url).path.strip("/").split("/")
+    if parts[:1] == ["repos"] and len(parts) >= 3:
+        parts[1:3] = ["{repo}"]
+    out = []
+    for part in parts:
+        if part.isdigit():
+            part = "{n}"
+        elif len(part) == 40 and all(c in "0123456789abcdef" for c in part):
+            part = "{sha}"
+        out.append(part)
+        if part in _PATH_TAILS:
+            out.append("{ref}")
+            break
+    return f"{method} /{'/'.join(out)}"
+
+
+def _send(method: str, url: str, endpoint: str, resource: str, kwargs: dict):
+    """One attempt: governor, request, timing. Returns (response, requests exception or None)."""
+    wait = _GOVERNOR.acquire(resource)
+    started = time.monotonic()
+    error = None
+    if wait is None:
+        if not _GOVERNOR.warned:
+            _GOVERNOR.warned = True
+            print(f"⏳ GitHub rate budget ({resource}) for this node is spent; deferring calls to a later cycle")
+        resp = _FailedResponse(RuntimeError("rate budget spent"), status_code=429)
+    else:
+        if wait:
+            time.sleep(wait)
+        try:
+            resp = getattr(_gh_session(), method.lower())(url, **kwargs)
+            _GOVERNOR.observe(resource, resp)
+        except requests.RequestException as e:
+            print(f"⚠️ GitHub {endpoint} failed: {e}")
+            resp, error = _FailedResponse(e), e
+    elapsed = time.monotonic() - started
+    with _GH_LOCK:
+        stats = GITHUB_TIMINGS.setdefault(endpoint, {"calls": 0, "errors": 0, "seconds": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += elapsed
+        if not isinstance(resp.status_code, int) or not 200 <= resp.status_code < 400:
+            stats["errors"] += 1
+    return resp, error
+
+
+def _retry_reason(resp, error, safe_to_repeat: bool):
+    """Why this attempt is worth retrying, or None."""
+    if error is not None:
+        if isinstance(error, requests.ConnectTimeout) or (
+                safe_to_repeat and isinstance(error, (requests.ConnectionError, requests.Timeout))):
+            return type(error).__name__
+        return None
+    if isinstance(resp, _FailedResponse):   # refused by the governor: waiting is its call
+        return None
+    status = resp.status_code if isinstance(resp.status_code, int) else 0
+    text = resp.text if isinstance(getattr(resp, "text", None), str) else ""
+    if status == 429 or (status == 403 and (_rate_header(resp, "Retry-After") is not None
+                                            or "rate limit" in text.lower())):
+        return f"rate limited ({status})"
+    if status == 503 or (status >= 500 and safe_to_repeat):
+        return f"HTTP {status}"
+    return None
+
+
+def retry_pause(attempt: int, resp=None) -> bool:
+    """Sleep before retry number `attempt` (0-based): full-jitter exponential backoff, at least
+    Retry-After. Returns False, without sleeping, when the run's retry budget can't cover it."""
+    delay = random.uniform(0, min(GITHUB_BACKOFF_CAP, GITHUB_BACKOFF_BASE * 2 ** attempt))
+    delay = max(delay, _rate_header(resp, "Retry-After") or 0)
+    with _GH_LOCK:
+        if delay > _RETRY_BUDGET["seconds"]:
+            return False
+        _RETRY_BUDGET["seconds"] -= delay
+        _RETRY_BUDGET["retries"] += 1
+    time.sleep(delay)
+    return True
+
+
+def gh_request(method: str, url: str, **kwargs):
+    """Call GitHub on the shared keep-alive session (default timeout GITHUB_TIMEOUT), paced by the
+    rate governor, retried on transient failures, and recorded under its endpoint in
+    GITHUB_TIMINGS. A requests exception comes back as a status-0 _FailedResponse, a call the
+    governor refuses as a status-429 one."""
+    kwargs.setdefault("timeout", GITHUB_TIMEOUT)
+    endpoint = _endpoint(method, url)
+    graphql = endpoint.endswith(" /graphql")
+    resource = f"{_auth_key(kwargs.get('headers'))}/{'graphql' if graphql else 'core'}"
+    safe_to_repeat = method.upper() != "POST" or graphql
+    for attempt in range(GITHUB_MAX_RETRIES + 1):
+        resp, error = _send(method, url, endpoint, resource, kwargs)
+        reason = _retry_reason(resp, error, safe_to_repeat)
+        if reason is None or attempt == GITHUB_MAX_RETRIES:
+            break
+        if not retry_pause(attempt, resp):
+            print(f"⚠️ GitHub {endpoint}: {reason}; retry budget spent, giving up")
+            break
+        print(f"↻ GitHub {endpoint}: {reason}; retry {attempt + 1}/{GITHUB_MAX_RETRIES}")
+    return resp
+
+
+def log_github_timings(top: int = 5):
+    """One line per node run: total GitHub calls/time plus the slowest endpoints."""
+    if not GITHUB_TIMINGS:
+        return
+    calls = sum(s["calls"] for s in GITHUB_TIMINGS.values())
+    seconds = sum(s["seconds"] for s in GITHUB_TIMINGS.values())
+    slowest = sorted(GITHUB_TIMINGS.items(), key=lambda kv: kv[1]["seconds"], reverse=True)[:top]
+    detail = "; ".join(f"{ep} x{s['calls']} {s['seconds']:.2f}s" + (f" ({s['errors']} err)" if s["errors"] else "")
+                       for ep, s in slowest)
+    retries = f", {_RETRY_BUDGET['retries']} retried" if _RETRY_BUDGET["retries"] else ""
+    print(f"🌐 GitHub: {calls} call(s) in {seconds:.2f}s{retries} — {detail}")
+
+
+# ---------------------------------------------------------------- write throttle
+# Reviews and comments count against GitHub's content-creation secondary limits (about 80 per
+# minute and 500 per hour, with mutating calls at least a second apart) on top of the primary
+# budget the governor tracks. Every POST/PATCH goes through gh_write, which spaces writes out; when
+# the next write slot is more than WRITE_MAX_WAIT away (or GitHub has pushed back) the remaining
+# PRs are queued under post_queue and posted first on the next run. Write times persist in
+# github_write_state so the hourly window spans runs.
+WRITE_STATE_KEY = "github_write_state"
+POST_QUEUE_KEY = "post_queue"   # manifest entries whose generated review is still to be posted
+WRITE_MIN_INTERVAL = 1.0
+WRITES_PER_MINUTE = 80
+WRITES_PER_HOUR = 500
+WRITE_MAX_WAIT = 60
+WRITE_BACKOFF_DEFAULT = 60   # pause after a secondary-limit response without Retry-After
+
+
+class _WriteThrottle:
+    """Sliding-window pacing for content-creating calls (posting is sequential)."""
+
+    def __init__(self):
+        self.writes = []   # epoch seconds of this hour's writes, oldest first
+        self.blocked_until = 0.0
+        self.limited = 0   # secondary-limit responses seen this run
+
+    def delay(self, now: float = None) -> float:
+        """Seconds until the next write may be sent."""
+        now = time.time() if now is None else now
+        recent = [t for t in self.writes if t > now - 3600]
+        ready = [self.blocked_until]
+        if recent:
+            ready.append(recent[-1] + WRITE_MIN_INTERVAL)
+        minute = [t for t in recent if t > now - 60]
+        if len(minute) >= WRITES_PER_MINUTE:
+            ready.append(minute[-WRITES_PER_MINUTE] + 60)
+        if len(recent) >= WRITES_PER_HOUR:
+            ready.append(recent[-WRITES_PER_HOUR] + 3600)
+        return max(0.0, max(ready) - now)
+
+    def wait(self):
+        """Sleep until the next write slot and claim it."""
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+        self.writes = [t for t in self.writes if t > time.time() - 3600][-WRITES_PER_HOUR:] + [time.time()]
+
+    def observe(self, resp, now: float = None):
+        """Back off after a secondary-limit response (403/429 with Retry-After or that message)."""
+        if getattr(resp, "status_code", None) not in (403, 429):
+            return
+        text = getattr(resp, "text", "")
+        retry_after = _rate_header(resp, "Retry-After")
+        if retry_after is None and not (isinstance(text, str) and "secondary rate limit" in text.lower()):
+            return
+        now = time.time() if now is None else now
+        self.limited += 1
+        self.blocked_until = max(self.blocked_until, now + (retry_after or WRITE_BACKOFF_DEFAULT))
+
+    def state(self) -> dict:
+        return {"writes": self.writes[-WRITES_PER_HOUR:], "blocked_until": self.blocked_until}
+
+    def load(self, state, now: float = None):
+        now = time.time() if now is None else now
+        state = state if isinstance(state, dict) else {}
+        try:
+            self.writes = sorted(float(t) for t in state.get("writes") or [] if float(t) > now - 3600)
+            self.blocked_until = float(state.get("blocked_until") or 0.0)
+        except (TypeError, ValueError):
+            self.writes, self.blocked_until = [], 0.0
+
+
+_WRITES = _WriteThrottle()
+
+
+def gh_write(method: str, url: str, **kwargs):
+    """gh_request for a content-creating call, paced by the write throttle."""
+    _WRITES.wait()
+    resp = gh_request(method, url, **kwargs)
+    _WRITES.observe(resp)
+    return resp
+
+
 # ---------------------------------------------------------------- GitHub REST
 
 def create_pr_review(repo_path, pr_number, commit_id, summary_body, inline_comments, token):
     """POST one COMMENT review with inline comments. commit_id anchors the lines."""
     url = f"https://api.github.com/repos/{repo_path}/pulls/{pr_number}/reviews"
     payload = {"commit_id": commit_id, "event": "COMMENT", "body": summary_body or "", "comments": inline_comments}
-    resp = requests.post(url, headers=_gh_headers(token), json=payload, timeout=30)
+    resp = gh_write("POST", url, headers=_gh_headers(token), json=payload)
     if resp.status_code in (200, 201):
         return resp.json()
     print(f"❌ create review failed HTTP {resp.status_code}: {resp.text[:300]}")
@@ -85,9 +494,22 @@ def create_pr_review(repo_path, pr_number, commit_id, summary_body, inline_comme
 def create_summary_comment(repo_path, pr_number, summary_md, token):
     body = SUMMARY_MARKER + "\n" + summary_md
     url = f"https://api.github.com/repos/{repo_path}/issues/{pr_number}/comments"
-    resp = requests.post(url, headers=_gh_headers(token), json={"body": body}, timeout=30)
-    if resp.status_code in (200, 201):
-        return resp.json()
+    for attempt in range(GITHUB_MAX_RETRIES + 1):
+        resp = gh_write("POST", url, headers=_gh_headers(token), json={"body": body})
+        if resp.status_code in (200, 201):
+            return resp.json()
+        # A 5xx / dropped connection may arrive after GitHub created the comment, so gh_request
+        # won't repeat the POST. The hidden marker makes it safe here: adopt the comment if it
+        # landed, otherwise POST again after a backoff. Failures gh_request already retried itself
+        # (_retry_reason, e.g. 503) are not retried again here, and every pause comes out of the
+        # same run-wide retry budget.
+        if not (resp.status_code == 0 or resp.status_code >= 500) or _retry_reason(resp, None, False):
+            break
+        cid = find_summary_comment_id(repo_path, pr_number, token)
+        if cid:
+            return edit_summary_comment(repo_path, cid, summary_md, token)
+        if attempt == GITHUB_MAX_RETRIES or not retry_pause(attempt, resp):
+            break
     print(f"❌ create summary failed HTTP {resp.status_code}: {resp.text[:300]}")
     return None
 
@@ -95,7 +517,7 @@ def create_summary_comment(repo_path, pr_number, summary_md, token):
 def edit_summary_comment(repo_path, comment_id, summary_md, token):
     body = SUMMARY_MARKER + "\n" + summary_md
     url = f"https://api.github.com/repos/{repo_path}/issues/comments/{comment_id}"
-    resp = requests.patch(url, headers=_gh_headers(token), json={"body": body}, timeout=30)
+    resp = gh_write("PATCH", url, headers=_gh_headers(token), json={"body": body})
     if resp.status_code in (200, 201):
         return resp.json()
     print(f"❌ edit summary failed HTTP {resp.status_code}: {resp.text[:300]}")
@@ -104,8 +526,8 @@ def edit_summary_comment(repo_path, comment_id, summary_md, token):
 
 def find_summary_comment_id(repo_path, pr_number, token):
     """Recovery path: locate our summary comment by the hidden marker."""
-    resp = requests.get(f"https://api.github.com/repos/{repo_path}/issues/{pr_number}/comments",
-                        headers=_gh_headers(token), params={"per_page": 100}, timeout=30)
+    resp = gh_request("GET", f"https://api.github.com/repos/{repo_path}/issues/{pr_number}/comments",
+                      headers=_gh_headers(token), params={"per_page": 100})
     if resp.status_code != 200:
         return None
     for c in resp.json():
@@ -237,7 +659,7 @@ def reconcile_ledger(prior_ledger, gated_findings, current_sha, is_update):
 
 
 def update_reviewed_prs(reviewed_prs, repo_path, pr_number, current_sha, review_text=None,
-                        summary_comment_id=None, review_id=None, findings_ledger=None):
+                        summary_comment_id=None, review_id=None, findings_ledger=None, patch_digest=None):
     """MERGE into the existing reviewed_prs entry (never blindly replace)."""
     pr_key = f"{repo_path}#{pr_number}"
     entry = reviewed_prs.get(pr_key, {})
@@ -254,24 +676,65 @@ def update_reviewed_prs(reviewed_prs, repo_path, pr_number, current_sha, review_
         entry["review_id"] = review_id
     if findings_ledger is not None:
         entry["findings"] = findings_ledger
+    if patch_digest is not None:   # lets fetch_pull_requests spot base-merge-only pushes
+        entry["patch_digest"] = patch_digest
     reviewed_prs[pr_key] = entry
 
 
+def drop_leftover_jobs(pr_jobs, keep_keys=()):
+    """Blank the key of every manifest job that was not posted and is not kept (queued for a later
+    run), so resetting the manifest leaves no pr_job key behind. Returns how many were dropped."""
+    dropped = 0
+    for job in pr_jobs:
+        if isinstance(job, dict) and job.get("key") and not job.get("comment_posted") \
+                and job["key"] not in keep_keys:
+            waveassist.store_data(job["key"], {}, data_type="json")
+            dropped += 1
+    return dropped
+
+
 # ---------------------------------------------------------------- driver (flat, fall-through)
 
-prs_to_review = waveassist.fetch_data("pull_requests", default=[]) or []
-should_process = any(pr.get("comment_generated") and not pr.get("comment_posted") for pr in prs_to_review)
+# Each PR job lives under its own pr_job:{owner/repo}#{n}@{sha} key; the pr_jobs manifest carries the
+# generated/posted flags so nothing is loaded until a job actually needs posting.
+pr_jobs = waveassist.fetch_data(PR_JOBS_KEY, default=[]) or []
+# Reviews deferred by the write throttle on an earlier run go first. A skipped cycle leaves them to
+# the run holding the lock.
+skip_run = bool(waveassist.fetch_data("skip_run", run_based=True, default=False))
+post_queue = [] if skip_run else \
+    [job for job in (waveassist.fetch_data(POST_QUEUE_KEY, default=[]) or []) if isinstance(job, dict)]
+should_process = bool(post_queue) or any(
+    isinstance(job, dict) and job.get("comment_generated") and not job.get("comment_posted") for job in pr_jobs)
 
 if should_process:
     access_token = waveassist.fetch_data("github_access_token", default="") or ""
-    reviewed_prs = waveassist.fetch_data("reviewed_prs", default={}) or {}
+    load_rate_state()
+    _WRITES.load(waveassist.fetch_data(WRITE_STATE_KEY, default={}) or {})
+    reviewed_shards = {}   # repo_path -> its reviewed_prs entries, loaded on first use
+    changed_repos = []
     preview = waveassist.is_test_run()
     display = "<div style=\"font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif; padding: 16px; line-height: 1.5;\">"
     posted_links = []
-    reviewed_prs_changed = False
-
-    for pr in prs_to_review:
-        if not pr.get("comment_generated") or pr.get("comment_posted"):
+    deferred = []   # jobs for post_queue: the throttle had no write slot for them this run
+
+    # A queued review is dropped once this run carries a job for the same PR at a newer head.
+    fresh = {(job.get("id"), job.get("pr_number")): job.get("key") for job in pr_jobs if isinstance(job, dict)}
+    queue = []
+    for job in post_queue:
+        if fresh.get((job.get("id"), job.get("pr_number")), job.get("key")) == job.get("key"):
+            queue.append(job)
+        elif not preview:
+            waveassist.store_data(job["key"], {}, data_type="json")
+    queued = {job.get("key") for job in queue}
+
+    for job in queue + [job for job in pr_jobs if isinstance(job, dict) and job.get("key") not in queued]:
+        if not job.get("comment_generated") or job.get("comment_posted"):
+            continue
+        if not preview and (deferred or _WRITES.delay() > WRITE_MAX_WAIT):
+            deferred.append(job)   # keep order: nothing jumps the queue
+            continue
+        pr = waveassist.fetch_data(job.get("key"), default={}) or {}
+        if not isinstance(pr, dict) or not pr.get("comment_generated") or pr.get("comment_posted"):
             continue
         review_dict = pr.get("review_dict") or {}
         if not review_dict:
@@ -280,6 +743,9 @@ if should_process:
         pr_number = pr.get("pr_number")
         current_sha = pr.get("current_sha", "")
         sha_short = current_sha[:7]
+        if repo_path not in reviewed_shards:
+            reviewed_shards[repo_path] = load_reviewed_prs_shard(repo_path)
+        reviewed_prs = reviewed_shards[repo_path]
         entry = reviewed_prs.get(f"{repo_path}#{pr_number}", {})
         # Re-key by the current finding_sig so a signature-format change across upgrades is transparent.
         prior_ledger = rekey_ledger(entry.get("findings", {}))
@@ -302,6 +768,7 @@ if should_process:
                 f'{html.escape(summary_md)}</pre></details>')
             continue
 
+        limited_before = _WRITES.limited
         review = None
         if inline_comments:                                   # never POST an empty review
             review = create_pr_review(repo_path, pr_number, current_sha, "", inline_comments, access_token)
@@ -316,12 +783,13 @@ if should_process:
             label = "Full"
 
         if result:
-            pr["comment_posted"] = True
+            job["comment_posted"] = True
             update_reviewed_prs(reviewed_prs, repo_path, pr_number, current_sha, review_text=summary_md,
                                 summary_comment_id=cid, review_id=(review or {}).get("id"),
-                                findings_ledger=new_ledger)
-            reviewed_prs_changed = True
-            pr["files"] = []                                  # clear patches after the ledger has anchors
+                                findings_ledger=new_ledger, patch_digest=pr.get("patch_digest"))
+            if repo_path not in changed_repos:
+                changed_repos.append(repo_path)
+            waveassist.store_data(job["key"], {}, data_type="json")   # drop the patches once the ledger has anchors
             url = result.get("html_url") or f"https://github.com/{repo_path}/pull/{pr_number}"
             display += (
                 f'<div style="margin-bottom: 8px; color: #28a745;">• {label} review posted to '
@@ -329,20 +797,44 @@ if should_process:
                 f'<a href="{html.escape(url, quote=True)}" target="_blank" rel="noopener noreferrer" '
                 f'style="{OUTPUT_LINK_STYLE}">View on GitHub</a></div>')
             posted_links.append(url)
+        elif review is None and _WRITES.limited > limited_before:
+            deferred.append(job)   # GitHub pushed back before anything landed: retry next run
 
     if posted_links:
         display += (f'<div style="margin-top: 10px;"><span style="{OUTPUT_URL_HINT_STYLE}">'
                     f"If links do not open in this view, copy a URL below.</span></div>")
         for u in posted_links:
             display += f'<span style="{OUTPUT_URL_SELECT_STYLE}">{html.escape(u)}</span>'
+    if deferred:
+        display += (f'<div style="margin-top: 8px; color: #b26a00;">• {len(deferred)} review(s) queued: '
+                    f"GitHub's write limit was reached, they post on the next run.</div>")
     display += "</div>"
 
     if not preview:
-        if reviewed_prs_changed:
-            waveassist.store_data("reviewed_prs", reviewed_prs, data_type="json")
-        waveassist.store_data("pull_requests", [], data_type="json")
+        for repo_path in changed_repos:          # rewrite only the shards this run touched
+            waveassist.store_data(f"{REVIEWED_PRS_SHARD_PREFIX}{repo_path}", reviewed_shards[repo_path],
+                                  data_type="json")
+        # A job that was neither posted nor queued falls through to a later full run: drop its key,
+        # and don't let the change probe call the next cycles no-ops.
+        if not skip_run and drop_leftover_jobs(pr_jobs, {job.get("key") for job in deferred}):
+            waveassist.store_data(RUN_COMPLETE_KEY, False, run_based=True, data_type="json")
+        waveassist.store_data(PR_JOBS_KEY, [], data_type="json")
+        if deferred or post_queue:
+            waveassist.store_data(POST_QUEUE_KEY, deferred, data_type="json")
+        if _WRITES.writes:
+            waveassist.store_data(WRITE_STATE_KEY, _WRITES.state(), data_type="json")
+    if deferred:
+        print(f"✍️ Write queue: {len(deferred)} PR review(s) deferred to the next run "
+              f"(next write slot in {_WRITES.delay():.0f}s).")
     waveassist.store_data("display_output", {"html_content": display}, run_based=True, data_type="json")
     print(f"✅ post_comment done (preview={preview}, posted={len(posted_links)}).")
+    store_rate_state()
+    log_github_timings()
+elif pr_jobs and not skip_run and not waveassist.is_test_run():
+    # Nothing to post (every job failed generation): drop the jobs so the next fetch starts clean.
+    drop_leftover_jobs(pr_jobs)
+    waveassist.store_data(RUN_COMPLETE_KEY, False, run_based=True, data_type="json")
+    waveassist.store_data(PR_JOBS_KEY, [], data_type="json")
 
 
 def release_run_lock():
@@ -365,4 +857,24 @@ def release_run_lock():
         print("GitZoid: released run lock.")
 
 
+def commit_noop_probe():
+    """Record this completed run's change-probe digest (taken by check_credits_and_init) so the next
+    cycle can skip itself if nothing changed. Runs before the lock release; a skipped cycle never
+    took a probe of its own, so it leaves the last one alone. A run that left work behind (a repo
+    fetch failed, calls were deferred, a review was not generated or posted) commits nothing, so
+    the next cycle runs and retries it."""
+    if waveassist.fetch_data("skip_run", run_based=True, default=False):
+        return
+    if waveassist.fetch_data(RUN_COMPLETE_KEY, run_based=True, default=False) is not True:
+        print("GitZoid: run left work behind; change probe not committed.")
+        return
+    digest = waveassist.fetch_data(PROBE_DIGEST_KEY, run_based=True, default="") or ""
+    if digest:
+        repos = waveassist.fetch_data(PROBE_REPOS_KEY, run_based=True, default={}) or {}
+        waveassist.store_data(NOOP_PROBE_KEY, {"digest": digest, "at": datetime.now(timezone.utc).isoformat(),
+                                               "repos": repos if isinstance(repos, dict) else {}},
+                              data_type="json")
+
+
+commit_noop_probe()
 release_run_lock()
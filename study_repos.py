@@ -13,9 +13,18 @@ leave the run STARTED).
 """
 import time
 import base64
+import fnmatch
+import hashlib
+import os
+import subprocess
+import random
+import threading
+from collections.abc import Mapping
 from datetime import datetime, timezone
 from typing import List, Literal
+from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter
 from pydantic import BaseModel, Field
 import waveassist
 
@@ -25,7 +34,6 @@ print("Processing GitZoid brain build (study_repos) node")
 
 GITHUB_API = "https://api.github.com"
 HTTP_TIMEOUT = 20
-RATE_SLEEP = 0.2
 STALE_BRANCH_LEAD_DAYS = 14
 PROFILE_TTL_DAYS = 14                # brain refreshes every 14 days (time-based, not on SHA change)
 TREE_BLOB_CAP = 800
@@ -117,10 +125,530 @@ class RepoContextProfileV2(BaseModel):
         description="Up to 5 areas a PR reviewer should focus on for THIS repo")
 
 
+# GitHub client settings for this node (the client block below is shared verbatim).
+GITHUB_POOL_SIZE = 4   # repos are studied one at a time
+GITHUB_RESERVE_FRACTION = 0.25   # brain builds leave a quarter of the budget to the PR pipeline
+
+
+# ---------------------------------------------------------------- GitHub HTTP client
+# One keep-alive session per node run instead of a fresh TLS connection per call, with one default
+# timeout, per-endpoint timing, and network errors surfaced as a failed response. Duplicated in
+# every node that calls GitHub (nodes never import siblings); tests/unit/test_shared_blocks.py
+# fails if the copies drift. GITHUB_POOL_SIZE and GITHUB_RESERVE_FRACTION are set per node.
+GITHUB_TIMEOUT = 30
+GITHUB_TIMINGS = {}   # "GET /repos/{repo}/pulls/{n}/files" -> {"calls", "errors", "seconds"}
+_GH_SESSION = None
+_GH_LOCK = threading.Lock()
+_PATH_TAILS = ("contents", "compare", "trees")   # everything after these is a path / ref / range
+# Rate-limit governor. Budgets are per credential: a bucket is "<credential>/<resource>", where the
+# credential is a short hash of the token (or its pool alias, see TOKEN_ALIASES). Nodes spend the
+# same credentials, so the latest X-RateLimit-* readings are shared through the github_rate_state key. A node may spend down to its own floor
+# (GITHUB_RESERVE_FRACTION of the limit): PR fetching/posting run almost to zero, the brain build
+# stops early and leaves the rest to them. Above the floor a token bucket refilled at
+# (spendable budget / seconds to reset) paces calls — free bursts while the budget is plentiful,
+# spread-out calls as it runs low. Retry-After or an exhausted budget blocks calls until the given
+# time; a wait longer than GITHUB_MAX_WAIT fails the call fast (status 429) instead.
+GITHUB_RATE_STATE_KEY = "github_rate_state"
+GITHUB_MAX_WAIT = 60
+TOKEN_ALIASES = {}   # token hash -> stable credential id (App installation tokens rotate hourly)
+# Retries: 5xx, 429, rate-limit 403s and connection errors are retried up to GITHUB_MAX_RETRIES
+# times with full-jitter exponential backoff, never sooner than Retry-After. Every retry wait in a
+# run is paid from GITHUB_RETRY_BUDGET_SECONDS, so retries cannot push a run past the run lock's TTL.
+# A non-GraphQL POST is retried only when GitHub provably did not act on it (429 / 403 / 503, or a
+# connect timeout): after a 502 the comment or review may already exist.
+GITHUB_MAX_RETRIES = 3
+GITHUB_BACKOFF_BASE = 1.0
+GITHUB_BACKOFF_CAP = 20.0
+GITHUB_RETRY_BUDGET_SECONDS = 120
+_RETRY_BUDGET = {"seconds": GITHUB_RETRY_BUDGET_SECONDS, "retries": 0}
+
+
+class _FailedResponse:
+    """Stand-in response for a request that never got an HTTP status (reset, DNS, timeout) or was
+    refused by the rate governor, so callers handle it through their usual status-code checks."""
+    headers = {}
+    links = {}
+    ok = False
+
+    def __init__(self, error: Exception, status_code: int = 0):
+        self.status_code = status_code
+        self.text = f"{type(error).__name__}: {error}"
+
+    def json(self):
+        raise ValueError(self.text)
+
+    def iter_content(self, chunk_size=None):
+        return iter(())
+
+    def close(self):
+        pass
+
+
+def _rate_header(resp, name: str):
+    """Integer response header, or None (missing, malformed, or a bare test Mock's headers)."""
+    hdrs = getattr(resp, "headers", None)
+    try:
+        return int(float(hdrs.get(name))) if isinstance(hdrs, Mapping) and hdrs.get(name) is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _auth_key(headers) -> str:
+    """Rate-limit identity of a request's credential: its pool alias, else a short token hash."""
+    auth = (headers.get("Authorization") if isinstance(headers, Mapping) else None) or ""
+    token = auth.split()[-1] if auth.strip() else ""
+    if not token:
+        return "anon"
+    digest = hashlib.sha256(token.encode()).hexdigest()[:10]
+    return TOKEN_ALIASES.get(digest, digest)
+
+
+class _RateGovernor:
+    """Per-bucket ("<credential>/core", "<credential>/graphql") budget readings plus the token
+    bucket that paces calls."""
+
+    def __init__(self, reserve_fraction: float):
+        self.reserve_fraction = reserve_fraction
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.warned = False
+
+    def _bucket(self, resource: str) -> dict:
+        return self.buckets.setdefault(resource, {"limit": None, "remaining": None, "reset": 0.0,
+                                                  "tokens": None, "stamp": 0.0, "blocked_until": 0.0})
+
+    def acquire(self, resource: str, now: float = None):
+        """Reserve one call. Returns the seconds to wait before making it, or None when this node's
+        budget is spent for longer than GITHUB_MAX_WAIT (the call should not be made)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            b = self._bucket(resource)
+            wait = max(0.0, b["blocked_until"] - now)
+            if b["remaining"] is None or b["reset"] <= now:
+                b["remaining"] = b["tokens"] = None   # no reading for this window yet: go and get one
+                return wait if wait <= GITHUB_MAX_WAIT else None
+            spendable = b["remaining"] - int((b["limit"] or 0) * self.reserve_fraction)
+            if spendable <= 0:
+                wait = max(wait, b["reset"] - now)
+                return wait if wait <= GITHUB_MAX_WAIT else None
+            rate = spendable / max(b["reset"] - now, 1.0)
+            capacity = max(1.0, spendable / 4)
+            b["tokens"] = capacity if b["tokens"] is None else min(capacity, b["tokens"] + (now - b["stamp"]) * rate)
+            b["stamp"] = now
+            if b["tokens"] < 1:
+                wait = max(wait, (1 - b["tokens"]) / rate)
+            if wait > GITHUB_MAX_WAIT:
+                return None
+            b["tokens"] -= 1
+            b["remaining"] -= 1   # local estimate until the response's headers arrive
+            return wait
+
+    def observe(self, resource: str, resp, now: float = None):
+        """Fold a response's X-RateLimit-* / Retry-After headers into the budget."""
+        now = time.time() if now is None else now
+        remaining, reset = _rate_header(resp, "X-RateLimit-Remaining"), _rate_header(resp, "X-RateLimit-Reset")
+        retry_after = _rate_header(resp, "Retry-After")
+        with self.lock:
+            b = self._bucket(resource)
+            if remaining is not None and reset is not None:
+                if reset == b["reset"] and b["remaining"] is not None:
+                    remaining = min(remaining, b["remaining"])   # concurrent responses land out of order
+                b["remaining"], b["reset"] = remaining, float(reset)
+                b["limit"] = _rate_header(resp, "X-RateLimit-Limit") or b["limit"]
+                if b["tokens"] is not None:
+                    b["tokens"] = min(b["tokens"], remaining - int((b["limit"] or 0) * self.reserve_fraction))
+            if getattr(resp, "status_code", None) in (403, 429):
+                if retry_after is not None:
+                    b["blocked_until"] = max(b["blocked_until"], now + retry_after)
+                elif remaining == 0 and reset is not None:
+                    b["blocked_until"] = max(b["blocked_until"], float(reset))
+
+    def remaining(self, resource: str, now: float = None):
+        """Latest remaining-budget estimate for a bucket, or None when there is no current reading."""
+        now = time.time() if now is None else now
+        with self.lock:
+            b = self.buckets.get(resource)
+            if not b or b["remaining"] is None or b["reset"] <= now:
+                return None
+            return b["remaining"]
+
+    def state(self) -> dict:
+        with self.lock:
+            return {r: {"limit": b["limit"], "remaining": b["remaining"], "reset": b["reset"]}
+                    for r, b in self.buckets.items() if b["remaining"] is not None}
+
+    def load(self, state, now: float = None):
+        """Seed budgets from another node's last reading (ignored once its window has reset)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            for resource, s in (state if isinstance(state, dict) else {}).items():
+                try:
+                    remaining, reset = int(s["remaining"]), float(s["reset"])
+                except (TypeError, KeyError, ValueError):
+                    continue
+                b = self._bucket(resource)
+                if reset > now and b["remaining"] is None:
+                    b["remaining"], b["reset"], b["limit"] = remaining, reset, s.get("limit")
+
+
+_GOVERNOR = _RateGovernor(GITHUB_RESERVE_FRACTION)
+
+
+def load_rate_state():
+    _GOVERNOR.load(waveassist.fetch_data(GITHUB_RATE_STATE_KEY, default={}) or {})
+
+
+def store_rate_state():
+    """Publish this node's latest budget reading for the nodes that run after it."""
+    state = _GOVERNOR.state()
+    if state:
+        waveassist.store_data(GITHUB_RATE_STATE_KEY, state, data_type="json")
+
+
+def _gh_session() -> requests.Session:
+    global _GH_SESSION
+    with _GH_LOCK:
+        if _GH_SESSION is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=GITHUB_POOL_SIZE)
+            session.mount("https://", adapter)
+            _GH_SESSION = session
+        return _GH_SESSION
+
+
+def _endpoint(method: str, url: str) -> str:
+    """Timing bucket for a call: repo, numbers and SHAs become placeholders."""
+    parts = urlparse(url).path.strip("/").split("/")
+    if parts[:1] == ["repos"] and len(parts) >= 3:
+        parts[1:3] = ["{repo}"]
+    out = []
+    for part in parts:
+        if part.isdigit():
+            part = "{n}"
+        elif len(part) == 40 and all(c in "0123456789abcdef" for c in part):
+            part = "{sha}"
+        out.append(part)
+        if part in _PATH_TAILS:
+            out.append("{ref}")
+            break
+    return f"{method} /{'/'.join(out)}"
+
+
+def _send(method: str, url: str, endpoint: str, resource: str, kwargs: dict):
+    """One attempt: governor, request, timing. Returns (response, requests exception or None)."""
+    wait = _GOVERNOR.acquire(resource)
+    started = time.monotonic()
+    error = None
+    if wait is None:
+        if not _GOVERNOR.warned:
+            _GOVERNOR.warned = True
+            print(f"⏳ GitHub rate budget ({resource}) for this node is spent; deferring calls to a later cycle")
+        resp = _FailedResponse(RuntimeError("rate budget spent"), status_code=429)
+    else:
+        if wait:
+            time.sleep(wait)
+        try:
+            resp = getattr(_gh_session(), method.lower())(url, **kwargs)
+            _GOVERNOR.observe(resource, resp)
+        except requests.RequestException as e:
+            print(f"⚠️ GitHub {endpoint} failed: {e}")
+            resp, error = _FailedResponse(e), e
+    elapsed = time.monotonic() - started
+    with _GH_LOCK:
+        stats = GITHUB_TIMINGS.setdefault(endpoint, {"calls": 0, "errors": 0, "seconds": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += elapsed
+        if not isinstance(resp.status_code, int) or not 200 <= resp.status_code < 400:
+            stats["errors"] += 1
+    return resp, error
+
+
+def _retry_reason(resp, error, safe_to_repeat: bool):
+    """Why this attempt is worth retrying, or None."""
+    if error is not None:
+        if isinstance(error, requests.ConnectTimeout) or (
+                safe_to_repeat and isinstance(error, (requests.ConnectionError, requests.Timeout))):
+            return type(error).__name__
+        return None
+    if isinstance(resp, _FailedResponse):   # refused by the governor: waiting is its call
+        return None
+    status = resp.status_code if isinstance(resp.status_code, int) else 0
+    text = resp.text if isinstance(getattr(resp, "text", None), str) else ""
+    if status == 429 or (status == 403 and (_rate_header(resp, "Retry-After") is not None
+                                            or "rate limit" in text.lower())):
+        return f"rate limited ({status})"
+    if status == 503 or (status >= 500 and safe_to_repeat):
+        return f"HTTP {status}"
+    return None
+
+
+def retry_pause(attempt: int, resp=None) -> bool:
+    """Sleep before retry number `attempt` (0-based): full-jitter exponential backoff, at least
+    Retry-After. Returns False, without sleeping, when the run's retry budget can't cover it."""
+    delay = random.uniform(0, min(GITHUB_BACKOFF_CAP, GITHUB_BACKOFF_BASE * 2 ** attempt))
+    delay = max(delay, _rate_header(resp, "Retry-After") or 0)
+    with _GH_LOCK:
+        if delay > _RETRY_BUDGET["seconds"]:
+            return False
+        _RETRY_BUDGET["seconds"] -= delay
+        _RETRY_BUDGET["retries"] += 1
+    time.sleep(delay)
+    return True
+
+
+def gh_request(method: str, url: str, **kwargs):
+    """Call GitHub on the shared keep-alive session (default timeout GITHUB_TIMEOUT), paced by the
+    rate governor, retried on transient failures, and recorded under its endpoint in
+    GITHUB_TIMINGS. A requests exception comes back as a status-0 _FailedResponse, a call the
+    governor refuses as a status-429 one."""
+    kwargs.setdefault("timeout", GITHUB_TIMEOUT)
+    endpoint = _endpoint(method, url)
+    graphql = endpoint.endswith(" /graphql")
+    resource = f"{_auth_key(kwargs.get('headers'))}/{'graphql' if graphql else 'core'}"
+    safe_to_repeat = method.upper() != "POST" or graphql
+    for attempt in range(GITHUB_MAX_RETRIES + 1):
+        resp, error = _send(method, url, endpoint, resource, kwargs)
+        reason = _retry_reason(resp, error, safe_to_repeat)
+        if reason is None or attempt == GITHUB_MAX_RETRIES:
+            break
+        if not retry_pause(attempt, resp):
+            print(f"⚠️ GitHub {endpoint}: {reason}; retry budget spent, giving up")
+            break
+        print(f"↻ GitHub {endpoint}: {reason}; retry {attempt + 1}/{GITHUB_MAX_RETRIES}")
+    return resp
+
+
+def log_github_timings(top: int = 5):
+    """One line per node run: total GitHub calls/time plus the slowest endpoints."""
+    if not GITHUB_TIMINGS:
+        return
+    calls = sum(s["calls"] for s in GITHUB_TIMINGS.values())
+    seconds = sum(s["seconds"] for s in GITHUB_TIMINGS.values())
+    slowest = sorted(GITHUB_TIMINGS.items(), key=lambda kv: kv[1]["seconds"], reverse=True)[:top]
+    detail = "; ".join(f"{ep} x{s['calls']} {s['seconds']:.2f}s" + (f" ({s['errors']} err)" if s["errors"] else "")
+                       for ep, s in slowest)
+    retries = f", {_RETRY_BUDGET['retries']} retried" if _RETRY_BUDGET["retries"] else ""
+    print(f"🌐 GitHub: {calls} call(s) in {seconds:.2f}s{retries} — {detail}")
+
+
+# ---------------------------------------------------------------- GitHub credential pool
+# Besides github_access_token, the optional github_token_pool data key lists more read credentials:
+#   "ghp_..." or {"token": "ghp_...", "repos": ["owner/*"]}                       personal tokens
+#   {"app_id": 1, "installation_id": 2, "private_key": "-----BEGIN ...", "repos": [...]}   App installs
+# `repos` (fnmatch patterns, optional) limits which repos a credential may serve. Installation tokens
+# are minted on demand (needs PyJWT with cryptography), cached in github_app_tokens across nodes and
+# re-minted APP_TOKEN_REFRESH_SECONDS before they expire. Each repo is routed to the covering
+# credential with the most remaining core budget and keeps it for the rest of the run. Duplicated in
+# fetch_pull_requests.py and study_repos.py (nodes never import siblings); keep the copies identical.
+GITHUB_TOKEN_POOL_KEY = "github_token_pool"
+GITHUB_APP_TOKENS_KEY = "github_app_tokens"
+APP_TOKEN_REFRESH_SECONDS = 300
+ASSUMED_RATE_LIMIT = 5000   # budget assumed for a credential with no reading yet
+ROUTE_COST_PER_REPO = 25    # expected calls per routed repo, so concurrent routing spreads out
+_POOL = {"credentials": [], "by_repo": {}, "app_tokens": {}, "minted": False}
+_POOL_LOCK = threading.Lock()
+_MINT_LOCK = threading.Lock()   # one installation-token mint at a time; never held with _POOL_LOCK
+
+
+def load_token_pool(default_token: str, pool=None, app_tokens=None):
+    """Build the credential list: github_access_token first, then github_token_pool entries."""
+    pool = waveassist.fetch_data(GITHUB_TOKEN_POOL_KEY, default=[]) if pool is None else pool
+    app_tokens = waveassist.fetch_data(GITHUB_APP_TOKENS_KEY, default={}) if app_tokens is None else app_tokens
+    credentials = [{"id": _token_key(default_token), "token": default_token, "repos": []}] if default_token else []
+    for entry in pool if isinstance(pool, list) else []:
+        if isinstance(entry, str) and entry:
+            entry = {"token": entry}
+        if not isinstance(entry, dict):
+            continue
+        repos = [p for p in (entry.get("repos") or []) if isinstance(p, str)]
+        if entry.get("token"):
+            credentials.append({"id": _token_key(entry["token"]), "token": entry["token"], "repos": repos})
+        elif entry.get("app_id") and entry.get("installation_id") and entry.get("private_key"):
+            credentials.append({"id": f"app{entry['installation_id']}", "token": None, "repos": repos,
+                                "app": {k: entry[k] for k in ("app_id", "installation_id", "private_key")}})
+    with _POOL_LOCK:
+        _POOL.update(credentials=credentials, by_repo={}, minted=False,
+                     app_tokens=dict(app_tokens) if isinstance(app_tokens, dict) else {})
+
+
+def _token_key(token: str) -> str:
+    return _auth_key({"Authorization": f"token {token}"})
+
+
+def _mint_app_token(cred: dict):
+    """A valid installation token for an App credential: cached, or minted via a signed JWT."""
+    app = cred["app"]
+    iid = str(app["installation_id"])
+    with _POOL_LOCK:
+        cached = _POOL["app_tokens"].get(iid) or {}
+    try:
+        expires = datetime.fromisoformat(str(cached.get("expires_at")).replace("Z", "+00:00"))
+        if (expires - datetime.now(timezone.utc)).total_seconds() > APP_TOKEN_REFRESH_SECONDS:
+            return cached.get("token")
+    except ValueError:
+        pass
+    try:
+        import jwt   # optional dependency, only needed for App credentials
+    except ImportError:
+        print(f"⚠️ GitHub App credential {cred['id']} needs PyJWT[crypto]; skipping it")
+        return None
+    now = int(time.time())
+    try:
+        assertion = jwt.encode({"iat": now - 60, "exp": now + 540, "iss": str(app["app_id"])},
+                               app["private_key"], algorithm="RS256")
+    except Exception as e:
+        print(f"⚠️ GitHub App credential {cred['id']}: cannot sign JWT ({e}); skipping it")
+        return None
+    resp = gh_request("POST", f"https://api.github.com/app/installations/{iid}/access_tokens",
+                      headers={"Authorization": f"Bearer {assertion}", "Accept": "application/vnd.github+json"})
+    if resp.status_code != 201:
+        print(f"⚠️ GitHub App credential {cred['id']}: token mint failed HTTP {resp.status_code}")
+        return None
+    body = resp.json()
+    with _POOL_LOCK:
+        _POOL["app_tokens"][iid] = {"token": body.get("token"), "expires_at": body.get("expires_at")}
+        _POOL["minted"] = True
+    return body.get("token")
+
+
+def token_for_repo(repo_path: str, default: str = "") -> str:
+    """Token to read `repo_path` with: the covering credential with the most remaining core
+    budget, fixed for the rest of the run. `default` when no pool is loaded. The credential is
+    chosen under _POOL_LOCK, but an App token is minted outside it (a network round trip), and the
+    choice is made again once the token is in place."""
+    while True:
+        with _POOL_LOCK:
+            if repo_path in _POOL["by_repo"]:
+                return _POOL["by_repo"][repo_path]["token"]
+            covering = [c for c in _POOL["credentials"]
+                        if not c.get("disabled")
+                        and (not c["repos"] or any(fnmatch.fnmatch(repo_path, p) for p in c["repos"]))]
+            load = {}
+            for cred in _POOL["by_repo"].values():
+                load[cred["id"]] = load.get(cred["id"], 0) + 1
+
+            def score(cred):
+                remaining = _GOVERNOR.remaining(f"{cred['id']}/core")
+                budget = ASSUMED_RATE_LIMIT if remaining is None else remaining
+                return budget - ROUTE_COST_PER_REPO * load.get(cred["id"], 0)
+
+            if not covering:
+                return default
+            cred = max(covering, key=score)
+            if not (cred.get("app") and not cred["token"]):
+                _POOL["by_repo"][repo_path] = cred
+                return cred["token"]
+        with _MINT_LOCK:
+            with _POOL_LOCK:
+                pending = not cred["token"] and not cred.get("disabled")   # another thread may have minted it
+            if pending:
+                token = _mint_app_token(cred)
+                with _POOL_LOCK:
+                    if not token:
+                        cred["disabled"] = True
+                    else:
+                        cred["token"] = token
+                        # Installation tokens rotate; alias them so the governor keeps one bucket per install.
+                        TOKEN_ALIASES[hashlib.sha256(token.encode()).hexdigest()[:10]] = cred["id"]
+
+
+def store_token_pool():
+    """Persist newly minted installation tokens so later nodes reuse them instead of re-minting."""
+    if _POOL["minted"]:
+        waveassist.store_data(GITHUB_APP_TOKENS_KEY, _POOL["app_tokens"], data_type="json")
+
+
+# ---------------------------------------------------------------- local git mirror
+# Optional alternative to the REST diff / contents endpoints: when the "git_mirror_dir" data key
+# names a directory that survives between runs, each repo gets a bare repository there, fetched
+# incrementally with just the refs a cycle needs. One `git fetch` then replaces the per-PR and
+# per-file REST calls. Any git failure falls back to the API. Duplicated in fetch_pull_requests.py and
+# study_repos.py (nodes never import siblings); keep the copies identical.
+GIT_MIRROR_DIR_KEY = "git_mirror_dir"
+GIT_REMOTE = "https://github.com/{repo}.git"
+GIT_TIMEOUT = 600
+
+
+class GitMirror:
+    """Bare mirror of one repository under `root`."""
+
+    def __init__(self, root: str, repo_path: str, token: str = "", remote: str = None):
+        self.repo_path = repo_path
+        self.path = os.path.join(root, repo_path.replace("/", "__") + ".git")
+        self.remote = remote or GIT_REMOTE.format(repo=repo_path)
+        self.token = token
+
+    def _cmd(self, *args) -> list:   # unquoted paths, so diff headers match `--raw -z` and the API
+        return ["git", "-c", "core.quotePath=false", "--git-dir", self.path, *args]
+
+    def _env(self) -> dict:
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        if self.token:   # passed through the environment: never in argv or the mirror's config
+            basic = base64.b64encode(f"x-access-token:{self.token}".encode()).decode()
+            env.update(GIT_CONFIG_COUNT="1", GIT_CONFIG_KEY_0="http.extraHeader",
+                       GIT_CONFIG_VALUE_0=f"Authorization: Basic {basic}")
+        return env
+
+    def git(self, *args, input: bytes = None) -> subprocess.CompletedProcess:
+        """Run a git command against the mirror; a missing binary or a timeout reads as a failure."""
+        try:
+            return subprocess.run(self._cmd(*args), input=input, capture_output=True, env=self._env(),
+                                  timeout=GIT_TIMEOUT)
+        except (OSError, subprocess.SubprocessError) as e:
+            return subprocess.CompletedProcess(args, 1, b"", str(e).encode())
+
+    def fetch(self, refspecs: list) -> bool:
+        """Create the mirror on first use, then fetch `refspecs` in one round trip."""
+        if not os.path.isdir(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if self.git("init", "--quiet", "--bare").returncode:
+                return False
+        if not refspecs:
+            return True
+        r = self.git("fetch", "--quiet", "--no-tags", self.remote, *refspecs)
+        if r.returncode:
+            print(f"⚠️ git fetch {self.repo_path} failed: {r.stderr.decode('utf-8', 'replace').strip()[:300]}")
+        return r.returncode == 0
+
+    def missing(self, revs: list) -> list:
+        """The revisions in `revs` the mirror does not have yet."""
+        if not revs:
+            return []
+        r = self.git("cat-file", "--batch-check", input=("\n".join(revs) + "\n").encode())
+        if r.returncode:
+            return list(revs)
+        lines = r.stdout.decode("utf-8", "replace").splitlines()
+        return [rev for rev, line in zip(revs, lines) if line.endswith(" missing")]
+
+    def diff_lines(self, base: str, head: str, paths: list = None):
+        """Yield the lines of `git diff base...head` (head against its merge-base with base, as a
+        PR shows it), streamed, optionally limited to literal `paths`. Raises RuntimeError if git
+        fails."""
+        cmd = self._cmd("diff", "--no-color", "--no-ext-diff", "--find-renames",
+                        "--src-prefix=a/", "--dst-prefix=b/", f"{base}...{head}", "--", *(paths or []))
+        env = dict(self._env(), GIT_LITERAL_PATHSPECS="1")
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env) as proc:
+            for line in proc.stdout:
+                yield line[:-1].decode("utf-8", "replace") if line.endswith(b"\n") else line.decode("utf-8", "replace")
+            err = proc.stderr.read()
+        if proc.returncode:
+            raise RuntimeError(err.decode("utf-8", "replace").strip()[:300])
+
+    def ls_tree(self, rev: str) -> list:
+        """Every blob path at `rev`, or [] if git fails."""
+        r = self.git("ls-tree", "-r", "--name-only", "-z", rev)
+        return [] if r.returncode else [p for p in r.stdout.decode("utf-8", "replace").split("\0") if p]
+
+    def cat_file(self, rev: str, path: str):
+        """Content of `path` at `rev` via `git cat-file`, or None if it is not there."""
+        r = self.git("cat-file", "blob", f"{rev}:{path}")
+        return None if r.returncode else r.stdout.decode("utf-8", errors="ignore")
+
+
 # ---------------------------------------------------------------- github helpers
 
 def _gh_get(url, headers, params=None):
-    return requests.get(url, headers=headers, params=params, timeout=HTTP_TIMEOUT)
+    return gh_request("GET", url, headers=headers, params=params, timeout=HTTP_TIMEOUT)
 
 
 def get_default_branch(repo_path, headers):
@@ -153,7 +681,6 @@ def branch_tip_date(repo_path, sha, headers):
     if not sha:
         return None
     r = _gh_get(f"{GITHUB_API}/repos/{repo_path}/commits/{sha}", headers)
-    time.sleep(RATE_SLEEP)
     if r.status_code != 200:
         return None
     return r.json().get("commit", {}).get("committer", {}).get("date")
@@ -199,10 +726,14 @@ def select_canonical_branch(repo_path, headers, override=""):
     return {"branch": None, "sha": None, "source": "none"}
 
 
-def get_branch_tree(repo_path, branch, headers):
-    """Return (blob_paths, truncated). Records GitHub's truncated flag."""
+def get_branch_tree(repo_path, branch, headers, mirror=None):
+    """Return (blob_paths, truncated). Records GitHub's truncated flag. A synced `mirror` lists the
+    full tree locally (never truncated)."""
+    if mirror is not None:
+        paths = mirror.ls_tree(f"refs/heads/{branch}")
+        if paths:
+            return paths[:TREE_BLOB_CAP], False
     r = _gh_get(f"{GITHUB_API}/repos/{repo_path}/git/trees/{branch}?recursive=1", headers)
-    time.sleep(RATE_SLEEP)
     if r.status_code != 200:
         return [], False
     data = r.json()
@@ -214,10 +745,13 @@ def get_branch_tree(repo_path, branch, headers):
     return paths, truncated
 
 
-def get_file_content(repo_path, file_path, branch, headers):
+def get_file_content(repo_path, file_path, branch, headers, mirror=None):
+    if mirror is not None:
+        content = mirror.cat_file(f"refs/heads/{branch}", file_path)
+        if content is not None:
+            return content[:FILE_CHAR_CAP]
     r = _gh_get(f"{GITHUB_API}/repos/{repo_path}/contents/{file_path}", headers,
                 params={"ref": branch})
-    time.sleep(RATE_SLEEP)
     if r.status_code != 200:
         return None
     try:
@@ -237,12 +771,12 @@ def pick_key_files(file_list, limit=4):
     return cand[:limit]
 
 
-def find_and_fetch(repo_path, file_list, patterns, branch, headers):
+def find_and_fetch(repo_path, file_list, patterns, branch, headers, mirror=None):
     lower = {f.lower(): f for f in file_list}
     for pat in patterns:
         for low, orig in lower.items():
             if low.endswith(pat.lower()):
-                c = get_file_content(repo_path, orig, branch, headers)
+                c = get_file_content(repo_path, orig, branch, headers, mirror=mirror)
                 if c:
                     return c
     return None
@@ -362,7 +896,7 @@ def needs_rebuild(existing):
 # existing repo_groups / brain.
 skip_run = bool(waveassist.fetch_data("skip_run", default=False))
 if skip_run:
-    print("GitZoid: skip_run set; study_repos no-op (another run in progress).")
+    print("GitZoid: skip_run set; study_repos no-op (another run in progress, or nothing changed).")
 
 repositories = [] if skip_run else (waveassist.fetch_data("github_selected_resources", default=[]) or [])
 access_token = waveassist.fetch_data("github_access_token", default="") or ""
@@ -371,6 +905,10 @@ headers = {"Authorization": f"token {access_token}", "Accept": "application/vnd.
 
 repo_paths = []
 repo_groups = waveassist.fetch_data("repo_groups", default={}) or {}
+mirror_root = (waveassist.fetch_data(GIT_MIRROR_DIR_KEY, default="") or "") if repositories else ""
+if repositories:
+    load_rate_state()   # the PR pipeline's last reading: don't start a brain build on its reserve
+    load_token_pool(access_token)
 
 for repo in repositories:
     repo_path = repo.get("id") if isinstance(repo, dict) else repo
@@ -388,16 +926,24 @@ for repo in repositories:
     override = (repo.get("properties", {}) or {}).get("branch", "") if isinstance(repo, dict) else ""
 
     try:
-        chosen = select_canonical_branch(repo_path, headers, override=override)
+        token = token_for_repo(repo_path, access_token)
+        repo_headers = {**headers, "Authorization": f"token {token}"}
+        chosen = select_canonical_branch(repo_path, repo_headers, override=override)
         if not chosen.get("sha"):
             print(f"⚠️ no canonical branch for {repo_path}; skipping")
             continue
 
-        file_list, truncated = get_branch_tree(repo_path, chosen["branch"], headers)
-        readme = find_and_fetch(repo_path, file_list, README_PATTERNS, chosen["branch"], headers)
-        manifests = find_and_fetch(repo_path, file_list, MANIFEST_PATTERNS, chosen["branch"], headers)
+        # Local mirror (git_mirror_dir): one fetch of the branch replaces the tree and contents calls.
+        mirror = GitMirror(mirror_root, repo_path, token) if mirror_root else None
+        if mirror is not None and not mirror.fetch([f"+refs/heads/{chosen['branch']}:refs/heads/{chosen['branch']}"]):
+            mirror = None
+        file_list, truncated = get_branch_tree(repo_path, chosen["branch"], repo_headers, mirror=mirror)
+        readme = find_and_fetch(repo_path, file_list, README_PATTERNS, chosen["branch"], repo_headers, mirror=mirror)
+        manifests = find_and_fetch(repo_path, file_list, MANIFEST_PATTERNS, chosen["branch"], repo_headers,
+                                   mirror=mirror)
         key_paths = pick_key_files(file_list)
-        key_files = {p: get_file_content(repo_path, p, chosen["branch"], headers) for p in key_paths}
+        key_files = {p: get_file_content(repo_path, p, chosen["branch"], repo_headers, mirror=mirror)
+                     for p in key_paths}
         key_files = {p: c for p, c in key_files.items() if c}
 
         profile = call_llm_with_retry(
@@ -437,3 +983,7 @@ if not skip_run:
         "built_at": max([b for b in built_ats if b], default=""),
         "repos": brain_repos,
     }, data_type="json")
+    store_rate_state()
+    store_token_pool()
+
+log_github_timings()
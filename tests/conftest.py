@@ -1,6 +1,7 @@
 """
 Pytest configuration and shared fixtures for GitZoid tests.
 """
+import sys
 import pytest
 from datetime import datetime, timezone, timedelta
 from unittest.mock import Mock, MagicMock
@@ -18,6 +19,60 @@ _wa.check_credits_and_notify = lambda *a, **k: True
 _wa.call_llm = lambda *a, **k: None
 
 
+@pytest.fixture(autouse=True)
+def _no_backoff_sleep(monkeypatch):
+    """GitHub retries (gh_request) back off with time.sleep; tests that mock 5xx responses must not wait."""
+    import time
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_run_gaps():
+    """fetch_pull_requests.RUN_GAPS is per-run state; a gap left by one test must not freeze the
+    cursors of the next."""
+    yield
+    fetch = sys.modules.get("fetch_pull_requests")
+    if fetch is not None:
+        fetch.RUN_GAPS.clear()
+
+
+@pytest.fixture
+def git_upstream(tmp_path):
+    """A local bare repository standing in for GitHub: main plus PR #1 (refs/pull/1/head, branched
+    before main's latest commit). Returns (remote path, {"base": sha, "head": sha, "main": sha})."""
+    import os
+    import shutil
+    import subprocess
+    if not shutil.which("git"):
+        pytest.skip("git is not installed")
+    work, remote = tmp_path / "work", tmp_path / "upstream.git"
+    env = dict(os.environ, GIT_AUTHOR_NAME="t", GIT_AUTHOR_EMAIL="t@example.com",
+               GIT_COMMITTER_NAME="t", GIT_COMMITTER_EMAIL="t@example.com")
+
+    def git(*args):
+        return subprocess.run(["git", "-C", str(work), *args], env=env, check=True,
+                              capture_output=True).stdout.decode().strip()
+
+    work.mkdir()
+    git("init", "--quiet", "-b", "main")
+    (work / "a.py").write_text("one\ntwo\nthree\n")
+    (work / "README.md").write_text("# demo\n")
+    git("add", "-A"); git("commit", "--quiet", "-m", "base")
+    base = git("rev-parse", "HEAD")
+    git("checkout", "--quiet", "-b", "feature")
+    (work / "a.py").write_text("one\n2\nthree\n")
+    (work / "b.py").write_text("print('b')\n")
+    git("add", "-A"); git("commit", "--quiet", "-m", "feature")
+    head = git("rev-parse", "HEAD")
+    git("checkout", "--quiet", "main")
+    (work / "c.py").write_text("main only\n")
+    git("add", "-A"); git("commit", "--quiet", "-m", "main moves on")
+    main = git("rev-parse", "HEAD")
+    subprocess.run(["git", "init", "--quiet", "--bare", str(remote)], check=True)
+    git("push", "--quiet", str(remote), "main:refs/heads/main", "feature:refs/pull/1/head")
+    return str(remote), {"base": base, "head": head, "main": main}
+
+
 @pytest.fixture
 def sample_pr_data():
     """Sample PR data for testing."""
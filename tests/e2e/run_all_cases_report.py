@@ -88,13 +88,14 @@ print(f"[report] {TARGET}  (READ-ONLY: no posts, no project writes)\n")
 # --- 1. Brain ---
 _store["github_selected_resources"] = [{"id": TARGET, "properties": {}}]
 _store["reviewed_prs"] = {}
+_store[f"reviewed_prs:{TARGET}"] = {}   # per-repo shard (what the nodes read)
 import study_repos  # noqa: E402,F401   (driver builds profile:TARGET into the overlay)
 profile = _store.get(f"profile:{TARGET}", {})
 print(f"[1] brain built — branch {profile.get('_fingerprint', {}).get('branch')}\n")
 
 # --- neutralise node drivers so we can call their helpers directly ---
 _store["github_selected_resources"] = []
-_store["pull_requests"] = []
+_store["pr_jobs"] = []
 import fetch_pull_requests as fpr  # noqa: E402
 import generate_review as gr       # noqa: E402
 import post_comment as pc          # noqa: E402
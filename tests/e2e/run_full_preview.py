@@ -85,6 +85,7 @@ print(f"[full-preview] {TARGET}  reviewing {N} newest open PR(s)  (READ-ONLY: no
 # --- 1. Brain ---
 _store["github_selected_resources"] = [{"id": TARGET, "properties": {}}]
 _store["reviewed_prs"] = {}
+_store[f"reviewed_prs:{TARGET}"] = {}   # per-repo shard (what the nodes read)
 import study_repos  # noqa: E402,F401   (driver builds profile:TARGET into the overlay)
 profile = _store.get(f"profile:{TARGET}", {})
 fp = profile.get("_fingerprint", {})
@@ -96,7 +97,7 @@ print(f"    {len(profile.get('key_files', []))} key files · {len(profile.get('d
       f"{len((profile.get('security') or {}).get('routes', []))} routes · "
       f"{len(profile.get('review_focus', []))} review-focus items")
 
-# --- 2. Build pull_requests for the N newest open PRs (bypasses the first-run cap) ---
+# --- 2. Queue PR jobs for the N newest open PRs (bypasses the first-run cap) ---
 _store["github_selected_resources"] = []   # neutralise the fetch driver on import
 import fetch_pull_requests as fpr  # noqa: E402
 resp = _rq.get(f"https://api.github.com/repos/{TARGET}/pulls", headers=H,
@@ -107,13 +108,13 @@ pulls = []
 for p in selected:
     files = fpr.fetch_pr_files(TARGET, p["number"], H)
     pulls.append(fpr.build_pr_data(p, files, "full", p.get("head", {}).get("sha", ""), TARGET, brain_profile=profile))
-_store["pull_requests"] = pulls
+manifest = fpr.store_pr_jobs(pulls)
 print(f"\n[2] queued {len(pulls)} PR(s): " + ", ".join(f"#{p['pr_number']}" for p in pulls))
 
 # --- 3. Review (local Claude) ---
 print("\n[3] generating reviews (local Claude)...")
 import generate_review  # noqa: E402,F401
-reviewed = _store.get("pull_requests", [])
+reviewed = [_store[j["key"]] for j in manifest]
 
 # --- 4. Render the summary GitZoid WOULD post (no posting) ---
 import post_comment as pc  # noqa: E402   (its driver runs in preview = harmless)
@@ -4,7 +4,7 @@ Manual end-to-end runner for the GitZoid REVIEW pipeline (fetch -> generate -> p
 Runs the three real nodes in order against a real open PR, using LOCAL CLAUDE (never OpenRouter)
 and an IN-MEMORY store overlay so NOTHING is written to GitHub or the WaveAssist project:
   - reads real config (token, selected repos, brain profile:{repo}) from the project,
-  - subsets the repo list to TARGET, seeds reviewed_prs={} to force a clean first review,
+  - subsets the repo list to TARGET, seeds reviewed_prs:{TARGET}={} to force a clean first review,
   - forces post_comment into preview mode (is_test_run -> True), so it only prints the summary.
 
 Usage:
@@ -110,15 +110,16 @@ def _seed_incremental():
     }}
 
 
-_store["reviewed_prs"] = _seed_incremental() if INCREMENTAL else {}
-if INCREMENTAL and not _store["reviewed_prs"]:
+_store["reviewed_prs"] = {}   # legacy single key: empty, so nothing is migrated from the real project
+_store[f"reviewed_prs:{TARGET}"] = _seed_incremental() if INCREMENTAL else {}
+if INCREMENTAL and not _store[f"reviewed_prs:{TARGET}"]:
     sys.exit("ERROR: --incremental needs an open PR with >=2 commits; none found on this repo.")
 
 _mode = "INCREMENTAL " + ("LIVE-POST" if LIVE else "preview-only") if INCREMENTAL else ("LIVE-POST" if LIVE else "preview-only")
 print(f"[review-e2e] target={TARGET}  model={os.environ['CLAUDE_CLI_MODEL']}  mode={_mode}\n")
 
 import fetch_pull_requests  # noqa: E402,F401
-pulls = _store.get("pull_requests", [])
+pulls = [_store[j["key"]] for j in _store.get("pr_jobs", [])]
 print(f"[1/3] fetch_pull_requests -> {len(pulls)} PR(s) queued")
 for p in pulls:
     bp = p.get("brain_profile") or {}
@@ -128,7 +129,7 @@ if not pulls:
     print("      (nothing to review — PR may be outside the first-run window)"); sys.exit(0)
 
 import generate_review  # noqa: E402,F401
-reviewed = _store.get("pull_requests", [])
+reviewed = [_store[j["key"]] for j in _store.get("pr_jobs", [])]
 print(f"\n[2/3] generate_review:")
 for p in reviewed:
     rd = p.get("review_dict") or {}
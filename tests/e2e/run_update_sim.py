@@ -48,7 +48,7 @@ def _local_call_llm(model, prompt, response_model, **k):
         raise RuntimeError(f"local claude rc={r.returncode}: {(r.stderr or r.stdout)[:400]}")
     return _pjr(json.loads(r.stdout).get("result", ""), response_model, model)
 
-_store = {"pull_requests": []}   # empties neutralise the node drivers on import
+_store = {"pr_jobs": []}   # empties neutralise the node drivers on import
 _real_fetch = waveassist.fetch_data
 waveassist.call_llm = _local_call_llm
 waveassist.fetch_data = lambda key=None, default=None, **k: _store[key] if key in _store else _real_fetch(key, default=default, **k)
@@ -65,13 +65,14 @@ if BRAIN_JSON and os.path.exists(BRAIN_JSON):
 else:
     _store["github_selected_resources"] = [{"id": TARGET, "properties": {}}]
     _store["reviewed_prs"] = {}
+    _store[f"reviewed_prs:{TARGET}"] = {}   # per-repo shard (what the nodes read)
     import study_repos  # noqa
     profile = _store.get(f"profile:{TARGET}", {})
     if BRAIN_JSON:
         json.dump(profile, open(BRAIN_JSON, "w"), default=str)
     print("[brain] built")
 
-# import the real nodes (drivers no-op because pull_requests == [])
+# import the real nodes (drivers no-op because pr_jobs == [])
 import fetch_pull_requests as fpr   # noqa
 import generate_review as gr        # noqa
 import post_comment as pc           # noqa
@@ -18,8 +18,8 @@ class TestFullWorkflow:
     @patch('post_comment.waveassist')
     @patch('generate_review.waveassist')
     @patch('fetch_pull_requests.waveassist')
-    @patch('fetch_pull_requests.requests.get')
-    @patch('post_comment.requests.post')
+    @patch('fetch_pull_requests.requests.Session.get')
+    @patch('post_comment.requests.Session.post')
     def test_complete_workflow_new_pr(self, mock_post, mock_get, mock_fetch_wave, 
                                        mock_gen_wave, mock_post_wave):
         """Test complete workflow for a new PR."""
@@ -116,7 +116,7 @@ class TestIncrementalReviewWorkflow:
     """Tests for incremental review workflow."""
     
     @patch('fetch_pull_requests.fetch_compare_diff')
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_incremental_review_detection(self, mock_get, mock_compare_diff):
         """Test detection of new commits for incremental review."""
         # Mock PR list with updated SHA
@@ -173,7 +173,7 @@ class TestErrorHandling:
         # This would test that the workflow raises exception on credit failure
         assert True  # Placeholder
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_github_api_failure(self, mock_get):
         """Test handling GitHub API failures."""
         mock_response = Mock()
@@ -3,6 +3,7 @@ Unit tests for check_credits_and_init.py (GitZoid's single starting gate node).
 """
 import sys
 import os
+from unittest.mock import Mock, patch
 from datetime import datetime, timezone, timedelta
 
 # Add parent directory to path to import modules
@@ -11,6 +12,11 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../.
 from check_credits_and_init import (
     estimate_time_to_process,
     lock_is_active,
+    build_probe_query,
+    probe_digest,
+    brain_due,
+    run_is_noop,
+    NOOP_MAX_MINUTES,
     CREDITS_NEEDED_FOR_RUN,
     BRAIN_SECONDS_PER_REPO,
     PR_REVIEW_BASE_SECONDS,
@@ -67,3 +73,85 @@ class TestRunLock:
 
     def test_garbage_timestamp_is_inactive(self):
         assert lock_is_active({"at": "not-a-date"}) is False
+
+
+def _probe_resp(heads_by_alias, status=200):
+    r = Mock()
+    r.status_code = status
+    r.headers = {}
+    r.json.return_value = {"data": {alias: {"pullRequests": {"totalCount": len(heads), "nodes": [
+        {"number": n, "headRefOid": sha, "isDraft": False, "baseRefName": "main"} for n, sha in heads]}}
+        for alias, heads in heads_by_alias.items()}}
+    return r
+
+
+class TestNoopProbe:
+    """A cycle is a no-op only when the PR heads match the last completed run and nothing is queued."""
+
+    def _fresh_groups(self, *repos):
+        return {r: {"built_at": datetime.now(timezone.utc).isoformat()} for r in repos}
+
+    def _run(self, stored, resp):
+        with patch('check_credits_and_init.requests.Session.post', return_value=resp), \
+                patch('check_credits_and_init.waveassist.fetch_data',
+                      side_effect=lambda key, default=None, **k: stored.get(key, default)):
+            return run_is_noop(["o/r"], "tok")
+
+    def _last(self, digest, minutes_ago=5):
+        at = (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat()
+        return {"digest": digest, "at": at}
+
+    def test_query_aliases_every_repo(self):
+        query, variables = build_probe_query(["a/x", "b/y"])
+        assert "r0: repository" in query and "r1: repository" in query and "headRefOid" in query
+        assert variables == {"o0": "a", "n0": "x", "o1": "b", "n1": "y"}
+
+    def test_digest_tracks_heads_not_order(self):
+        with patch('check_credits_and_init.requests.Session.post', return_value=_probe_resp({"r0": [(1, "a"), (2, "b")]})):
+            first = probe_digest(["o/r"], "tok")
+        with patch('check_credits_and_init.requests.Session.post', return_value=_probe_resp({"r0": [(2, "b"), (1, "a")]})):
+            assert probe_digest(["o/r"], "tok") == first
+        with patch('check_credits_and_init.requests.Session.post', return_value=_probe_resp({"r0": [(1, "a"), (2, "c")]})):
+            assert probe_digest(["o/r"], "tok") != first
+
+    def test_probe_failure_is_not_a_noop(self):
+        with patch('check_credits_and_init.requests.Session.post', return_value=_probe_resp({}, status=502)):
+            assert probe_digest(["o/r"], "tok") is None
+        assert self._run({}, _probe_resp({}, status=502)) == (False, None, None)
+
+    def test_unchanged_heads_are_a_noop(self):
+        resp = _probe_resp({"r0": [(1, "a")]})
+        with patch('check_credits_and_init.requests.Session.post', return_value=resp):
+            digest = probe_digest(["o/r"], "tok")
+        stored = {"noop_probe": self._last(digest), "repo_groups": self._fresh_groups("o/r")}
+        noop, got, state = self._run(stored, resp)
+        assert (noop, got) == (True, digest) and set(state) == {"o/r"}
+
+    def test_queued_work_stale_probe_or_due_brain_run_the_cycle(self):
+        resp = _probe_resp({"r0": [(1, "a")]})
+        with patch('check_credits_and_init.requests.Session.post', return_value=resp):
+            digest = probe_digest(["o/r"], "tok")
+        base = {"noop_probe": self._last(digest), "repo_groups": self._fresh_groups("o/r")}
+        assert self._run({**base, "post_queue": [{"key": "k"}]}, resp)[0] is False
+        assert self._run({**base, "noop_probe": self._last(digest, NOOP_MAX_MINUTES + 1)}, resp)[0] is False
+        assert self._run({**base, "repo_groups": {}}, resp)[0] is False
+        assert self._run({**base, "noop_probe": self._last("other")}, resp)[:2] == (False, digest)
+
+    def test_probe_goes_through_the_governed_client(self):
+        resp = _probe_resp({"r0": [(1, "a")]})
+        with patch('check_credits_and_init.requests.Session.post', return_value=resp) as post:
+            probe_digest(["o/r"], "tok")
+        assert post.call_args.kwargs["headers"]["Authorization"] == "bearer tok"
+
+    def test_server_error_is_retried(self):
+        ok = _probe_resp({"r0": [(1, "a")]})
+        with patch('check_credits_and_init.requests.Session.post',
+                   side_effect=[_probe_resp({}, status=502), ok]) as post:
+            assert probe_digest(["o/r"], "tok") is not None
+        assert post.call_count == 2
+
+    def test_brain_due(self):
+        old = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+        assert brain_due(["o/r"], self._fresh_groups("o/r")) is False
+        assert brain_due(["o/r"], {"o/r": {"built_at": old}}) is True
+        assert brain_due(["o/r", "o/s"], self._fresh_groups("o/r")) is True
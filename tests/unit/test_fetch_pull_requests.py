@@ -6,6 +6,7 @@ from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime, timezone, timedelta
 import sys
 import os
+import time
 
 # Add parent directory to path to import modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
@@ -18,7 +19,20 @@ from fetch_pull_requests import (
     is_old_pr,
     is_draft_pr,
     build_pr_data,
-    fetch_and_process_prs
+    fetch_and_process_prs,
+    prune_http_cache,
+    build_discovery_query,
+    discover_open_prs_graphql,
+    split_reviewed_prs_by_repo,
+    fetch_repos_concurrently,
+    list_open_prs,
+    migrate_legacy_reviewed_prs,
+    pr_job_key,
+    full_sweep_due,
+    patch_digest,
+    split_unified_diff,
+    store_pr_jobs,
+    HTTP_CACHE_TTL_DAYS,
 )
 
 
@@ -32,7 +46,7 @@ def _paged(status=200, json_data=None, has_next=False):
 
 class TestSkipRunNoOp:
     """When check_credits_and_init set skip_run (an overlapping cycle), the driver must be a no-op:
-    no GitHub calls, and it must NOT store pull_requests (so downstream nodes no-op too)."""
+    no GitHub calls, and it must NOT store pr_jobs (so downstream nodes no-op too)."""
 
     def test_skip_run_does_no_work(self, monkeypatch):
         import runpy, waveassist
@@ -45,17 +59,17 @@ class TestSkipRunNoOp:
         monkeypatch.setattr(waveassist, "store_data",
                             lambda key, value, **k: stored.__setitem__(key, value))
         import requests
-        monkeypatch.setattr(requests, "get",
+        monkeypatch.setattr(requests.Session, "get",
                             lambda *a, **k: (_ for _ in ()).throw(AssertionError("no GitHub call on skip")))
         runpy.run_path("fetch_pull_requests.py", run_name="__main__")
-        assert "pull_requests" not in stored   # nothing queued for review
+        assert "pull_requests" not in stored and "pr_jobs" not in stored   # nothing queued for review
         assert called["get"] == 0
 
 
 class TestFetchCompareDiff:
     """Tests for fetch_compare_diff function."""
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_fetch_compare_diff_success(self, mock_get, sample_compare_response):
         """Test successfully fetching compare diff."""
         mock_response = Mock()
@@ -73,7 +87,7 @@ class TestFetchCompareDiff:
         assert result[0]["deletions"] == 1
         mock_get.assert_called_once()
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_fetch_compare_diff_api_error(self, mock_get):
         """Test handling GitHub API errors."""
         mock_response = Mock()
@@ -85,7 +99,7 @@ class TestFetchCompareDiff:
         
         assert result == []
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_fetch_compare_diff_server_error(self, mock_get):
         """Test handling server errors."""
         mock_response = Mock()
@@ -97,7 +111,7 @@ class TestFetchCompareDiff:
         
         assert result == []
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_fetch_compare_diff_empty_files(self, mock_get):
         """Test handling empty file list."""
         mock_response = Mock()
@@ -110,7 +124,7 @@ class TestFetchCompareDiff:
         
         assert result == []
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_fetch_compare_diff_missing_patch(self, mock_get):
         """Test handling files without patch data."""
         mock_response = Mock()
@@ -134,7 +148,7 @@ class TestFetchCompareDiff:
         assert result[0]["filename"] == "binary.bin"
         assert result[0]["patch"] == ""
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_fetch_compare_diff_parse_error(self, mock_get):
         """Test handling JSON parse errors."""
         mock_response = Mock()
@@ -151,7 +165,7 @@ class TestFetchCompareDiff:
 class TestFetchPRFiles:
     """Tests for fetch_pr_files function."""
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_fetch_pr_files_success(self, mock_get, sample_pr_files):
         """Test successfully fetching PR files."""
         mock_response = Mock()
@@ -167,7 +181,7 @@ class TestFetchPRFiles:
         assert result[1]["filename"] == "new_file.py"
         mock_get.assert_called_once()
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_fetch_pr_files_api_error(self, mock_get):
         """Test handling API errors."""
         mock_response = Mock()
@@ -179,7 +193,7 @@ class TestFetchPRFiles:
         
         assert result == []
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_fetch_pr_files_invalid_json(self, mock_get):
         """Test handling invalid JSON responses."""
         mock_response = Mock()
@@ -218,6 +232,19 @@ class TestIsFirstRunForRepo:
         result = is_first_run_for_repo("owner/repo", reviewed_prs)
         assert result == False
 
+    def test_prefix_collision_is_not_a_match(self):
+        """owner/repo-two entries must not make owner/repo look already-seen."""
+        assert is_first_run_for_repo("owner/repo", {"owner/repo-two#1": {}}) == True
+
+    def test_fetch_uses_it_for_the_first_run_decision(self, sample_recent_pr_data, sample_pr_files):
+        """fetch_and_process_prs takes its first-run branch (capped, rest skipped) from this check."""
+        with patch('fetch_pull_requests.is_first_run_for_repo', return_value=True) as first, \
+                patch('fetch_pull_requests.fetch_pr_files', return_value=sample_pr_files):
+            reviewed = {"owner/repo#999": {"status": "reviewed"}}
+            prs, _ = fetch_and_process_prs({"id": "owner/repo"}, "tok", reviewed, open_prs=[sample_recent_pr_data])
+        first.assert_called_once_with("owner/repo", reviewed)
+        assert [pr["review_type"] for pr in prs] == ["full"]
+
 
 class TestIsBotPR:
     """Tests for is_bot_pr function."""
@@ -342,7 +369,7 @@ class TestFetchAndProcessPRs:
     """Tests for fetch_and_process_prs function."""
     
     @patch('fetch_pull_requests.fetch_pr_files')
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_first_run_processes_first_two(self, mock_get, mock_fetch_files, sample_pr_data):
         """Test first run processes first 2 PRs and skips rest."""
         from datetime import datetime, timezone
@@ -398,7 +425,7 @@ class TestFetchAndProcessPRs:
         assert reviewed_prs["owner/repo#3"]["status"] == "skipped"
     
     @patch('fetch_pull_requests.fetch_pr_files')
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_subsequent_run_new_pr(self, mock_get, mock_fetch_files):
         """Test subsequent run processes new PR."""
         from datetime import datetime, timezone
@@ -436,7 +463,7 @@ class TestFetchAndProcessPRs:
         assert changed == True
     
     @patch('fetch_pull_requests.fetch_pr_files')
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_detects_new_commits(self, mock_get, mock_fetch_files):
         """Test detecting new commits on reviewed PR (re-review pulls the FULL PR, not the compare diff)."""
         from datetime import datetime, timezone
@@ -479,7 +506,7 @@ class TestFetchAndProcessPRs:
         mock_fetch_files.assert_called_once()
     
     @patch('fetch_pull_requests.fetch_pr_files')
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_skips_bot_prs(self, mock_get, mock_fetch_files, sample_bot_pr_data):
         """Test skipping bot PRs."""
         from datetime import datetime, timezone
@@ -515,7 +542,7 @@ class TestFetchAndProcessPRs:
         assert prs[0]["pr_number"] == 123
     
     @patch('fetch_pull_requests.fetch_pr_files')
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_skips_old_prs(self, mock_get, mock_fetch_files, sample_old_pr_data, sample_recent_pr_data):
         """Test skipping old PRs."""
         mock_response = Mock()
@@ -539,7 +566,7 @@ class TestFetchAndProcessPRs:
         assert len(prs) == 1
         assert prs[0]["pr_number"] == 126
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_skips_permanently_skipped_prs(self, mock_get, sample_pr_data):
         """Test skipping permanently skipped PRs."""
         mock_response = Mock()
@@ -559,7 +586,7 @@ class TestFetchAndProcessPRs:
         
         assert len(prs) == 0
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_cleans_up_closed_prs(self, mock_get, sample_pr_data):
         """Test cleanup of closed PRs from tracker."""
         mock_response = Mock()
@@ -579,7 +606,15 @@ class TestFetchAndProcessPRs:
         assert "owner/repo#123" not in reviewed_prs
         assert changed == True
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_cleanup_leaves_other_repos_alone(self, mock_get):
+        """Closed-PR cleanup only touches this repo's keys, including look-alike repo names."""
+        mock_get.return_value = _paged(200, [])
+        reviewed_prs = {"owner/repo#1": {"status": "reviewed"}, "owner/repo-two#1": {"status": "reviewed"}}
+        fetch_and_process_prs({"id": "owner/repo"}, "fake_token", reviewed_prs)
+        assert reviewed_prs == {"owner/repo-two#1": {"status": "reviewed"}}
+
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_api_failure_handling(self, mock_get):
         """Test handling GitHub API failures."""
         mock_response = Mock()
@@ -595,7 +630,7 @@ class TestFetchAndProcessPRs:
         assert len(prs) == 0
         assert changed == False
     
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_invalid_json_response(self, mock_get):
         """Test handling invalid JSON responses."""
         mock_response = Mock()
@@ -625,7 +660,7 @@ class TestIsDraftPR:
 
 
 class TestPagination:
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_fetch_pr_files_paginates(self, mock_get):
         page1 = _paged(200, [{"filename": f"f{i}.py", "patch": "p", "additions": 1, "deletions": 0}
                              for i in range(100)], has_next=True)
@@ -635,7 +670,7 @@ class TestPagination:
         assert len(result) == 101
         assert mock_get.call_count == 2
 
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_fetch_compare_diff_paginates(self, mock_get):
         page1 = _paged(200, {"files": [{"filename": f"f{i}.py", "patch": "p"} for i in range(100)]},
                        has_next=True)
@@ -645,7 +680,7 @@ class TestPagination:
         assert len(result) == 101
         assert mock_get.call_count == 2
 
-    @patch('fetch_pull_requests.requests.get')
+    @patch('fetch_pull_requests.requests.Session.get')
     def test_single_page_when_no_next(self, mock_get):
         # a Mock response without a dict .links must NOT loop forever (defensive _has_next_page)
         mock_get.return_value = _paged(200, [{"filename": "a.py", "patch": "p"}])
@@ -664,3 +699,1165 @@ class TestBuildPRDataBrainProfile:
         r = build_pr_data(sample_pr_data, sample_pr_files, "full", "abc", "owner/repo")
         assert "brain_profile" not in r
 
+
+
+def _validated(status=200, json_data=None, etag='"e1"', has_next=False):
+    r = _paged(status, json_data, has_next)
+    r.headers = {"ETag": etag} if etag else {}
+    return r
+
+
+class TestConditionalCache:
+    """ETag / If-None-Match cache: a 304 replays the stored body and is free against the rate limit."""
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_200_stores_slim_entry(self, mock_get):
+        mock_get.return_value = _validated(200, [{"filename": "a.py", "patch": "p", "status": "added",
+                                                  "additions": 1, "deletions": 0, "sha": "b1",
+                                                  "blob_url": "https://x", "contents_url": "https://y"}])
+        cache = {}
+        result = fetch_pr_files("owner/repo", 1, {}, cache=cache)
+        assert result[0]["filename"] == "a.py"
+        (entry,) = cache.values()
+        assert entry["etag"] == '"e1"'
+        assert "blob_url" not in entry["body"][0]          # stored slimmed
+        assert "If-None-Match" not in mock_get.call_args.kwargs["headers"]
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_304_replays_cached_body(self, mock_get):
+        mock_get.return_value = _validated(200, [{"filename": "a.py", "patch": "p"}])
+        cache = {}
+        fetch_pr_files("owner/repo", 1, {}, cache=cache)
+        mock_get.return_value = _validated(304, etag=None)
+        result = fetch_pr_files("owner/repo", 1, {"Authorization": "token t"}, cache=cache)
+        assert [f["filename"] for f in result] == ["a.py"]
+        sent = mock_get.call_args.kwargs["headers"]
+        assert sent["If-None-Match"] == '"e1"' and sent["Authorization"] == "token t"
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_304_replays_pagination(self, mock_get):
+        cache = {}
+        mock_get.side_effect = [_validated(200, [{"filename": "a.py"}], etag='"p1"', has_next=True),
+                                _validated(200, [{"filename": "b.py"}], etag='"p2"')]
+        fetch_pr_files("owner/repo", 1, {}, cache=cache)
+        mock_get.side_effect = [_validated(304, etag=None), _validated(304, etag=None)]
+        result = fetch_pr_files("owner/repo", 1, {}, cache=cache)
+        assert [f["filename"] for f in result] == ["a.py", "b.py"]
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_pr_list_uses_cache(self, mock_get, sample_recent_pr_data):
+        cache = {}
+        mock_get.return_value = _validated(200, [{**sample_recent_pr_data, "head": {"sha": "s", "repo": {"big": 1}}}])
+        reviewed = {"owner/repo#126": {"status": "skipped"}}
+        fetch_and_process_prs({"id": "owner/repo"}, "tok", reviewed, http_cache=cache)
+        mock_get.return_value = _validated(304, etag=None)
+        prs, changed = fetch_and_process_prs({"id": "owner/repo"}, "tok", reviewed, http_cache=cache)
+        assert prs == [] and changed is False
+        assert "owner/repo#126" in reviewed                # replayed list still counts the PR as open
+
+    def test_prune_drops_stale_entries(self):
+        old = (datetime.now(timezone.utc) - timedelta(days=HTTP_CACHE_TTL_DAYS + 1)).isoformat()
+        fresh = datetime.now(timezone.utc).isoformat()
+        cache = {"old": {"at": old}, "fresh": {"at": fresh}, "garbage": {}}
+        assert prune_http_cache(cache) == 2
+        assert list(cache) == ["fresh"]
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_oversized_page_is_not_cached(self, mock_get):
+        cache = {}
+        mock_get.return_value = _validated(200, [{"filename": "big.py", "patch": "+x\n" * 30000}], etag='"p1"')
+        with patch('fetch_pull_requests.HTTP_CACHE_MAX_ENTRY_BYTES', 1000):
+            files = fetch_pr_files("owner/repo", 1, {}, cache=cache)
+        assert files[0]["filename"] == "big.py" and cache == {}
+
+    def test_bound_evicts_oldest_entries_by_bytes(self):
+        from fetch_pull_requests import bound_http_cache
+        cache = {k: {"at": f"2026-01-0{i}", "body": "x" * 100} for i, k in enumerate(("a", "b", "c"), 1)}
+        assert bound_http_cache(cache, max_bytes=300) == 1
+        assert set(cache) == {"b", "c"}
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_driver_shards_cache_per_repo(self, mock_get, sample_recent_pr_data):
+        import waveassist
+        stored = {}
+        mock_get.return_value = _validated(200, [], etag='"l"')
+        with patch.object(waveassist, "fetch_data", lambda key=None, default=None, **k: stored.get(key, default)), \
+                patch.object(waveassist, "store_data", lambda key, value, **k: stored.__setitem__(key, value)):
+            fetch_repos_concurrently([{"id": "o/a"}, {"id": "o/b"}], "tok", {}, cache_shards=True)
+            assert set(k for k in stored if k.startswith("http_cache:")) == {"http_cache:o/a", "http_cache:o/b"}
+            writes = []
+            with patch.object(waveassist, "store_data", lambda key, value, **k: writes.append(key)):
+                mock_get.return_value = _validated(304, etag=None)
+                prs, _ = fetch_repos_concurrently([{"id": "o/a"}], "tok", {}, cache_shards=True)
+        assert mock_get.call_args[1]["headers"]["If-None-Match"] == '"l"'
+        assert writes == []                                 # 304s only: nothing rewritten
+
+
+def _gql_node(number, created_at, typename="User", login="dev", draft=False):
+    return {"number": number, "title": f"PR {number}", "body": "", "createdAt": created_at,
+            "updatedAt": created_at, "isDraft": draft, "headRefOid": f"sha{number}",
+            "author": {"__typename": typename, "login": login}}
+
+
+class TestGraphQLDiscovery:
+    def test_query_aliases_and_variables(self):
+        query, variables = build_discovery_query(["a/one", "b/two"])
+        assert "r0: repository(owner: $o0, name: $n0)" in query
+        assert "r1: repository(owner: $o1, name: $n1)" in query
+        assert "rateLimit { cost" in query
+        assert variables == {"o0": "a", "n0": "one", "o1": "b", "n1": "two"}
+
+    @patch('fetch_pull_requests.requests.Session.post')
+    def test_maps_nodes_to_rest_shape_and_skips_truncated(self, mock_post):
+        now = datetime.now(timezone.utc).isoformat()
+        mock_post.return_value = _paged(200, {"data": {
+            "rateLimit": {"cost": 1, "remaining": 4999},
+            "r0": {"pullRequests": {"pageInfo": {"hasNextPage": False},
+                                    "nodes": [_gql_node(7, now, typename="Bot", login="renovate")]}},
+            "r1": {"pullRequests": {"pageInfo": {"hasNextPage": True}, "nodes": []}},
+            "r2": None,
+        }})
+        out = discover_open_prs_graphql(["o/a", "o/b", "o/c"], {})
+        assert list(out) == ["o/a"]                       # truncated / errored repos fall back to REST
+        pr = out["o/a"][0]
+        assert pr["head"]["sha"] == "sha7" and pr["user"]["type"] == "Bot"
+        assert is_bot_pr(pr) is True
+
+    @patch('fetch_pull_requests.requests.Session.post')
+    def test_batches_per_graphql_batch_size(self, mock_post):
+        import fetch_pull_requests
+        mock_post.return_value = _paged(200, {"data": {}})
+        repos = [f"o/r{i}" for i in range(fetch_pull_requests.GRAPHQL_BATCH_SIZE + 1)]
+        discover_open_prs_graphql(repos, {})
+        assert mock_post.call_count == 2
+
+    @patch('fetch_pull_requests.requests.Session.post')
+    def test_http_failure_returns_empty(self, mock_post):
+        mock_post.return_value = _paged(502)
+        assert discover_open_prs_graphql(["o/a"], {}) == {}
+
+    @patch('fetch_pull_requests.fetch_pr_files')
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_discovered_listing_skips_rest_and_filters_apply(self, mock_get, mock_files):
+        now = datetime.now(timezone.utc).isoformat()
+        old = (datetime.now(timezone.utc) - timedelta(days=90)).isoformat()
+        mock_files.return_value = [{"filename": "a.py", "patch": "p"}]
+        listing = [dict(n) for n in (
+            {"number": 1, "created_at": now, "draft": False, "user": {"type": "User", "login": "dev"}, "head": {"sha": "s1"}},
+            {"number": 2, "created_at": now, "draft": True, "user": {"type": "User", "login": "dev"}, "head": {"sha": "s2"}},
+            {"number": 3, "created_at": old, "draft": False, "user": {"type": "User", "login": "dev"}, "head": {"sha": "s3"}},
+        )]
+        prs, _ = fetch_and_process_prs({"id": "owner/repo"}, "tok", {}, open_prs=listing)
+        assert [p["pr_number"] for p in prs] == [1]
+        mock_get.assert_not_called()
+
+
+class TestConcurrentFetch:
+    """Repos run on a thread pool; each task mutates a private copy that is merged back in order."""
+
+    def test_split_by_repo(self):
+        groups = split_reviewed_prs_by_repo({"a/x#1": {}, "a/x#2": {}, "b/y#1": {}, "a/x-2#1": {}})
+        assert set(groups) == {"a/x", "b/y", "a/x-2"}
+        assert set(groups["a/x"]) == {"a/x#1", "a/x#2"}
+
+    @patch('fetch_pull_requests.fetch_and_process_prs')
+    def test_results_merged_in_repo_order(self, mock_fap):
+        def fake(repo, token, view, cache, open_prs=None, cursor=None, mirror=None, touched=None):
+            repo_path = repo["id"]
+            view.pop(f"{repo_path}#1", None)                       # "closed" PR cleaned up
+            view[f"{repo_path}#9"] = {"status": "skipped"}
+            return [{"id": repo_path, "pr_number": 9}], True
+        mock_fap.side_effect = fake
+        reviewed = {"a/x#1": {"status": "reviewed"}, "b/y#1": {"status": "reviewed"}, "c/z#5": {"k": 1}}
+        repos = [{"id": "a/x"}, {"id": "b/y"}]
+        prs, changed = fetch_repos_concurrently(repos, "tok", reviewed, max_workers=4)
+        assert [p["id"] for p in prs] == ["a/x", "b/y"]
+        assert changed == {"a/x": {"a/x#9": {"status": "skipped"}}, "b/y": {"b/y#9": {"status": "skipped"}}}
+        assert reviewed == {"c/z#5": {"k": 1}, "a/x#9": {"status": "skipped"}, "b/y#9": {"status": "skipped"}}
+
+    @patch('fetch_pull_requests.fetch_and_process_prs')
+    def test_task_sees_only_its_repo(self, mock_fap):
+        seen = {}
+        def fake(repo, token, view, cache, open_prs=None, cursor=None, mirror=None, touched=None):
+            seen[repo["id"]] = set(view)
+            return [], False
+        mock_fap.side_effect = fake
+        reviewed = {"a/x#1": {}, "b/y#2": {}}
+        fetch_repos_concurrently([{"id": "a/x"}, {"id": "b/y"}], "tok", reviewed)
+        assert seen == {"a/x": {"a/x#1"}, "b/y": {"b/y#2"}}
+
+    @patch('fetch_pull_requests.fetch_and_process_prs')
+    def test_failing_repo_is_isolated(self, mock_fap):
+        def fake(repo, token, view, cache, open_prs=None, cursor=None, mirror=None, touched=None):
+            if repo["id"] == "bad/repo":
+                raise RuntimeError("boom")
+            return [{"id": repo["id"]}], False
+        mock_fap.side_effect = fake
+        reviewed = {"bad/repo#1": {"status": "reviewed"}}
+        prs, changed = fetch_repos_concurrently([{"id": "bad/repo"}, {"id": "ok/repo"}], "tok", reviewed,
+                                                max_workers="not-a-number")
+        assert prs == [{"id": "ok/repo"}] and changed == {}
+        assert "bad/repo#1" in reviewed                            # untouched on failure
+
+
+def _aged_pr(number, days_old):
+    created = (datetime.now(timezone.utc) - timedelta(days=days_old)).isoformat().replace("+00:00", "Z")
+    return {"number": number, "title": "t", "body": "", "created_at": created,
+            "user": {"type": "User", "login": "dev"}, "head": {"sha": f"s{number}"}}
+
+
+class TestEarlyStopPagination:
+    """The listing is sorted created-desc, so paging stops once a page's oldest PR is past the cutoff."""
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_stops_after_page_past_cutoff(self, mock_get):
+        mock_get.side_effect = [_paged(200, [_aged_pr(300, 1), _aged_pr(299, 70)], has_next=True),
+                                AssertionError("must not fetch page 2")]
+        prs, complete = list_open_prs("owner/repo", {}, max_age_days=60)
+        assert [p["number"] for p in prs] == [300, 299]
+        assert complete is False
+        assert mock_get.call_count == 1
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_keeps_paging_while_recent(self, mock_get):
+        mock_get.side_effect = [_paged(200, [_aged_pr(300, 1)], has_next=True),
+                                _paged(200, [_aged_pr(200, 2)])]
+        prs, complete = list_open_prs("owner/repo", {}, max_age_days=60)
+        assert len(prs) == 2 and complete is True
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_unseen_old_entries_not_treated_as_closed(self, mock_get):
+        mock_get.side_effect = [_paged(200, [_aged_pr(300, 1), _aged_pr(250, 70)], has_next=True)]
+        now = datetime.now(timezone.utc).isoformat()
+        reviewed = {
+            "owner/repo#300": {"status": "reviewed", "last_reviewed_sha": "s300", "reviewed_at": now},
+            "owner/repo#280": {"status": "reviewed", "reviewed_at": now},   # newer than the floor, not listed → closed
+            "owner/repo#100": {"status": "skipped", "skipped_at": now},     # never seen → kept
+        }
+        prs, changed = fetch_and_process_prs({"id": "owner/repo"}, "tok", reviewed)
+        assert "owner/repo#280" not in reviewed
+        assert "owner/repo#100" in reviewed
+        assert changed is True
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_unseen_old_entries_still_expire_when_stale(self, mock_get):
+        mock_get.side_effect = [_paged(200, [_aged_pr(300, 70)], has_next=True)]
+        stale = (datetime.now(timezone.utc) - timedelta(days=120)).isoformat()
+        reviewed = {"owner/repo#100": {"status": "skipped", "skipped_at": stale}}
+        fetch_and_process_prs({"id": "owner/repo"}, "tok", reviewed)
+        assert reviewed == {}
+
+
+class TestParallelPages:
+    """Once rel="last" is known, remaining pages are fetched concurrently and reassembled in order."""
+
+    @staticmethod
+    def _by_page(pages, fail_page=None):
+        def fake_get(url, headers=None, params=None, timeout=None):
+            page = params["page"]
+            if page == fail_page:
+                return _paged(500)
+            r = _paged(200, pages[page - 1])
+            if page == 1:
+                r.links = {"next": {"url": f"{url}?page=2"}, "last": {"url": f"{url}?per_page=100&page={len(pages)}"}}
+            return r
+        return fake_get
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_pr_files_reassembled_in_order(self, mock_get):
+        pages = [[{"filename": f"p{n}_{i}.py", "patch": "p"} for i in range(3)] for n in range(1, 6)]
+        mock_get.side_effect = self._by_page(pages)
+        result = fetch_pr_files("owner/repo", 1, {})
+        assert [f["filename"] for f in result] == [f["filename"] for page in pages for f in page]
+        assert sorted(c.kwargs["params"]["page"] for c in mock_get.call_args_list) == [1, 2, 3, 4, 5]
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_failed_page_keeps_earlier_pages(self, mock_get):
+        pages = [[{"filename": f"p{n}.py"}] for n in range(1, 5)]
+        mock_get.side_effect = self._by_page(pages, fail_page=3)
+        result = fetch_pr_files("owner/repo", 1, {})
+        assert [f["filename"] for f in result] == ["p1.py", "p2.py"]
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_compare_diff_parallel(self, mock_get):
+        pages = [{"files": [{"filename": f"c{n}.py"}]} for n in range(1, 4)]
+        mock_get.side_effect = self._by_page(pages)
+        result = fetch_compare_diff("owner/repo", "b", "h", {})
+        assert [f["filename"] for f in result] == ["c1.py", "c2.py", "c3.py"]
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_pr_listing_stays_sequential_with_age_cutoff(self, mock_get):
+        pages = [[_aged_pr(300, 70)], [_aged_pr(200, 80)], [_aged_pr(100, 90)]]
+        mock_get.side_effect = self._by_page(pages)
+        prs, complete = list_open_prs("owner/repo", {}, max_age_days=60)
+        assert [p["number"] for p in prs] == [300] and complete is False
+        assert mock_get.call_count == 1
+
+
+class TestReviewedPrsShards:
+    """reviewed_prs lives in per-repo keys (reviewed_prs:{owner/repo}); the legacy blob migrates once."""
+
+    @staticmethod
+    def _store(initial):
+        store = dict(initial)
+        wa = Mock()
+        wa.fetch_data.side_effect = lambda key=None, default=None, **k: store.get(key, default)
+        wa.store_data.side_effect = lambda key, value, **k: store.__setitem__(key, value)
+        return store, wa
+
+    def test_migrates_legacy_blob_into_shards(self):
+        store, wa = self._store({"reviewed_prs": {"a/x#1": {"status": "reviewed"}, "b/y#2": {"status": "skipped"}}})
+        with patch('fetch_pull_requests.waveassist', wa):
+            assert migrate_legacy_reviewed_prs() == 2
+        assert store["reviewed_prs:a/x"] == {"a/x#1": {"status": "reviewed"}}
+        assert store["reviewed_prs:b/y"] == {"b/y#2": {"status": "skipped"}}
+        assert store["reviewed_prs"] == {}
+
+    def test_existing_shard_entries_win_and_rerun_is_noop(self):
+        store, wa = self._store({"reviewed_prs": {"a/x#1": {"status": "skipped"}},
+                                 "reviewed_prs:a/x": {"a/x#1": {"status": "reviewed"}}})
+        with patch('fetch_pull_requests.waveassist', wa):
+            migrate_legacy_reviewed_prs()
+            assert migrate_legacy_reviewed_prs() == 0
+        assert store["reviewed_prs:a/x"] == {"a/x#1": {"status": "reviewed"}}
+
+    @patch('fetch_pull_requests.fetch_and_process_prs')
+    def test_tasks_load_their_own_shard(self, mock_fap):
+        def fake(repo, token, view, cache, open_prs=None, cursor=None, mirror=None, touched=None):
+            view[f"{repo['id']}#2"] = {"status": "skipped"}
+            return [], repo["id"] == "a/x"
+        mock_fap.side_effect = fake
+        shards = {"a/x": {"a/x#1": {"status": "reviewed"}}, "b/y": {}}
+        _, changed = fetch_repos_concurrently([{"id": "a/x"}, {"id": "b/y"}], "tok", {},
+                                              load_shard=lambda r: shards[r])
+        assert changed == {"a/x": {"a/x#1": {"status": "reviewed"}, "a/x#2": {"status": "skipped"}}}
+        assert shards["a/x"] == {"a/x#1": {"status": "reviewed"}}   # loaded shard is copied, not mutated
+
+
+class TestPrJobs:
+    """Each PR job gets its own key; the pr_jobs manifest is written after every job it lists."""
+
+    def test_job_key_includes_repo_number_and_sha(self):
+        assert pr_job_key({"id": "o/r", "pr_number": 7, "current_sha": "abc"}) == "pr_job:o/r#7@abc"
+
+    def test_jobs_stored_before_manifest(self):
+        order = []
+        wa = MagicMock()
+        wa.store_data.side_effect = lambda key, value, **k: order.append((key, value))
+        prs = [{"id": "o/r", "pr_number": 1, "current_sha": "a", "files": [{"filename": "x"}]},
+               {"id": "o/s", "pr_number": 2, "current_sha": "b", "files": []}]
+        with patch('fetch_pull_requests.waveassist', wa):
+            manifest = store_pr_jobs(prs)
+        assert [k for k, _ in order] == ["pr_job:o/r#1@a", "pr_job:o/s#2@b", "pr_jobs"]
+        assert order[0][1] is prs[0]
+        assert order[-1][1] == manifest
+        assert manifest[0] == {"key": "pr_job:o/r#1@a", "id": "o/r", "pr_number": 1, "current_sha": "a",
+                               "comment_generated": False, "comment_posted": False}
+        assert "files" not in manifest[1]
+
+    def test_replaced_manifest_jobs_are_blanked_unless_queued(self):
+        stored = {"pr_jobs": [{"key": "pr_job:o/r#1@old"}, {"key": "pr_job:o/r#2@q"}, {"key": "pr_job:o/r#3@c"}]}
+        wa = MagicMock()
+        wa.fetch_data.side_effect = lambda key, default=None, **k: stored.get(key, default)
+        wa.store_data.side_effect = lambda key, value, **k: stored.__setitem__(key, value)
+        with patch('fetch_pull_requests.waveassist', wa):
+            store_pr_jobs([{"id": "o/r", "pr_number": 3, "current_sha": "c"}], keep_keys={"pr_job:o/r#2@q"})
+        assert stored["pr_job:o/r#1@old"] == {}
+        assert "pr_job:o/r#2@q" not in stored and stored["pr_job:o/r#3@c"]["pr_number"] == 3
+
+
+def _updated_pr(number, updated_at, sha=None):
+    pr = _aged_pr(number, 1)
+    pr["updated_at"] = updated_at
+    pr["head"] = {"sha": sha or f"s{number}"}
+    return pr
+
+
+class TestUpdatedCursor:
+    """Between full sweeps, only PRs updated since the repo's cursor get per-PR work."""
+
+    def _fresh(self, updated_at="2026-01-02T00:00:00Z"):
+        return {"updated_at": updated_at, "full_sweep_at": datetime.now(timezone.utc).isoformat()}
+
+    def test_full_sweep_due(self):
+        now = datetime.now(timezone.utc)
+        assert full_sweep_due({}) is True
+        assert full_sweep_due({"updated_at": "2026-01-01T00:00:00Z"}) is True
+        assert full_sweep_due(self._fresh(), now) is False
+        old = (now - timedelta(hours=2)).isoformat()
+        assert full_sweep_due({"updated_at": "2026-01-01T00:00:00Z", "full_sweep_at": old}, now) is True
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_since_lists_by_updated_and_stops_early(self, mock_get):
+        mock_get.side_effect = [_paged(200, [_updated_pr(5, "2026-01-03T00:00:00Z"),
+                                             _updated_pr(4, "2026-01-01T00:00:00Z")], has_next=True),
+                                AssertionError("must not fetch page 2")]
+        prs, complete = list_open_prs("owner/repo", {}, since="2026-01-02T00:00:00Z")
+        assert [p["number"] for p in prs] == [5, 4] and complete is False
+        assert mock_get.call_args[1]["params"]["sort"] == "updated"
+
+    @patch('fetch_pull_requests.fetch_pr_files')
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_only_updated_prs_get_per_pr_work(self, mock_get, mock_files):
+        mock_get.side_effect = [_paged(200, [_updated_pr(5, "2026-01-03T00:00:00Z", sha="new5"),
+                                             _updated_pr(4, "2026-01-01T00:00:00Z", sha="new4")])]
+        mock_files.return_value = [{"filename": "a.py", "patch": "+x"}]
+        now = datetime.now(timezone.utc).isoformat()
+        reviewed = {f"owner/repo#{n}": {"status": "reviewed", "last_reviewed_sha": "old",
+                                        "last_review_text": "r", "reviewed_at": now} for n in (5, 4, 3)}
+        cursor = self._fresh()
+        prs, changed = fetch_and_process_prs({"id": "owner/repo"}, "tok", reviewed, cursor=cursor)
+        assert [p["pr_number"] for p in prs] == [5]          # #4 predates the cursor
+        assert mock_files.call_count == 1
+        assert "owner/repo#3" in reviewed and changed is False   # unlisted is not proof of closed
+        assert cursor["updated_at"] == "2026-01-03T00:00:00Z"
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_due_sweep_lists_everything_and_reconciles_closed(self, mock_get):
+        mock_get.side_effect = [_paged(200, [_updated_pr(5, "2026-01-03T00:00:00Z")])]
+        now = datetime.now(timezone.utc).isoformat()
+        reviewed = {"owner/repo#5": {"status": "skipped", "skipped_at": now},
+                    "owner/repo#3": {"status": "skipped", "skipped_at": now}}
+        cursor = {"updated_at": "2026-01-02T00:00:00Z", "full_sweep_at": "2026-01-01T00:00:00+00:00"}
+        _, changed = fetch_and_process_prs({"id": "owner/repo"}, "tok", reviewed, cursor=cursor)
+        assert mock_get.call_args[1]["params"]["sort"] == "created"
+        assert "owner/repo#3" not in reviewed and changed is True
+        assert full_sweep_due(cursor) is False
+
+    @patch('fetch_pull_requests.fetch_and_process_prs')
+    def test_cursors_written_back_per_repo(self, mock_fap):
+        def fake(repo, token, view, cache, open_prs=None, cursor=None, mirror=None, touched=None):
+            cursor["updated_at"] = f"{repo['id']}-t"
+            return [], False
+        mock_fap.side_effect = fake
+        cursors = {"a/x": {"updated_at": "old"}}
+        fetch_repos_concurrently([{"id": "a/x"}, {"id": "b/y"}], "tok", {}, cursors=cursors)
+        assert {r: c["updated_at"] for r, c in cursors.items()} == {"a/x": "a/x-t", "b/y": "b/y-t"}
+
+
+class TestBaseMergeOnlyPush:
+    """A new head whose per-file patches match the reviewed ones only advances last_reviewed_sha."""
+
+    FILES = [{"filename": "a.py", "status": "modified", "patch": "@@ -10,2 +10,3 @@ def f():\n x\n+y"}]
+
+    def test_digest_ignores_hunk_line_numbers(self):
+        shifted = [{**self.FILES[0], "patch": "@@ -40,2 +40,3 @@ def f():\n x\n+y"}]
+        changed = [{**self.FILES[0], "patch": "@@ -10,2 +10,3 @@ def f():\n x\n+z"}]
+        assert patch_digest(shifted) == patch_digest(self.FILES)
+        assert patch_digest(changed) != patch_digest(self.FILES)
+        other = [{"filename": "b.py", "status": "added", "patch": "+new"}]
+        assert patch_digest(other + self.FILES) == patch_digest(self.FILES + other)
+
+    def test_digest_sees_changes_past_a_clipped_patch(self):
+        clipped = {**self.FILES[0], "truncated": True, "additions": 40, "deletions": 2, "sha": "b1"}
+        assert patch_digest([{**clipped, "additions": 41}]) != patch_digest([clipped])
+        assert patch_digest([{**clipped, "sha": "b2"}]) != patch_digest([clipped])
+
+    def test_split_diff_keeps_the_blob_sha_of_clipped_files(self):
+        lines = ["diff --git a/a.py b/a.py", "index 1111111..2222222 100644", "--- a/a.py", "+++ b/a.py",
+                 "@@ -1 +1,3 @@", "+" + "x" * 50, "+" + "y" * 50]
+        assert split_unified_diff(lines, file_budget=70)[0]["sha"] == "2222222"
+        assert "sha" not in split_unified_diff(lines)[0]
+
+    def _run(self, files):
+        reviewed = {"owner/repo#5": {"status": "reviewed", "last_reviewed_sha": "old", "last_review_text": "r",
+                                     "patch_digest": patch_digest(self.FILES),
+                                     "reviewed_at": datetime.now(timezone.utc).isoformat()}}
+        with patch('fetch_pull_requests.requests.Session.get') as mock_get, \
+                patch('fetch_pull_requests.fetch_pr_files', return_value=files):
+            mock_get.return_value = _paged(200, [_updated_pr(5, "2026-01-03T00:00:00Z", sha="new")])
+            prs, changed = fetch_and_process_prs({"id": "owner/repo"}, "tok", reviewed)
+        return prs, changed, reviewed["owner/repo#5"]
+
+    def test_base_merge_skips_review_and_advances_sha(self):
+        shifted = [{**self.FILES[0], "patch": "@@ -12,2 +12,3 @@ def f():\n x\n+y"}]
+        prs, changed, entry = self._run(shifted)
+        assert prs == [] and changed is True
+        assert entry["last_reviewed_sha"] == "new"
+
+    def test_changed_diff_is_rereviewed(self):
+        prs, changed, entry = self._run([{**self.FILES[0], "patch": "@@ -10,2 +10,3 @@\n x\n+z"}])
+        assert [p["review_type"] for p in prs] == ["incremental"]
+        assert entry["last_reviewed_sha"] == "old"
+
+
+class TestPatchBudgets:
+    """Patches are held to per-file and per-PR byte budgets; cut files are flagged."""
+
+    @patch('fetch_pull_requests.MAX_FILE_PATCH_BYTES', 10)
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_file_patch_cut_on_line_boundary(self, mock_get):
+        mock_get.return_value = _paged(200, [{"filename": "a.py", "patch": "+abc\n+def\n+ghi"},
+                                             {"filename": "b.py", "patch": "+x"}])
+        files = fetch_pr_files("o/r", 1, {})
+        assert files[0]["patch"] == "+abc\n+def" and files[0]["truncated"] is True
+        assert files[1]["patch"] == "+x" and "truncated" not in files[1]
+
+    @patch('fetch_pull_requests.MAX_PR_PATCH_BYTES', 8)
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_pr_budget_leaves_later_files_without_patch(self, mock_get):
+        mock_get.return_value = _paged(200, [{"filename": "a.py", "patch": "+abcdef"},
+                                             {"filename": "b.py", "patch": "+x"}])
+        files = fetch_pr_files("o/r", 1, {})
+        assert files[0]["patch"] == "+abcdef" and "truncated" not in files[0]
+        assert files[1] == {"filename": "b.py", "patch": "", "status": "modified",
+                            "additions": 0, "deletions": 0, "truncated": True}
+
+    @patch('fetch_pull_requests.MAX_FILE_PATCH_BYTES', 5)
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_cached_listing_keeps_truncation_flag(self, mock_get):
+        resp = _paged(200, [{"filename": "a.py", "patch": "+ab\n+cd"}])
+        resp.headers = {"ETag": "e1"}
+        mock_get.return_value = resp
+        cache = {}
+        files = fetch_pr_files("o/r", 1, {}, cache=cache)
+        assert files[0]["truncated"] is True
+        assert next(iter(cache.values()))["body"][0]["patch"] == "+ab"
+
+
+RAW_DIFF = """diff --git a/app.py b/app.py
+index 1111111..2222222 100644
+--- a/app.py
++++ b/app.py
+@@ -1,2 +1,2 @@
+ keep
+-old
++new
+diff --git a/new.txt b/new.txt
+new file mode 100644
+index 0000000..3333333
+--- /dev/null
++++ b/new.txt
+@@ -0,0 +1,2 @@
++++counter
++b
+diff --git a/gone.py b/gone.py
+deleted file mode 100644
+index 4444444..0000000
+--- a/gone.py
++++ /dev/null
+@@ -1 +0,0 @@
+-bye
+diff --git a/old name.py b/new name.py
+similarity index 90%
+rename from old name.py
+rename to new name.py
+diff --git a/logo.png b/logo.png
+index 5555555..6666666 100644
+Binary files a/logo.png and b/logo.png differ
+"""
+
+
+def _diff_resp(text, status=200):
+    r = Mock()
+    r.status_code = status
+    data = text.encode()
+    r.iter_content.return_value = [data[i:i + 7] for i in range(0, len(data), 7)]
+    return r
+
+
+class TestRawDiffFallback:
+    """The v3.diff media type is split into files-API-shaped records when the listing has holes."""
+
+    def test_split_records(self):
+        files = {f["filename"]: f for f in split_unified_diff(RAW_DIFF.splitlines())}
+        assert files["app.py"] == {"filename": "app.py", "patch": "@@ -1,2 +1,2 @@\n keep\n-old\n+new",
+                                   "status": "modified", "additions": 1, "deletions": 1}
+        assert files["new.txt"]["status"] == "added" and files["new.txt"]["additions"] == 2
+        assert files["gone.py"]["status"] == "removed" and files["gone.py"]["deletions"] == 1
+        assert files["new name.py"]["status"] == "renamed" and files["new name.py"]["patch"] == ""
+        assert files["logo.png"]["patch"] == ""
+
+    def test_split_decodes_quoted_paths(self):
+        diff = ['diff --git "a/caf\\303\\251.py" "b/caf\\303\\251.py"', "index 1..2 100644",
+                '--- "a/caf\\303\\251.py"', '+++ "b/caf\\303\\251.py"', "@@ -1 +1 @@", "-a", "+b",
+                'diff --git "a/\\303\\251.png" "b/\\303\\251.png"', "new file mode 100644",
+                "Binary files /dev/null and b/\\303\\251.png differ"]
+        assert [f["filename"] for f in split_unified_diff(diff)] == ["café.py", "é.png"]
+
+    def test_split_respects_budgets(self):
+        files = split_unified_diff(RAW_DIFF.splitlines(), file_budget=20, pr_budget=1000)
+        app = files[0]
+        assert app["patch"] == "@@ -1,2 +1,2 @@" and app["truncated"] is True
+        assert app["additions"] == 1 and app["deletions"] == 1   # counts still cover the whole file
+        files = split_unified_diff(RAW_DIFF.splitlines(), pr_budget=10)
+        assert all(f["patch"] == "" for f in files) and files[0]["truncated"] is True
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_listing_with_holes_falls_back_to_streamed_diff(self, mock_get):
+        listing = _paged(200, [{"filename": "app.py", "status": "modified", "additions": 1, "deletions": 1}])
+        mock_get.side_effect = [listing, _diff_resp(RAW_DIFF)]
+        files = fetch_pr_files("o/r", 1, {"Authorization": "token t", "Accept": "application/vnd.github+json"})
+        assert [f["filename"] for f in files] == ["app.py", "new.txt", "gone.py", "new name.py", "logo.png"]
+        kwargs = mock_get.call_args[1]
+        assert kwargs["headers"]["Accept"] == "application/vnd.github.v3.diff" and kwargs["stream"] is True
+        assert mock_get.call_args[0][0].endswith("/repos/o/r/pulls/1")
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_failed_diff_keeps_listing(self, mock_get):
+        listing = _paged(200, [{"filename": "big.py", "status": "modified", "additions": 9}])
+        mock_get.side_effect = [listing, _diff_resp("", status=406)]
+        files = fetch_pr_files("o/r", 1, {})
+        assert [f["filename"] for f in files] == ["big.py"]
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_complete_listing_makes_no_diff_request(self, mock_get):
+        mock_get.return_value = _paged(200, [{"filename": "a.py", "patch": "+x", "additions": 1},
+                                             {"filename": "b.png", "status": "added"}])
+        fetch_pr_files("o/r", 1, {})
+        assert mock_get.call_count == 1
+
+
+class TestGitHubClient:
+    """All GitHub calls share one keep-alive session, are timed per endpoint, and never raise."""
+
+    def test_endpoint_buckets(self):
+        from fetch_pull_requests import _endpoint
+        assert _endpoint("GET", "https://api.github.com/repos/o/r/pulls/12/files?page=2") == \
+            "GET /repos/{repo}/pulls/{n}/files"
+        assert _endpoint("GET", "https://api.github.com/repos/o/r/compare/abc...def") == \
+            "GET /repos/{repo}/compare/{ref}"
+        assert _endpoint("POST", "https://api.github.com/graphql") == "POST /graphql"
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_session_reused_and_timed(self, mock_get):
+        import fetch_pull_requests as fpr
+        mock_get.return_value = _paged(200, [])
+        fpr.GITHUB_TIMINGS.clear()
+        session = fpr._gh_session()
+        fpr.gh_request("GET", "https://api.github.com/repos/o/r/pulls/1/files")
+        fpr.gh_request("GET", "https://api.github.com/repos/o/r/pulls/2/files")
+        assert fpr._gh_session() is session
+        assert mock_get.call_args[1]["timeout"] == fpr.GITHUB_TIMEOUT
+        assert fpr.GITHUB_TIMINGS["GET /repos/{repo}/pulls/{n}/files"]["calls"] == 2
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_network_error_becomes_failed_response(self, mock_get):
+        import requests
+        import fetch_pull_requests as fpr
+        mock_get.side_effect = requests.ConnectionError("reset")
+        fpr.GITHUB_TIMINGS.clear()
+        assert fetch_pr_files("o/r", 1, {}) == []
+        assert fpr.GITHUB_TIMINGS["GET /repos/{repo}/pulls/{n}/files"]["errors"] == 1 + fpr.GITHUB_MAX_RETRIES
+
+
+def _rate_resp(status=200, remaining=None, reset=None, limit=5000, retry_after=None):
+    r = Mock()
+    r.status_code = status
+    r.headers = {}
+    if remaining is not None:
+        r.headers.update({"X-RateLimit-Remaining": str(remaining), "X-RateLimit-Reset": str(reset),
+                          "X-RateLimit-Limit": str(limit)})
+    if retry_after is not None:
+        r.headers["Retry-After"] = str(retry_after)
+    return r
+
+
+class TestRateGovernor:
+    """X-RateLimit-* / Retry-After readings pace calls; each node stops at its reserve floor."""
+
+    def _gov(self, reserve=0.0):
+        from fetch_pull_requests import _RateGovernor
+        return _RateGovernor(reserve)
+
+    def test_no_reading_and_plentiful_budget_do_not_wait(self):
+        gov = self._gov()
+        assert gov.acquire("core", now=1000) == 0
+        gov.observe("core", _rate_resp(remaining=4000, reset=4600), now=1000)
+        assert all(gov.acquire("core", now=1000) == 0 for _ in range(500))
+
+    def test_low_budget_paces_calls(self):
+        gov = self._gov()
+        gov.observe("core", _rate_resp(remaining=8, reset=1100), now=1000)
+        waits = [gov.acquire("core", now=1000) for _ in range(3)]
+        assert waits[:2] == [0, 0] and 0 < waits[2] <= 60
+
+    def test_stops_at_reserve_floor(self):
+        gov = self._gov(reserve=0.25)
+        gov.observe("core", _rate_resp(remaining=1200, reset=4600), now=1000)
+        assert gov.acquire("core", now=1000) is None          # reset is an hour away
+        gov.observe("core", _rate_resp(remaining=1200, reset=1030), now=1000)
+        assert gov.acquire("core", now=1000) == 30           # reset is close: wait for it
+
+    def test_retry_after_blocks(self):
+        gov = self._gov()
+        gov.observe("core", _rate_resp(status=403, retry_after=20), now=1000)
+        assert gov.acquire("core", now=1000) == 20
+        gov.observe("core", _rate_resp(status=429, retry_after=300), now=1000)
+        assert gov.acquire("core", now=1000) is None
+
+    def test_state_round_trip_and_expiry(self):
+        gov = self._gov()
+        gov.observe("core", _rate_resp(remaining=10, reset=2000), now=1000)
+        other = self._gov(reserve=0.25)
+        other.load(gov.state(), now=1500)
+        assert other.acquire("core", now=1500) is None       # 10 left is below a quarter of 5000
+        expired = self._gov(reserve=0.25)
+        expired.load(gov.state(), now=2500)
+        assert expired.acquire("core", now=2500) == 0
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_refused_call_is_not_made(self, mock_get):
+        import fetch_pull_requests as fpr
+        with patch.object(fpr, "_GOVERNOR", self._gov()) as gov:
+            gov.observe("anon/core", _rate_resp(remaining=0, reset=int(time.time()) + 3600))
+            resp = fpr.gh_request("GET", "https://api.github.com/repos/o/r/pulls")
+        assert resp.status_code == 429 and mock_get.call_count == 0
+
+
+class TestRetries:
+    """Transient GitHub failures are retried with jittered backoff inside a per-run budget."""
+
+    def _run(self, method, responses, budget=120):
+        import fetch_pull_requests as fpr
+        sleeps = []
+        with patch(f'fetch_pull_requests.requests.Session.{method.lower()}', side_effect=responses) as mock, \
+                patch.object(fpr, "_GOVERNOR", fpr._RateGovernor(0.0)), \
+                patch.dict(fpr._RETRY_BUDGET, {"seconds": budget, "retries": 0}), \
+                patch('fetch_pull_requests.time.sleep', side_effect=sleeps.append):
+            resp = fpr.gh_request(method, "https://api.github.com/repos/o/r/pulls")
+        return resp, mock.call_count, sleeps
+
+    def test_5xx_get_retried_until_success(self):
+        resp, calls, sleeps = self._run("GET", [_paged(502), _paged(500), _paged(200, [])])
+        assert resp.status_code == 200 and calls == 3 and len(sleeps) == 2
+        assert all(0 <= s <= 2 for s in sleeps)      # full jitter under base * 2**attempt
+
+    def test_connection_reset_retried(self):
+        import requests
+        resp, calls, _ = self._run("GET", [requests.ConnectionError("reset"), _paged(200, [])])
+        assert resp.status_code == 200 and calls == 2
+
+    def test_gives_up_after_max_retries(self):
+        resp, calls, _ = self._run("GET", [_paged(502)] * 10)
+        assert resp.status_code == 502 and calls == 4
+
+    def test_retry_after_honored_on_secondary_limit(self):
+        limited = _rate_resp(status=403, retry_after=7)
+        limited.text = "You have exceeded a secondary rate limit"
+        resp, calls, sleeps = self._run("GET", [limited, _paged(200, [])])
+        assert resp.status_code == 200 and 7 in sleeps
+
+    def test_ambiguous_post_not_repeated(self):
+        resp, calls, _ = self._run("POST", [_paged(502), _paged(201)])
+        assert resp.status_code == 502 and calls == 1
+        resp, calls, _ = self._run("POST", [_paged(503), _paged(201)])
+        assert resp.status_code == 201 and calls == 2
+
+    def test_budget_caps_retry_waits(self):
+        limited = _rate_resp(status=429, retry_after=30)
+        resp, calls, sleeps = self._run("GET", [limited, _paged(200, [])], budget=10)
+        assert resp.status_code == 429 and calls == 1 and sleeps == []
+
+    def test_client_errors_not_retried(self):
+        resp, calls, _ = self._run("GET", [_paged(404), _paged(200, [])])
+        assert resp.status_code == 404 and calls == 1
+
+
+class TestTokenPool:
+    """Repos are routed to the covering credential with the most remaining budget."""
+
+    @pytest.fixture(autouse=True)
+    def _reset_pool(self):
+        yield
+        import fetch_pull_requests as fpr
+        fpr.load_token_pool("", pool=[], app_tokens={})
+
+    def _load(self, pool, app_tokens=None, default="tok-default"):
+        import fetch_pull_requests as fpr
+        fpr.load_token_pool(default, pool=pool, app_tokens=app_tokens or {})
+        return fpr
+
+    def _observe(self, fpr, token, remaining):
+        fpr._GOVERNOR.observe(f"{fpr._token_key(token)}/core",
+                              _rate_resp(remaining=remaining, reset=int(time.time()) + 3600))
+
+    def test_no_pool_keeps_default(self):
+        fpr = self._load([], default="")
+        assert fpr.token_for_repo("o/r", "fallback") == "fallback"
+
+    def test_routes_to_most_remaining_budget_and_sticks(self):
+        import fetch_pull_requests as fpr
+        with patch.object(fpr, "_GOVERNOR", fpr._RateGovernor(0.0)):
+            self._load(["tok-a"])
+            self._observe(fpr, "tok-default", 100)
+            self._observe(fpr, "tok-a", 4000)
+            assert fpr.token_for_repo("o/r1") == "tok-a"
+            self._observe(fpr, "tok-a", 50)
+            assert fpr.token_for_repo("o/r1") == "tok-a"        # fixed for the run
+            assert fpr.token_for_repo("o/r2") == "tok-default"
+
+    def test_unread_credentials_spread_across_repos(self):
+        import fetch_pull_requests as fpr
+        with patch.object(fpr, "_GOVERNOR", fpr._RateGovernor(0.0)):
+            self._load(["tok-a"])
+            assert {fpr.token_for_repo("o/r1"), fpr.token_for_repo("o/r2")} == {"tok-default", "tok-a"}
+
+    def test_repo_patterns_limit_scope(self):
+        import fetch_pull_requests as fpr
+        with patch.object(fpr, "_GOVERNOR", fpr._RateGovernor(0.0)):
+            self._load([{"token": "tok-acme", "repos": ["acme/*"]}])
+            self._observe(fpr, "tok-default", 10)
+            assert fpr.token_for_repo("acme/api") == "tok-acme"
+            assert fpr.token_for_repo("other/api") == "tok-default"
+
+    def test_cached_app_token_reused_until_near_expiry(self):
+        import fetch_pull_requests as fpr
+        app = {"app_id": 1, "installation_id": 42, "private_key": "k", "repos": ["acme/*"]}
+        fresh = (datetime.now(timezone.utc) + timedelta(minutes=30)).isoformat()
+        with patch.object(fpr, "_GOVERNOR", fpr._RateGovernor(0.0)), \
+                patch('fetch_pull_requests.gh_request') as mint:
+            self._load([app], app_tokens={"42": {"token": "ghs-cached", "expires_at": fresh}}, default="")
+            assert fpr.token_for_repo("acme/api") == "ghs-cached"
+            assert mint.call_count == 0
+            assert fpr._auth_key({"Authorization": "token ghs-cached"}) == "app42"
+
+    def test_expiring_app_token_is_reminted_and_persisted(self):
+        import fetch_pull_requests as fpr
+        app = {"app_id": 1, "installation_id": 42, "private_key": "k"}
+        soon = (datetime.now(timezone.utc) + timedelta(minutes=2)).isoformat()
+        minted = _paged(201, {"token": "ghs-new", "expires_at": "2099-01-01T00:00:00Z"})
+        jwt = Mock(encode=Mock(return_value="signed"))
+        with patch.object(fpr, "_GOVERNOR", fpr._RateGovernor(0.0)), \
+                patch.dict(sys.modules, {"jwt": jwt}), \
+                patch('fetch_pull_requests.gh_request', return_value=minted) as mint, \
+                patch('fetch_pull_requests.waveassist') as wa:
+            self._load([app], app_tokens={"42": {"token": "ghs-old", "expires_at": soon}}, default="")
+            assert fpr.token_for_repo("acme/api") == "ghs-new"
+            fpr.store_token_pool()
+        assert mint.call_args[0][1].endswith("/app/installations/42/access_tokens")
+        assert mint.call_args[1]["headers"]["Authorization"] == "Bearer signed"
+        wa.store_data.assert_called_once()
+        assert wa.store_data.call_args[0][1]["42"]["token"] == "ghs-new"
+
+    def test_failed_mint_falls_back(self):
+        import fetch_pull_requests as fpr
+        app = {"app_id": 1, "installation_id": 7, "private_key": "k"}
+        with patch.object(fpr, "_GOVERNOR", fpr._RateGovernor(0.0)), \
+                patch.dict(sys.modules, {"jwt": Mock(encode=Mock(return_value="signed"))}), \
+                patch('fetch_pull_requests.gh_request', return_value=_paged(401)):
+            self._load([app])
+            fpr._GOVERNOR.observe(f"{fpr._token_key('tok-default')}/core",
+                                  _rate_resp(remaining=10, reset=int(time.time()) + 3600))
+            assert fpr.token_for_repo("o/r") == "tok-default"
+
+    def test_mint_runs_outside_the_pool_lock(self):
+        import fetch_pull_requests as fpr
+        app = {"app_id": 1, "installation_id": 9, "private_key": "k", "repos": ["acme/*"]}
+        held = []
+
+        def mint(*a, **k):
+            held.append(fpr._POOL_LOCK.locked())
+            return _paged(201, {"token": "ghs-9", "expires_at": "2099-01-01T00:00:00Z"})
+        with patch.object(fpr, "_GOVERNOR", fpr._RateGovernor(0.0)), \
+                patch.dict(sys.modules, {"jwt": Mock(encode=Mock(return_value="signed"))}), \
+                patch('fetch_pull_requests.gh_request', side_effect=mint):
+            self._load([app], default="")
+            assert fpr.token_for_repo("acme/api") == "ghs-9"
+            assert fpr.token_for_repo("acme/web") == "ghs-9"
+        assert held == [False]                       # minted once, with other routing free to proceed
+
+
+class TestGitMirror:
+    """PR diffs from a local bare mirror, checked offline against a local "upstream" repository."""
+
+    def _pr(self, head):
+        return {"number": 1, "head": {"sha": head}, "base": {"ref": "main"}}
+
+    def test_sync_and_diff_match_files_api_records(self, git_upstream, tmp_path):
+        from fetch_pull_requests import GitMirror, sync_pr_mirror, mirror_pr_files
+        remote, shas = git_upstream
+        mirror = GitMirror(str(tmp_path / "mirrors"), "o/r", remote=remote)
+        assert sync_pr_mirror(mirror, [self._pr(shas["head"])])
+        files = {f["filename"]: f for f in mirror_pr_files(mirror, self._pr(shas["head"]))}
+        assert set(files) == {"a.py", "b.py"}                # main's later c.py is not part of the PR
+        assert files["a.py"]["status"] == "modified" and files["a.py"]["patch"].startswith("@@")
+        assert (files["a.py"]["additions"], files["a.py"]["deletions"]) == (1, 1)
+        assert files["b.py"]["status"] == "added" and files["b.py"]["patch"] == "@@ -0,0 +1 @@\n+print('b')"
+        assert mirror.cat_file(shas["head"], "b.py") == "print('b')\n"
+
+    def test_second_sync_fetches_only_base(self, git_upstream, tmp_path):
+        from fetch_pull_requests import GitMirror, sync_pr_mirror
+        remote, shas = git_upstream
+        mirror = GitMirror(str(tmp_path / "mirrors"), "o/r", remote=remote)
+        assert sync_pr_mirror(mirror, [self._pr(shas["head"])])
+        with patch.object(mirror, "fetch", return_value=True) as fetch:
+            sync_pr_mirror(mirror, [self._pr(shas["head"])])
+        assert fetch.call_args[0][0] == ["+refs/heads/main:refs/heads/main"]
+
+    def test_fetch_and_process_prs_uses_mirror(self, git_upstream, tmp_path, sample_recent_pr_data):
+        from fetch_pull_requests import GitMirror
+        remote, shas = git_upstream
+        pr = {**sample_recent_pr_data, "number": 1, "head": {"sha": shas["head"]}, "base": {"ref": "main"}}
+        mirror = GitMirror(str(tmp_path / "mirrors"), "o/r", remote=remote)
+        with patch('fetch_pull_requests.fetch_pr_files') as api:
+            prs, _ = fetch_and_process_prs({"id": "o/r"}, "tok", {}, open_prs=[pr], mirror=mirror)
+        assert api.call_count == 0
+        assert sorted(f["filename"] for f in prs[0]["files"]) == ["a.py", "b.py"]
+
+    def test_unreachable_remote_falls_back_to_api(self, tmp_path, sample_recent_pr_data, sample_pr_files):
+        from fetch_pull_requests import GitMirror
+        pr = {**sample_recent_pr_data, "base": {"ref": "main"}}
+        mirror = GitMirror(str(tmp_path / "mirrors"), "o/r", remote=str(tmp_path / "missing.git"))
+        with patch('fetch_pull_requests.fetch_pr_files', return_value=sample_pr_files) as api:
+            prs, _ = fetch_and_process_prs({"id": "o/r"}, "tok", {}, open_prs=[pr], mirror=mirror)
+        assert api.call_count == 1 and prs[0]["files"] == sample_pr_files
+
+    def test_token_stays_out_of_argv(self):
+        from fetch_pull_requests import GitMirror
+        mirror = GitMirror("/m", "o/r", token="ghs-secret")
+        assert not any("ghs-secret" in a for a in mirror._cmd("fetch"))
+        assert "Authorization: Basic" in mirror._env()["GIT_CONFIG_VALUE_0"]
+
+
+class TestPatchCache:
+    """Per-file patch records reused across reviews when the file's base and head blobs are unchanged."""
+
+    def _pr(self, head):
+        return {"number": 1, "head": {"sha": head}, "base": {"ref": "main"}}
+
+    def _mirror(self, git_upstream, tmp_path):
+        from fetch_pull_requests import GitMirror, sync_pr_mirror
+        remote, shas = git_upstream
+        mirror = GitMirror(str(tmp_path / "mirrors"), "o/r", remote=remote)
+        assert sync_pr_mirror(mirror, [self._pr(shas["head"])])
+        return mirror, shas
+
+    def test_cached_records_match_uncached_diff(self, git_upstream, tmp_path):
+        from fetch_pull_requests import PatchCache, mirror_pr_files
+        mirror, shas = self._mirror(git_upstream, tmp_path)
+        cache = PatchCache()
+        plain = mirror_pr_files(mirror, self._pr(shas["head"]))
+        assert mirror_pr_files(mirror, self._pr(shas["head"]), cache) == plain
+        assert (cache.hits, cache.misses) == (0, 2)
+        with patch.object(mirror, "diff_lines") as diff:
+            assert mirror_pr_files(mirror, self._pr(shas["head"]), cache) == plain
+        assert diff.call_count == 0 and cache.hits == 2
+
+    def test_only_missing_files_are_rediffed(self, git_upstream, tmp_path):
+        from fetch_pull_requests import PatchCache, mirror_pr_files
+        mirror, shas = self._mirror(git_upstream, tmp_path)
+        cache = PatchCache()
+        mirror_pr_files(mirror, self._pr(shas["head"]), cache)
+        cache.entries.pop(next(k for k in cache.entries if k.endswith(":b.py")))
+        real = mirror.diff_lines
+        with patch.object(mirror, "diff_lines", side_effect=real) as diff:
+            files = mirror_pr_files(mirror, self._pr(shas["head"]), cache)
+        assert diff.call_args[0][2] == ["b.py"]
+        assert [f["filename"] for f in files] == ["a.py", "b.py"]
+
+    def test_non_ascii_filenames_survive_the_cache(self, git_upstream, tmp_path):
+        import os, subprocess
+        from fetch_pull_requests import PatchCache, mirror_pr_files, sync_pr_mirror
+        mirror, shas = self._mirror(git_upstream, tmp_path)
+        work = tmp_path / "work"
+        env = dict(os.environ, GIT_AUTHOR_NAME="t", GIT_AUTHOR_EMAIL="t@example.com",
+                   GIT_COMMITTER_NAME="t", GIT_COMMITTER_EMAIL="t@example.com")
+        subprocess.run(["git", "-C", str(work), "checkout", "--quiet", "feature"], check=True, env=env)
+        (work / "café.py").write_text("x = 1\n")
+        for args in (["add", "-A"], ["commit", "--quiet", "-m", "accent"], ["push", "--quiet", git_upstream[0],
+                                                                          "HEAD:refs/pull/1/head", "--force"]):
+            subprocess.run(["git", "-C", str(work), *args], check=True, env=env, capture_output=True)
+        head = subprocess.run(["git", "-C", str(work), "rev-parse", "HEAD"], capture_output=True,
+                              check=True).stdout.decode().strip()
+        assert sync_pr_mirror(mirror, [self._pr(head)])
+        plain = [f["filename"] for f in mirror_pr_files(mirror, self._pr(head))]
+        cache = PatchCache()
+        assert plain == ["a.py", "b.py", "café.py"]
+        assert [f["filename"] for f in mirror_pr_files(mirror, self._pr(head), cache)] == plain
+        assert [f["filename"] for f in mirror_pr_files(mirror, self._pr(head), cache)] == plain
+        assert cache.hits == 3
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        from fetch_pull_requests import PatchCache
+        cache = PatchCache(max_bytes=200)
+        record = {"filename": "x", "patch": "p" * 60}
+        cache.put("k1", record)
+        cache.put("k2", record)
+        assert cache.get("k1") is not None                  # k1 is now the most recent
+        cache.put("k3", record)
+        assert set(cache.entries) == {"k1", "k3"} and cache.bytes <= 200
+
+    def test_save_and_load_round_trip(self, tmp_path):
+        from fetch_pull_requests import PatchCache
+        path = str(tmp_path / "patch_cache.json")
+        cache = PatchCache()
+        cache.put("k", {"filename": "x", "patch": "@@"})
+        cache.save(path)
+        restored = PatchCache()
+        restored.load(path)
+        assert restored.get("k") == {"filename": "x", "patch": "@@"} and not restored.dirty
+
+    def test_pr_budget_applies_to_cached_records(self, git_upstream, tmp_path):
+        from fetch_pull_requests import PatchCache, mirror_pr_files
+        mirror, shas = self._mirror(git_upstream, tmp_path)
+        cache = PatchCache()
+        mirror_pr_files(mirror, self._pr(shas["head"]), cache)
+        with patch('fetch_pull_requests.MAX_PR_PATCH_BYTES', 10):
+            files = mirror_pr_files(mirror, self._pr(shas["head"]), cache)
+        assert all(len(f["patch"].encode()) <= 10 for f in files) and files[0].get("truncated")
+
+    def test_heads_differing_past_the_budget_cut_differ_in_digest(self, git_upstream, tmp_path):
+        import subprocess
+        from fetch_pull_requests import PatchCache, mirror_pr_files, sync_pr_mirror
+        mirror, shas = self._mirror(git_upstream, tmp_path)
+        work = tmp_path / "work"
+        git = ["git", "-C", str(work), "-c", "user.name=t", "-c", "user.email=t@example.com"]
+        subprocess.run([*git, "checkout", "--quiet", "feature"], check=True)
+        (work / "b.py").write_text("print('c')\n")           # same line counts, change past the cut
+        subprocess.run([*git, "commit", "--quiet", "-am", "past the cut"], check=True)
+        subprocess.run([*git, "push", "--quiet", "--force", git_upstream[0], "feature:refs/pull/1/head"], check=True)
+        second = subprocess.run([*git, "rev-parse", "HEAD"], check=True, capture_output=True).stdout.decode().strip()
+        assert sync_pr_mirror(mirror, [self._pr(second)])
+        with patch('fetch_pull_requests.MAX_PR_PATCH_BYTES', 10):
+            before = mirror_pr_files(mirror, self._pr(shas["head"]), PatchCache())
+            after = mirror_pr_files(mirror, self._pr(second), PatchCache())
+        assert [f["patch"] for f in before] == [f["patch"] for f in after]
+        assert patch_digest(before) != patch_digest(after)
+
+
+class TestWebhookPending:
+    """Webhook-queued PRs are fetched alone between sweeps; quiet repos cost nothing."""
+
+    def _swept(self):
+        now = datetime.now(timezone.utc).isoformat()
+        return {"updated_at": "2024-01-01T00:00:00Z", "full_sweep_at": now}
+
+    def test_pending_prs_by_repo(self):
+        from fetch_pull_requests import pending_prs_by_repo
+        pending = {"o/r#1": {"repo": "o/r", "pr": {"number": 1}}, "o/s#2": {"repo": "o/s", "pr": {"number": 2}},
+                   "bad": {"repo": "o/r"}}
+        assert pending_prs_by_repo(pending) == {"o/r": [{"number": 1}], "o/s": [{"number": 2}]}
+
+    def test_only_touched_repos_run_between_sweeps(self):
+        calls = {}
+
+        def fake(repo, token, view, cache, open_prs=None, cursor=None, mirror=None, touched=None):
+            calls[repo["id"]] = touched
+            return [], False
+        cursors = {"o/a": self._swept(), "o/b": self._swept(), "o/c": {}}
+        with patch('fetch_pull_requests.fetch_and_process_prs', side_effect=fake):
+            fetch_repos_concurrently([{"id": "o/a"}, {"id": "o/b"}, {"id": "o/c"}], "tok", {}, cursors=cursors,
+                                     pending={"o/a": [{"number": 1}], "o/c": [{"number": 3}]}, webhooks=True)
+        assert calls == {"o/a": [{"number": 1}], "o/c": None}   # o/b is quiet; o/c is due a full sweep
+
+    def test_touched_prs_skip_cleanup_and_cursor(self, sample_recent_pr_data, sample_pr_files):
+        reviewed = {"o/r#99": {"status": "reviewed", "last_reviewed_sha": "x", "reviewed_at":
+                               datetime.now(timezone.utc).isoformat(), "last_review_text": "t"}}
+        cursor = self._swept()
+        before = dict(cursor)
+        with patch('fetch_pull_requests.fetch_pr_files', return_value=sample_pr_files), \
+                patch('fetch_pull_requests.list_open_prs') as listing:
+            prs, changed = fetch_and_process_prs({"id": "o/r"}, "tok", reviewed, cursor=cursor,
+                                                 touched=[sample_recent_pr_data])
+        assert listing.call_count == 0 and len(prs) == 1
+        assert "o/r#99" in reviewed and not changed and cursor == before
+
+    def test_drain_keeps_events_that_arrived_meanwhile(self):
+        import fetch_pull_requests as fpr
+        consumed = {"o/r#1": {"received_at": "t1"}, "o/r#2": {"received_at": "t1"}}
+        current = {"o/r#1": {"received_at": "t1"}, "o/r#2": {"received_at": "t2"}, "o/r#3": {"received_at": "t3"}}
+        with patch('fetch_pull_requests.waveassist') as wa:
+            wa.fetch_data.return_value = current
+            fpr.drain_pending_events(consumed)
+        assert wa.store_data.call_args[0][1] == {"o/r#2": {"received_at": "t2"}, "o/r#3": {"received_at": "t3"}}
+
+    def test_drain_keeps_failed_repos_events(self):
+        import fetch_pull_requests as fpr
+        events = {"o/ok#1": {"repo": "o/ok", "received_at": "t1"}, "o/bad#2": {"repo": "o/bad", "received_at": "t1"}}
+        with patch('fetch_pull_requests.waveassist') as wa:
+            wa.fetch_data.return_value = dict(events)
+            fpr.drain_pending_events(events, failed_repos={"o/bad"})
+        assert wa.store_data.call_args[0][1] == {"o/bad#2": events["o/bad#2"]}
+
+
+class TestAdaptivePolling:
+    """Quiet repos back off exponentially up to a cap; any change makes them hot again."""
+
+    def test_quiet_polls_back_off_to_cap(self):
+        from fetch_pull_requests import record_poll, POLL_BACKOFF_START_MINUTES, POLL_MAX_MINUTES
+        cursor, intervals = {}, []
+        for _ in range(8):
+            record_poll(cursor, changed=False)
+            intervals.append(cursor["poll_minutes"])
+        assert intervals[0] == POLL_BACKOFF_START_MINUTES and intervals[1] == 2 * POLL_BACKOFF_START_MINUTES
+        assert intervals[-1] == POLL_MAX_MINUTES and intervals == sorted(intervals)
+
+    def test_change_resets_and_stays_hot_briefly(self):
+        from fetch_pull_requests import record_poll, poll_due
+        cursor = {"poll_minutes": 60, "next_poll_at": "2999-01-01T00:00:00+00:00"}
+        assert not poll_due(cursor)
+        record_poll(cursor, changed=True)
+        assert cursor["poll_minutes"] == 0 and poll_due(cursor)
+        record_poll(cursor, changed=False)     # EWMA still above the hot threshold
+        assert cursor["poll_minutes"] == 0
+        record_poll(cursor, changed=False)
+        record_poll(cursor, changed=False)
+        assert cursor["poll_minutes"] > 0 and not poll_due(cursor)
+
+    def test_backed_off_repo_is_skipped(self):
+        calls = []
+
+        def fake(repo, token, view, cache, open_prs=None, cursor=None, mirror=None, touched=None):
+            calls.append(repo["id"])
+            return [], False
+        later = (datetime.now(timezone.utc) + timedelta(minutes=30)).isoformat()
+        cursors = {"o/dormant": {"updated_at": "t", "next_poll_at": later, "poll_minutes": 32},
+                   "o/hot": {"updated_at": "t", "activity": 0.5}}
+        with patch('fetch_pull_requests.fetch_and_process_prs', side_effect=fake):
+            fetch_repos_concurrently([{"id": "o/dormant"}, {"id": "o/hot"}], "tok", {}, cursors=cursors)
+        assert calls == ["o/hot"]
+        assert cursors["o/dormant"]["poll_minutes"] == 32            # untouched while skipped
+        assert cursors["o/hot"]["activity"] < 0.5                    # quiet poll decays the score
+
+    def test_probe_change_overrides_backoff(self):
+        calls = []
+
+        def fake(repo, token, view, cache, open_prs=None, cursor=None, mirror=None, touched=None):
+            calls.append(repo["id"])
+            return [], False
+        later = (datetime.now(timezone.utc) + timedelta(minutes=30)).isoformat()
+        cursors = {r: {"updated_at": "t", "next_poll_at": later, "poll_minutes": 32,
+                       "full_sweep_at": datetime.now(timezone.utc).isoformat()} for r in ("o/a", "o/b")}
+        with patch('fetch_pull_requests.fetch_and_process_prs', side_effect=fake):
+            fetch_repos_concurrently([{"id": "o/a"}, {"id": "o/b"}], "tok", {}, cursors=cursors,
+                                     probe_changed={"o/b"})
+            assert calls == ["o/b"]
+            calls.clear()
+            fetch_repos_concurrently([{"id": "o/a"}, {"id": "o/b"}], "tok", {}, cursors=cursors,
+                                     webhooks=True, probe_changed={"o/a"})
+        assert calls == ["o/a"]        # no webhook event for o/a, but its heads moved: list it
+
+    def test_failed_pr_is_a_run_gap(self, sample_recent_pr_data):
+        import fetch_pull_requests
+        with patch.dict(fetch_pull_requests.RUN_GAPS, clear=True), \
+                patch('fetch_pull_requests.fetch_pr_files', side_effect=RuntimeError("boom")):
+            fetch_and_process_prs({"id": "o/r"}, "tok", {}, open_prs=[sample_recent_pr_data])
+            assert "boom" in fetch_pull_requests.RUN_GAPS["o/r"]
+
+    @patch('fetch_pull_requests.requests.Session.get')
+    def test_failed_listing_does_not_back_off(self, mock_get):
+        import fetch_pull_requests
+        mock_get.return_value = Mock(status_code=502, headers={}, links={}, text="bad gateway")
+        cursor = {"updated_at": "2026-01-01T00:00:00Z", "full_sweep_at": datetime.now(timezone.utc).isoformat()}
+        cursors = {"o/r": dict(cursor)}
+        with patch.dict(fetch_pull_requests.RUN_GAPS, clear=True):
+            fetch_repos_concurrently([{"id": "o/r"}], "tok", {"o/r#1": {"status": "reviewed"}},
+                                     load_shard=lambda r: {"o/r#1": {"status": "reviewed"}}, cursors=cursors)
+            assert "o/r" in fetch_pull_requests.RUN_GAPS
+        from fetch_pull_requests import poll_due
+        assert cursors["o/r"] == cursor and poll_due(cursors["o/r"])
+
+    def test_failed_file_fetch_keeps_cursor(self):
+        import fetch_pull_requests
+        cursor = {"updated_at": "2026-01-01T00:00:00Z", "full_sweep_at": "2026-01-01T00:00:00Z"}
+        cursors = {"o/r": dict(cursor)}
+        with patch.dict(fetch_pull_requests.RUN_GAPS, clear=True), \
+                patch('fetch_pull_requests.requests.Session.get') as mock_get, \
+                patch('fetch_pull_requests.fetch_pr_files', return_value=[]):
+            mock_get.return_value = _paged(200, [_updated_pr(1, "2026-01-03T00:00:00Z")])
+            prs, _ = fetch_repos_concurrently([{"id": "o/r"}], "tok", {"o/r#9": {"status": "reviewed"}},
+                                              load_shard=lambda r: {"o/r#9": {"status": "reviewed"}},
+                                              cursors=cursors)
+            assert fetch_pull_requests.RUN_GAPS == {"o/r": "no files for PR #1"}
+        assert prs == [] and cursors["o/r"] == cursor      # the next poll still sees PR #1
@@ -16,6 +16,7 @@ from generate_review import (
     Finding,
     ReviewResult,
     build_diff_lines,
+    partial_paths,
     _sanitize_findings,
     finding_sig,
     apply_gate,
@@ -23,6 +24,11 @@ from generate_review import (
     _format_brain_profile,
     brain_auth_files,
     brain_secret_locations,
+    concurrency_limit,
+    review_cache_key,
+    prune_review_cache,
+    review_pr,
+    review_prompt_prefix,
 )
 
 
@@ -41,6 +47,13 @@ class TestFormatChangedFiles:
         assert len(result) <= 1300
         assert "truncated" in result.lower()
 
+    def test_marks_ingestion_truncated_files(self):
+        files = [{"filename": "big.py", "patch": "+a", "status": "modified", "truncated": True},
+                 {"filename": "rest.py", "patch": "", "status": "modified", "truncated": True}]
+        result = format_changed_files(files)
+        assert "`big.py`  [partial diff]\n" in result
+        assert "Diff omitted" in result
+
     def test_empty_list(self):
         assert format_changed_files([], max_chars=10000) == "No files changed."
 
@@ -196,6 +209,13 @@ class TestApplyGate:
         kept, _, _ = apply_gate([_F(line=99)], self.DL)
         assert kept == []
 
+    def test_unknown_line_in_partial_file_is_demoted(self):
+        kept, _, _ = apply_gate([_F(line=99)], self.DL, partial={"a.py"})
+        assert len(kept) == 1 and kept[0]["line"] is None
+
+    def test_partial_paths(self):
+        assert partial_paths([{"filename": "a.py", "truncated": True}, {"filename": "b.py"}]) == {"a.py"}
+
     def test_keeps_unanchored_summary_only(self):
         kept, _, _ = apply_gate([_F(line=None)], self.DL)
         assert len(kept) == 1
@@ -277,3 +297,148 @@ class TestBrainAdapters:
         assert "repo_profile" in h
         assert _format_brain_profile({}) == ""
         assert _format_brain_profile(None) == ""
+
+
+class TestPrJobDriver:
+    """The driver streams pr_job:* keys from the pr_jobs manifest, one PR at a time."""
+
+    def test_reviews_pending_jobs_and_skips_generated(self, monkeypatch):
+        import runpy, waveassist
+        pending = {"id": "o/r", "pr_number": 1, "current_sha": "a", "review_type": "full",
+                   "files": [{"filename": "x.py", "patch": "@@ -1 +1 @@\n-a\n+b"}]}
+        manifest = [{"key": "pr_job:o/r#1@a", "comment_generated": False, "comment_posted": False},
+                    {"key": "pr_job:o/r#2@b", "comment_generated": True, "comment_posted": False}]
+        fetch_map = {"pr_jobs": manifest, "pr_job:o/r#1@a": pending}
+        stored, fetched = {}, []
+
+        def fake_fetch(key=None, default=None, **k):
+            fetched.append(key)
+            return fetch_map.get(key, default)
+        result = Mock()
+        result.model_dump.return_value = {"summary": ["ok"], "findings": []}
+        monkeypatch.setattr(waveassist, "fetch_data", fake_fetch)
+        monkeypatch.setattr(waveassist, "store_data", lambda key, value, **k: stored.__setitem__(key, value))
+        monkeypatch.setattr(waveassist, "call_llm", lambda **k: result)
+        runpy.run_path("generate_review.py", run_name="__main__")
+        assert "pr_job:o/r#2@b" not in fetched and "pull_requests" not in stored
+        assert stored["pr_job:o/r#1@a"]["comment_generated"] is True
+        assert stored["pr_job:o/r#1@a"]["review_dict"]["verdict"] == "looks_good"
+        assert [j["comment_generated"] for j in stored["pr_jobs"]] == [True, True]
+
+    def test_reviews_run_concurrently_capped_per_provider_and_stored_by_workers(self, monkeypatch):
+        import runpy, threading, waveassist
+        jobs = {f"pr_job:o/r#{n}@a": {"id": "o/r", "pr_number": n, "current_sha": "a", "review_type": "full",
+                                       "files": [{"filename": "x.py", "patch": f"@@ -1 +1 @@\n-a\n+b{n}"}]}
+                for n in range(1, 7)}
+        manifest = [{"key": key, "comment_generated": False, "comment_posted": False} for key in jobs]
+        fetch_map = {"pr_jobs": manifest, "review_concurrency": {"anthropic": 2}, **jobs}
+        stored, lock, active = [], threading.Lock(), {"now": 0, "peak": 0}
+        overlap = threading.Event()
+
+        def fake_llm(**k):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+                if active["now"] > 1:
+                    overlap.set()
+            overlap.wait(0.5)   # hold the slot until a second call is in flight (time.sleep is stubbed)
+            with lock:
+                active["now"] -= 1
+            result = Mock()
+            result.model_dump.return_value = {"summary": ["ok"], "findings": []}
+            return result
+        monkeypatch.setattr(waveassist, "fetch_data", lambda key=None, default=None, **k: fetch_map.get(key, default))
+        monkeypatch.setattr(waveassist, "store_data", lambda key, value, **k: stored.append((key, value)))
+        monkeypatch.setattr(waveassist, "call_llm", fake_llm)
+        runpy.run_path("generate_review.py", run_name="__main__")
+        assert active["peak"] == 2
+        keys = [key for key, _ in stored if key.startswith("pr_job")]
+        assert sorted(keys[:-1]) == sorted(jobs) and keys[-1] == "pr_jobs"   # workers wrote their own jobs
+        final_manifest = dict(stored)["pr_jobs"]
+        assert [job["key"] for job in final_manifest] == list(jobs)
+        assert all(job["comment_generated"] for job in final_manifest)
+
+
+class TestConcurrencyLimit:
+    def test_model_then_provider_then_default(self):
+        limits = {"anthropic/claude-sonnet-4.6": 1, "anthropic": 3, "default": 5}
+        assert concurrency_limit("anthropic/claude-sonnet-4.6", limits) == 1
+        assert concurrency_limit("anthropic/other", limits) == 3
+        assert concurrency_limit("openai/gpt", limits) == 5
+
+    def test_int_applies_everywhere_and_bad_values_fall_back(self):
+        assert concurrency_limit("openai/gpt", 2) == 2
+        assert concurrency_limit("openai/gpt", {"openai": "x"}) == 4
+        assert concurrency_limit("openai/gpt", None) == 4
+
+
+class TestReviewCache:
+    PR = {"id": "o/r", "pr_number": 1, "review_type": "full", "title": "t", "body": "b",
+          "files": [{"filename": "x.py", "patch": "@@ -1 +1 @@\n-a\n+b"},
+                    {"filename": "y.py", "patch": "@@ -1 +1 @@\n-c\n+d"}]}
+
+    def test_key_ignores_file_order_and_line_endings(self):
+        shuffled = {**self.PR, "files": [{"filename": "y.py", "patch": "@@ -1 +1 @@\r\n-c\r\n+d\n"},
+                                         self.PR["files"][0]]}
+        assert review_cache_key(shuffled, "m", "") == review_cache_key(self.PR, "m", "")
+
+    def test_key_changes_with_model_brain_and_prompt_version(self):
+        base = review_cache_key(self.PR, "m", "")
+        assert review_cache_key(self.PR, "other", "") != base
+        assert review_cache_key({**self.PR, "brain_profile": {"architecture_summary": "x"}}, "m", "") != base
+        with patch('generate_review.PROMPT_VERSION', "next"):
+            assert review_cache_key(self.PR, "m", "") != base
+
+    def test_hit_skips_llm_and_reruns_gate(self, monkeypatch):
+        import waveassist
+        finding = {"path": "x.py", "line": 1, "severity": "medium", "confidence": "high",
+                   "category": "bug", "body": "edge case"}
+        cache = {}
+        llm = Mock(return_value=ReviewResult(summary=["ok"], findings=[finding]))
+        monkeypatch.setattr(waveassist, "call_llm", llm)
+        first = review_pr(dict(self.PR), "m", "", "medium", cache=cache)
+        again = review_pr(dict(self.PR), "m", "", "medium", cache=cache)
+        stricter = review_pr(dict(self.PR), "m", "", "high", cache=cache)   # severity is a gate input, not a key part
+        assert llm.call_count == 1 and len(cache) == 1
+        assert again["review_dict"] == first["review_dict"] and len(first["review_dict"]["findings"]) == 1
+        assert stricter["comment_generated"] and stricter["review_dict"]["findings"] == []
+
+    def test_prune_expires_by_ttl_then_evicts_least_recently_used(self):
+        from datetime import datetime, timezone, timedelta
+        now = datetime(2026, 10, 1, tzinfo=timezone.utc)
+        at = lambda days: (now - timedelta(days=days)).isoformat()
+        cache = {"old": {"at": at(30), "used_at": at(0)},
+                 "a": {"at": at(1), "used_at": at(1)},
+                 "b": {"at": at(1), "used_at": at(0)},
+                 "c": {"at": at(2), "used_at": at(2)},
+                 "bad": "x"}
+        assert prune_review_cache(cache, now=now, max_entries=2) == 3
+        assert set(cache) == {"a", "b"}
+
+
+class TestPromptLayout:
+    BRAIN = {"architecture_summary": "A Flask API.", "conventions": ["use snake_case"]}
+
+    def test_full_and_update_share_the_repo_prefix(self):
+        one = {"pr_number": 1, "title": "t1", "body": "b1", "files": [], "brain_profile": self.BRAIN}
+        two = {"pr_number": 2, "title": "t2", "body": "b2", "files": [], "brain_profile": self.BRAIN,
+               "previous_sha": "abc", "current_sha": "def"}
+        prefix = review_prompt_prefix(one, "ctx")
+        assert get_full_review_prompt(one, additional_context="ctx").startswith(prefix)
+        assert get_update_review_prompt(two, "prior", additional_context="ctx").startswith(prefix)
+        assert "t1" not in prefix and "A Flask API." in prefix and "ctx" in prefix
+
+    def test_rules_then_brain_then_context_then_pr(self):
+        pr = {"pr_number": 7, "title": "Title", "body": "b", "files": [], "brain_profile": self.BRAIN}
+        prompt = get_full_review_prompt(pr, additional_context="Custom guidance")
+        order = [prompt.index(s) for s in ("senior code reviewer", "repo_profile", "Custom guidance", "<number>7")]
+        assert order == sorted(order)
+
+    def test_repeated_prefix_is_counted(self):
+        from generate_review import note_prompt_prefix, PREFIX_STATS
+        before = dict(PREFIX_STATS)
+        note_prompt_prefix("test/model", "prefix-under-test" * 10)
+        note_prompt_prefix("test/model", "prefix-under-test" * 10)
+        assert PREFIX_STATS["calls"] - before["calls"] == 2
+        assert PREFIX_STATS["repeat_calls"] - before["repeat_calls"] == 1
+        assert PREFIX_STATS["repeat_tokens"] > before["repeat_tokens"]
@@ -167,6 +167,11 @@ class TestUpdateReviewedPrs:
         assert e["findings"] == {"s": {}}
         assert e["keepme"] == "yes"       # merge, not replace
 
+    def test_records_patch_digest(self):
+        reviewed = {}
+        update_reviewed_prs(reviewed, "o/r", 1, "sha", patch_digest="abc")
+        assert reviewed["o/r#1"]["patch_digest"] == "abc"
+
 
 def _resp(status, json_data=None):
     r = Mock()
@@ -177,7 +182,7 @@ def _resp(status, json_data=None):
 
 
 class TestRestSequences:
-    @patch('post_comment.requests.post')
+    @patch('post_comment.requests.Session.post')
     def test_create_pr_review_success(self, mock_post):
         mock_post.return_value = _resp(200, {"id": 7})
         out = create_pr_review("o/r", 1, "sha", "", [{"path": "a.py", "line": 5, "body": "x"}], "tok")
@@ -185,30 +190,66 @@ class TestRestSequences:
         payload = mock_post.call_args.kwargs["json"]
         assert payload["event"] == "COMMENT" and payload["commit_id"] == "sha"
 
-    @patch('post_comment.requests.post')
+    @patch('post_comment.requests.Session.post')
     def test_create_pr_review_failure(self, mock_post):
         mock_post.return_value = _resp(422)
         assert create_pr_review("o/r", 1, "sha", "", [], "tok") is None
 
-    @patch('post_comment.requests.post')
+    @patch('post_comment.requests.Session.post')
     def test_create_summary_has_marker(self, mock_post):
         mock_post.return_value = _resp(201, {"id": 9, "html_url": "u"})
         out = create_summary_comment("o/r", 1, "the summary", "tok")
         assert out["id"] == 9
         assert SUMMARY_MARKER in mock_post.call_args.kwargs["json"]["body"]
 
-    @patch('post_comment.requests.patch')
+    @patch('post_comment.requests.Session.get')
+    @patch('post_comment.requests.Session.post')
+    def test_summary_post_5xx_is_not_duplicated(self, mock_post, mock_get):
+        # The 502 came after GitHub created the comment: adopt it via the marker, never POST twice.
+        mock_post.return_value = _resp(502)
+        mock_get.return_value = _resp(200, [{"id": 4, "body": SUMMARY_MARKER + "\nold"}])
+        with patch('post_comment.requests.Session.patch', return_value=_resp(200, {"id": 4})) as mock_patch:
+            assert create_summary_comment("o/r", 1, "s", "tok") == {"id": 4}
+        assert mock_post.call_count == 1 and mock_patch.call_count == 1
+
+    @patch('post_comment.requests.Session.get')
+    @patch('post_comment.requests.Session.post')
+    def test_summary_post_5xx_reposts_when_absent(self, mock_post, mock_get):
+        mock_post.side_effect = [_resp(502), _resp(201, {"id": 5})]
+        mock_get.return_value = _resp(200, [])
+        assert create_summary_comment("o/r", 1, "s", "tok") == {"id": 5}
+
+    @patch('post_comment.requests.Session.get')
+    @patch('post_comment.requests.Session.post')
+    def test_summary_post_never_pauses_without_a_post_to_follow(self, mock_post, mock_get):
+        from post_comment import GITHUB_MAX_RETRIES
+        mock_post.return_value = _resp(502)
+        mock_get.return_value = _resp(200, [])
+        with patch('post_comment.retry_pause', return_value=True) as pause:
+            assert create_summary_comment("o/r", 1, "s", "tok") is None
+        assert mock_post.call_count == GITHUB_MAX_RETRIES + 1
+        assert pause.call_count == mock_post.call_count - 1       # a pause only before another POST
+
+    @patch('post_comment.requests.Session.get')
+    @patch('post_comment.requests.Session.post')
+    def test_summary_post_503_is_left_to_gh_request(self, mock_post, mock_get):
+        from post_comment import GITHUB_MAX_RETRIES
+        mock_post.return_value = _resp(503)
+        assert create_summary_comment("o/r", 1, "s", "tok") is None
+        assert mock_post.call_count == GITHUB_MAX_RETRIES + 1 and mock_get.call_count == 0   # not multiplied
+
+    @patch('post_comment.requests.Session.patch')
     def test_edit_summary(self, mock_patch):
         mock_patch.return_value = _resp(200, {"id": 9})
         assert edit_summary_comment("o/r", 9, "updated", "tok") == {"id": 9}
 
-    @patch('post_comment.requests.get')
+    @patch('post_comment.requests.Session.get')
     def test_find_summary_by_marker(self, mock_get):
         mock_get.return_value = _resp(200, [{"id": 1, "body": "hi"},
                                             {"id": 2, "body": SUMMARY_MARKER + "\nsummary"}])
         assert find_summary_comment_id("o/r", 1, "tok") == 2
 
-    @patch('post_comment.requests.get')
+    @patch('post_comment.requests.Session.get')
     def test_find_summary_none(self, mock_get):
         mock_get.return_value = _resp(200, [{"id": 1, "body": "no marker"}])
         assert find_summary_comment_id("o/r", 1, "tok") is None
@@ -264,3 +305,167 @@ class TestReleaseRunLock:
         with patch.object(post_comment, "waveassist", wa):
             release_run_lock()
         wa.store_data.assert_called_once_with("run_lock", {}, data_type="json")
+
+
+class TestShardedReviewedPrs:
+    """The driver loads and rewrites only the reviewed_prs:{owner/repo} shards of repos it posted to."""
+
+    def test_writes_only_touched_shard(self, monkeypatch):
+        import runpy, waveassist, requests
+        pr = {"id": "o/r", "pr_number": 1, "current_sha": "abcdef1", "comment_generated": True,
+              "comment_posted": False, "review_dict": {"summary": ["x"], "findings": []}}
+        job = {"key": "pr_job:o/r#1@abcdef1", "id": "o/r", "pr_number": 1, "current_sha": "abcdef1",
+               "comment_generated": True, "comment_posted": False}
+        fetch_map = {"pr_jobs": [job], job["key"]: pr, "github_access_token": "tok", "skip_run": True,
+                     "reviewed_prs:o/r": {"o/r#1": {"status": "reviewed", "summary_comment_id": 5, "keep": 1}}}
+        stored, fetched = {}, []
+
+        def fake_fetch(key=None, default=None, **k):
+            fetched.append(key)
+            return fetch_map.get(key, default)
+        monkeypatch.setattr(waveassist, "fetch_data", fake_fetch)
+        monkeypatch.setattr(waveassist, "store_data", lambda key, value, **k: stored.__setitem__(key, value))
+        monkeypatch.setattr(waveassist, "is_test_run", lambda: False)
+        monkeypatch.setattr(requests.Session, "patch", lambda *a, **k: _resp(200, {"id": 5, "html_url": "u"}))
+        runpy.run_path("post_comment.py", run_name="__main__")
+        assert "reviewed_prs" not in fetched and "reviewed_prs" not in stored   # legacy blob untouched
+        shard = stored["reviewed_prs:o/r"]
+        assert shard["o/r#1"]["last_reviewed_sha"] == "abcdef1" and shard["o/r#1"]["keep"] == 1
+        assert stored[job["key"]] == {} and stored["pr_jobs"] == []   # payload released, manifest cleared
+
+
+class TestWriteThrottle:
+    """POST/PATCH calls are spaced under GitHub's content-creation limits."""
+
+    def _throttle(self, writes=(), blocked_until=0.0):
+        t = post_comment._WriteThrottle()
+        t.writes, t.blocked_until = list(writes), blocked_until
+        return t
+
+    def test_writes_at_least_a_second_apart(self):
+        assert self._throttle().delay(now=1000) == 0
+        assert self._throttle([999.6]).delay(now=1000) == pytest.approx(0.6)
+
+    def test_per_minute_window(self):
+        t = self._throttle([950.0 + i * 0.25 for i in range(post_comment.WRITES_PER_MINUTE)])
+        assert t.delay(now=1000) == pytest.approx(10.0)   # the oldest write leaves the window at 1010
+
+    def test_per_hour_window(self):
+        t = self._throttle([100.0 + i for i in range(post_comment.WRITES_PER_HOUR)])
+        assert t.delay(now=1000) == pytest.approx(2700)
+
+    def test_secondary_limit_blocks_writes(self):
+        t = self._throttle()
+        limited = _resp(403)
+        limited.headers = {}
+        limited.text = "You have exceeded a secondary rate limit"
+        t.observe(limited, now=1000)
+        assert t.limited == 1 and t.delay(now=1000) == post_comment.WRITE_BACKOFF_DEFAULT
+        t.observe(_resp(422), now=1000)
+        assert t.limited == 1
+
+    def test_state_round_trip_drops_old_writes(self):
+        t = self._throttle([10.0, 3900.0], blocked_until=4000.0)
+        other = post_comment._WriteThrottle()
+        other.load(t.state(), now=4000)
+        assert other.writes == [3900.0] and other.blocked_until == 4000.0
+
+    @patch('post_comment.requests.Session.patch')
+    def test_gh_write_waits_for_slot(self, mock_patch):
+        mock_patch.return_value = _resp(200, {"id": 9})
+        sleeps = []
+        with patch.object(post_comment, "_WRITES", self._throttle()), \
+                patch('post_comment.time.sleep', side_effect=sleeps.append):
+            edit_summary_comment("o/r", 9, "a", "tok")
+            edit_summary_comment("o/r", 9, "b", "tok")
+        assert mock_patch.call_count == 2 and len(sleeps) == 1 and 0 < sleeps[0] <= 1.0
+
+
+class TestPostQueue:
+    """Reviews the throttle can't fit this run are queued and posted first on the next one."""
+
+    def _job(self, n, sha="abcdef1"):
+        key = f"pr_job:o/r#{n}@{sha}"
+        pr = {"id": "o/r", "pr_number": n, "current_sha": sha, "comment_generated": True,
+              "comment_posted": False, "review_dict": {"summary": ["x"], "findings": []}}
+        return {"key": key, "id": "o/r", "pr_number": n, "current_sha": sha,
+                "comment_generated": True, "comment_posted": False}, pr
+
+    def _run(self, monkeypatch, fetch_map):
+        import runpy, waveassist, requests
+        stored, patched = {}, []
+        fetch_map = {"github_access_token": "tok", "skip_run": False,
+                     "reviewed_prs:o/r": {f"o/r#{n}": {"summary_comment_id": n} for n in (1, 2)}, **fetch_map}
+        monkeypatch.setattr(waveassist, "fetch_data", lambda key=None, default=None, **k: fetch_map.get(key, default))
+        monkeypatch.setattr(waveassist, "store_data", lambda key, value, **k: stored.__setitem__(key, value))
+        monkeypatch.setattr(waveassist, "is_test_run", lambda: False)
+        monkeypatch.setattr(requests.Session, "patch",
+                            lambda self, url, **k: patched.append(url) or _resp(200, {"id": 1, "html_url": "u"}))
+        runpy.run_path("post_comment.py", run_name="__main__")
+        return stored, patched
+
+    def test_blocked_writes_are_queued(self, monkeypatch):
+        import time
+        (j1, p1), (j2, p2) = self._job(1), self._job(2)
+        stored, patched = self._run(monkeypatch, {
+            "pr_jobs": [j1, j2], j1["key"]: p1, j2["key"]: p2,
+            "github_write_state": {"writes": [], "blocked_until": time.time() + 600}})
+        assert patched == []
+        assert [j["key"] for j in stored["post_queue"]] == [j1["key"], j2["key"]]
+        assert stored["pr_jobs"] == [] and j1["key"] not in stored   # generated review kept
+
+    def test_queue_posts_first_and_drains(self, monkeypatch):
+        (j1, p1), (j2, p2) = self._job(1), self._job(2)
+        stored, patched = self._run(monkeypatch, {"post_queue": [j1], "pr_jobs": [j2], j1["key"]: p1, j2["key"]: p2})
+        assert patched == ["https://api.github.com/repos/o/r/issues/comments/1",
+                           "https://api.github.com/repos/o/r/issues/comments/2"]
+        assert stored["post_queue"] == [] and stored[j1["key"]] == {}
+        assert "github_write_state" in stored
+
+    def test_unposted_jobs_are_dropped_with_the_manifest(self, monkeypatch):
+        (j1, p1), (j2, p2) = self._job(1), self._job(2)
+        j2["comment_generated"] = False                   # generation failed
+        stored, _ = self._run(monkeypatch, {"pr_jobs": [j1, j2], j1["key"]: p1, j2["key"]: p2})
+        assert stored["pr_jobs"] == [] and stored[j1["key"]] == {} and stored[j2["key"]] == {}
+        assert stored["run_complete"] is False
+
+        stored, patched = self._run(monkeypatch, {"pr_jobs": [j2], j2["key"]: p2})   # nothing to post
+        assert patched == [] and stored["pr_jobs"] == [] and stored[j2["key"]] == {}
+
+    def test_newer_head_supersedes_queued_review(self, monkeypatch):
+        (old, p_old), (new, p_new) = self._job(1, "aaaaaaa"), self._job(1, "bbbbbbb")
+        stored, patched = self._run(monkeypatch, {"post_queue": [old], "pr_jobs": [new],
+                                                  old["key"]: p_old, new["key"]: p_new})
+        assert len(patched) == 1 and stored[old["key"]] == {}
+        assert stored["reviewed_prs:o/r"]["o/r#1"]["last_reviewed_sha"] == "bbbbbbb"
+
+
+class TestCommitNoopProbe:
+    def _run(self, run_data, stored):
+        from post_comment import commit_noop_probe
+
+        def fake_fetch(key, default=None, run_based=False, **k):
+            return (run_data if run_based else {}).get(key, default)
+        with patch.object(post_comment.waveassist, "fetch_data", side_effect=fake_fetch), \
+                patch.object(post_comment.waveassist, "store_data",
+                             side_effect=lambda key, value, **k: stored.__setitem__(key, value)):
+            commit_noop_probe()
+
+    def test_completed_run_commits_digest(self):
+        stored = {}
+        self._run({"skip_run": False, "probe_digest": "d1", "run_complete": True,
+                   "probe_repos": {"o/r": "x"}}, stored)
+        assert stored["noop_probe"]["digest"] == "d1" and stored["noop_probe"]["at"]
+        assert stored["noop_probe"]["repos"] == {"o/r": "x"}
+
+    def test_incomplete_run_leaves_probe_alone(self):
+        # A run that left repos or PRs unprocessed must not let later cycles skip themselves.
+        for run_data in ({"probe_digest": "d1"}, {"probe_digest": "d1", "run_complete": False}):
+            stored = {}
+            self._run(run_data, stored)
+            assert stored == {}
+
+    def test_skipped_cycle_leaves_probe_alone(self):
+        stored = {}
+        self._run({"skip_run": True, "probe_digest": "d1"}, stored)
+        assert stored == {}
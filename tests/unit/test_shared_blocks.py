@@ -0,0 +1,33 @@
+"""
+The GitHub client, credential pool and git mirror are copied into each node that needs them
+(nodes never import siblings). These tests fail as soon as one copy drifts from the others.
+"""
+import os
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+HEADER = "# ---------------------------------------------------------------- "
+
+SHARED = {
+    "GitHub HTTP client": ["fetch_pull_requests.py", "study_repos.py", "post_comment.py",
+                           "check_credits_and_init.py"],
+    "GitHub credential pool": ["fetch_pull_requests.py", "study_repos.py"],
+    "local git mirror": ["fetch_pull_requests.py", "study_repos.py"],
+}
+
+
+def section(filename, title):
+    """The text from `title`'s section header up to the next section header."""
+    with open(os.path.join(ROOT, filename), encoding="utf-8") as fh:
+        text = fh.read()
+    start = text.index(HEADER + title + "\n")
+    end = text.find(HEADER, start + len(HEADER))
+    return text[start:end if end != -1 else len(text)]
+
+
+@pytest.mark.parametrize("title", sorted(SHARED))
+def test_copies_are_identical(title):
+    first, *others = SHARED[title]
+    expected = section(first, title)
+    for filename in others:
+        assert section(filename, title) == expected, f"{filename}: '{title}' differs from {first}"
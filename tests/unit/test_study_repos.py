@@ -32,7 +32,7 @@ def _resp(status=200, json_data=None, links=None):
 
 
 class TestBranchSelection:
-    @patch('study_repos.requests.get')
+    @patch('study_repos.requests.Session.get')
     def test_override_wins(self, mock_get):
         mock_get.return_value = _resp(200, [
             {"name": "main", "commit": {"sha": "s1"}},
@@ -43,7 +43,7 @@ class TestBranchSelection:
         assert c["source"] == "override"
         assert c["sha"] == "s2"
 
-    @patch('study_repos.requests.get')
+    @patch('study_repos.requests.Session.get')
     @patch('study_repos.get_default_branch')
     @patch('study_repos.branch_tip_date')
     def test_defaults_to_default(self, mock_tip, mock_default, mock_get):
@@ -54,7 +54,7 @@ class TestBranchSelection:
         assert c["source"] == "default"
         assert c["branch"] == "main"
 
-    @patch('study_repos.requests.get')
+    @patch('study_repos.requests.Session.get')
     def test_list_branches_paginates(self, mock_get):
         p1 = _resp(200,
                    [{"name": f"b{i}", "commit": {"sha": f"s{i}"}} for i in range(100)],
@@ -78,7 +78,7 @@ class TestSkipRunNoOp:
         monkeypatch.setattr(waveassist, "store_data",
                             lambda key, value, **k: stored.__setitem__(key, value))
         import requests
-        monkeypatch.setattr(requests, "get",
+        monkeypatch.setattr(requests.Session, "get",
                             lambda *a, **k: (_ for _ in ()).throw(AssertionError("no GitHub call on skip")))
         runpy.run_path("study_repos.py", run_name="__main__")
         assert "repo_groups" not in stored
@@ -131,7 +131,7 @@ class TestKeyFilePicker:
 
 
 class TestTreeTruncation:
-    @patch('study_repos.requests.get')
+    @patch('study_repos.requests.Session.get')
     def test_truncated_flag_returned(self, mock_get):
         mock_get.return_value = _resp(200, {"tree": [{"type": "blob", "path": "a.py"}], "truncated": True})
         paths, truncated = get_branch_tree("o/r", "main", {})
@@ -139,6 +139,29 @@ class TestTreeTruncation:
         assert "a.py" in paths
 
 
+class TestGitMirrorSource:
+    @patch('study_repos.requests.Session.get')
+    def test_tree_and_contents_from_mirror(self, mock_get, git_upstream, tmp_path):
+        from study_repos import GitMirror, get_file_content
+        remote, _ = git_upstream
+        mirror = GitMirror(str(tmp_path / "mirrors"), "o/r", remote=remote)
+        assert mirror.fetch(["+refs/heads/main:refs/heads/main"])
+        paths, truncated = get_branch_tree("o/r", "main", {}, mirror=mirror)
+        assert sorted(paths) == ["README.md", "a.py", "c.py"] and truncated is False
+        assert get_file_content("o/r", "README.md", "main", {}, mirror=mirror) == "# demo\n"
+        assert mock_get.call_count == 0
+
+    @patch('study_repos.requests.Session.get')
+    def test_missing_file_falls_back_to_api(self, mock_get, git_upstream, tmp_path):
+        from study_repos import GitMirror, get_file_content
+        remote, _ = git_upstream
+        mirror = GitMirror(str(tmp_path / "mirrors"), "o/r", remote=remote)
+        mirror.fetch(["+refs/heads/main:refs/heads/main"])
+        mock_get.return_value = _resp(404)
+        assert get_file_content("o/r", "nope.py", "main", {}, mirror=mirror) is None
+        assert mock_get.call_count == 1
+
+
 class TestSanitizer:
     def test_none_lists_coerced(self):
         p = _sanitize_profile({"schema_version": "repo_context_profile_v2",
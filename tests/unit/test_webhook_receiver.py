@@ -0,0 +1,92 @@
+"""
+Unit tests for webhook_receiver.py
+"""
+import hashlib
+import hmac
+import json
+import pytest
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+import webhook_receiver
+from webhook_receiver import verify_signature, pending_entry, handle_delivery, content_length, PENDING_EVENTS_KEY
+
+SECRET = "s3cret"
+
+
+def _payload(action="opened", number=7, sha="abc"):
+    return {"action": action, "repository": {"full_name": "o/r"},
+            "pull_request": {"number": number, "title": "t", "draft": False, "updated_at": "2024-01-01T00:00:00Z",
+                             "user": {"login": "dev", "type": "User"}, "head": {"sha": sha, "ref": "f"},
+                             "base": {"sha": "b", "ref": "main"}, "diff_url": "dropped"}}
+
+
+def _delivery(payload, event="pull_request", secret=SECRET):
+    body = json.dumps(payload).encode()
+    sig = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return {"X-GitHub-Event": event, "X-Hub-Signature-256": sig}, body
+
+
+@pytest.fixture
+def store():
+    data = {}
+    with patch.object(webhook_receiver.waveassist, "fetch_data", lambda key, default=None, **k: data.get(key, default)), \
+            patch.object(webhook_receiver.waveassist, "store_data", lambda key, value, **k: data.__setitem__(key, value)):
+        yield data
+
+
+class TestSignature:
+    def test_valid_and_tampered(self):
+        headers, body = _delivery(_payload())
+        assert verify_signature(SECRET, body, headers["X-Hub-Signature-256"])
+        assert not verify_signature(SECRET, body + b" ", headers["X-Hub-Signature-256"])
+        assert not verify_signature("other", body, headers["X-Hub-Signature-256"])
+
+    def test_missing_secret_or_header_rejected(self):
+        headers, body = _delivery(_payload())
+        assert not verify_signature("", body, headers["X-Hub-Signature-256"])
+        assert not verify_signature(SECRET, body, "")
+        assert not verify_signature(SECRET, body, "sha1=abc")
+
+
+class TestPendingEntry:
+    @pytest.mark.parametrize("action", ["opened", "synchronize", "ready_for_review"])
+    def test_accepted_actions(self, action):
+        key, entry = pending_entry("pull_request", _payload(action))
+        assert key == "o/r#7" and entry["action"] == action
+        assert entry["pr"]["head"]["sha"] == "abc" and "diff_url" not in entry["pr"]
+
+    def test_other_events_and_actions_ignored(self):
+        assert pending_entry("pull_request", _payload("closed")) is None
+        assert pending_entry("issues", _payload()) is None
+
+
+class TestHandleDelivery:
+    def test_queues_and_newer_event_replaces(self, store):
+        assert handle_delivery(*_delivery(_payload(sha="one")), SECRET) == (202, "queued")
+        assert handle_delivery(*_delivery(_payload("synchronize", sha="two")), SECRET) == (202, "queued")
+        handle_delivery(*_delivery(_payload(number=8)), SECRET)
+        pending = store[PENDING_EVENTS_KEY]
+        assert set(pending) == {"o/r#7", "o/r#8"} and pending["o/r#7"]["pr"]["head"]["sha"] == "two"
+
+    def test_bad_signature_writes_nothing(self, store):
+        headers, body = _delivery(_payload(), secret="wrong")
+        assert handle_delivery(headers, body, SECRET)[0] == 401
+        assert PENDING_EVENTS_KEY not in store
+
+    def test_ping_and_ignored(self, store):
+        assert handle_delivery(*_delivery({"zen": "hi"}, event="ping"), SECRET) == (200, "pong")
+        assert handle_delivery(*_delivery(_payload("closed")), SECRET) == (202, "ignored")
+        assert PENDING_EVENTS_KEY not in store
+
+
+class TestContentLength:
+    def test_valid_and_missing(self):
+        assert content_length("42") == 42 and content_length(None) == 0 and content_length("") == 0
+
+    @pytest.mark.parametrize("value", ["-1", "abc", "1.5"])
+    def test_negative_or_garbage_rejected(self, value):
+        assert content_length(value) is None
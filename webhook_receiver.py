@@ -0,0 +1,147 @@
+"""
+webhook_receiver.py — GitHub webhook endpoint that queues PR work for fetch_pull_requests.
+
+Not a DAG node: a small long-running HTTP service (stdlib http.server, no extra dependency). Point
+a repo or org webhook at it (content type application/json, secret = the github_webhook_secret
+data key). Every delivery is checked against X-Hub-Signature-256; `pull_request` events with
+action opened / synchronize / ready_for_review are recorded in the durable pending_pr_events set,
+one entry per PR (a newer event replaces an older one). fetch_pull_requests drains that set and
+fetches only the touched PRs, so its repo listing becomes an hourly reconciliation sweep.
+
+Run:  python webhook_receiver.py [port]     (GITZOID_WEBHOOK_SECRET overrides the stored secret)
+"""
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import waveassist
+
+PENDING_EVENTS_KEY = "pending_pr_events"   # "{owner/repo}#{n}" -> {"repo", "pr", "action", "received_at"}
+WEBHOOK_SECRET_KEY = "github_webhook_secret"
+ACCEPTED_ACTIONS = ("opened", "synchronize", "ready_for_review")
+MAX_BODY_BYTES = 25 * 1024 * 1024   # GitHub caps webhook payloads at 25 MB
+DEFAULT_PORT = 8080
+_STORE_LOCK = threading.Lock()      # deliveries are handled on parallel threads
+
+
+def verify_signature(secret: str, body: bytes, header: str) -> bool:
+    """True when `header` (X-Hub-Signature-256) is the HMAC-SHA256 of `body` under `secret`."""
+    if not secret or not header or not header.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, header[len("sha256="):])
+
+
+def _slim_pr(pr: dict) -> dict:
+    """The PR fields GitZoid reads (same shape as fetch_pull_requests' _slim_pr; duplicated because
+    nodes never import each other)."""
+    user = pr.get("user") or {}
+    head = pr.get("head") or {}
+    base = pr.get("base") or {}
+    return {
+        "number": pr.get("number"),
+        "title": pr.get("title"),
+        "body": pr.get("body"),
+        "created_at": pr.get("created_at"),
+        "updated_at": pr.get("updated_at"),
+        "draft": pr.get("draft"),
+        "user": {"login": user.get("login"), "type": user.get("type")},
+        "head": {"sha": head.get("sha"), "ref": head.get("ref")},
+        "base": {"sha": base.get("sha"), "ref": base.get("ref")},
+    }
+
+
+def pending_entry(event: str, payload: dict):
+    """(key, entry) for a delivery GitZoid acts on, else None."""
+    if event != "pull_request" or not isinstance(payload, dict) or payload.get("action") not in ACCEPTED_ACTIONS:
+        return None
+    pr = payload.get("pull_request") or {}
+    repo = (payload.get("repository") or {}).get("full_name")
+    if not repo or not pr.get("number"):
+        return None
+    return f"{repo}#{pr['number']}", {"repo": repo, "pr": _slim_pr(pr), "action": payload["action"],
+                                      "received_at": datetime.now(timezone.utc).isoformat()}
+
+
+def enqueue(key: str, entry: dict):
+    """Add one PR to the pending set (read-modify-write under a lock; the set is small). The lock only
+    covers this process: fetch_pull_requests drains the same key, so an event can be lost to that
+    race, and the repo's hourly full sweep picks up the PR instead."""
+    with _STORE_LOCK:
+        pending = waveassist.fetch_data(PENDING_EVENTS_KEY, default={}) or {}
+        if not isinstance(pending, dict):
+            pending = {}
+        pending[key] = entry
+        waveassist.store_data(PENDING_EVENTS_KEY, pending, data_type="json")
+
+
+def handle_delivery(headers, body: bytes, secret: str) -> tuple[int, str]:
+    """Verify and route one delivery. Returns (HTTP status, message)."""
+    if not verify_signature(secret, body, headers.get("X-Hub-Signature-256", "")):
+        return 401, "bad signature"
+    event = headers.get("X-GitHub-Event", "")
+    if event == "ping":
+        return 200, "pong"
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        return 400, "invalid JSON"
+    item = pending_entry(event, payload)
+    if item is None:
+        return 202, "ignored"
+    enqueue(*item)
+    print(f"📥 {item[0]} queued ({item[1]['action']})")
+    return 202, "queued"
+
+
+def content_length(value):
+    """The request body length from a Content-Length header (0 when absent), or None if invalid."""
+    try:
+        length = int(value or 0)
+    except ValueError:
+        return None
+    return length if length >= 0 else None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    secret = ""
+
+    def do_POST(self):
+        length = content_length(self.headers.get("Content-Length"))
+        if length is None:
+            status, message = 400, "bad Content-Length"
+        elif length > MAX_BODY_BYTES:
+            status, message = 413, "payload too large"
+        else:
+            status, message = handle_delivery(self.headers, self.rfile.read(length), self.secret)
+        data = message.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):   # one line per queued event is enough
+        pass
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    waveassist.init()
+    secret = os.environ.get("GITZOID_WEBHOOK_SECRET") or waveassist.fetch_data(WEBHOOK_SECRET_KEY, default="") or ""
+    if not secret:
+        print(f"❌ No webhook secret: set {WEBHOOK_SECRET_KEY} or GITZOID_WEBHOOK_SECRET")
+        return 1
+    _Handler.secret = secret
+    port = int(argv[0]) if argv else DEFAULT_PORT
+    print(f"GitZoid: webhook receiver listening on :{port}")
+    ThreadingHTTPServer(("", port), _Handler).serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())